@@ -0,0 +1,52 @@
+import argparse
+import asyncio
+from pathlib import Path
+
+from src.services.batch_research import BatchResearch
+from src.services.job_queue import SqliteJobQueue
+from src.services.job_registry import JobRegistry
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(name='batch', log_file='project.log')
+
+DEFAULT_OUTPUT_DIR = Path(__file__).parent / "output" / "reports"
+
+
+async def run_batch(queries: list, max_papers: int, output_dir: Path) -> int:
+    """执行一批调研请求，报告写入output_dir，返回失败的请求数"""
+    queue = SqliteJobQueue()
+    batch = BatchResearch(queue, JobRegistry(), max_papers=max_papers)
+    jobs = batch.submit(queries)
+    await batch.wait(jobs)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    for job in jobs:
+        row = queue.get(job.job_id)
+        if row["report_markdown"]:
+            report_path = output_dir / f"{job.job_id}.md"
+            report_path.write_text(row["report_markdown"], encoding="utf-8")
+            print(f"[{row['status']}] {job.query} -> {report_path}")
+        else:
+            failed += 1
+            print(f"[{row['status']}] {job.query}: {row['error']}")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paper-Agent 批量调研：多个相关请求共享论文阅读结果")
+    parser.add_argument("queries", nargs="*", help="调研请求")
+    parser.add_argument("-f", "--file", help="请求文件，每行一个调研请求")
+    parser.add_argument("--max-papers", type=int, default=50, help="每个请求最多检索的论文数量")
+    parser.add_argument("--output-dir", default=str(DEFAULT_OUTPUT_DIR), help="报告输出目录")
+    args = parser.parse_args()
+
+    queries = list(args.queries)
+    if args.file:
+        lines = Path(args.file).read_text(encoding="utf-8").splitlines()
+        queries.extend(line.strip() for line in lines if line.strip())
+    if not queries:
+        parser.error("至少需要一个调研请求")
+
+    failed = asyncio.run(run_batch(queries, args.max_papers, Path(args.output_dir)))
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,19 @@
+import argparse
+
+from src.services.local_index import LocalArxivIndex
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(name='build_index', log_file='project.log')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paper-Agent 本地arXiv索引：导入arXiv元数据快照，供 search.backend: local 离线检索")
+    parser.add_argument("dumps", nargs="+", help="元数据快照文件：OAI-PMH XML（.xml）或JSONL，可以是.gz压缩文件")
+    parser.add_argument("--db", default=None, help="索引数据库路径，默认使用local-index.db-path配置")
+    args = parser.parse_args()
+
+    index = LocalArxivIndex(args.db)
+    for dump in args.dumps:
+        written = index.ingest(dump)
+        print(f"{dump}: 写入 {written} 篇论文")
+    print(f"索引共 {index.count()} 篇论文: {index.db_path}")
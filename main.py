@@ -1,19 +1,61 @@
 from time import sleep
 from src.utils.log_utils import setup_logger
 from src.utils.tool_utils import handlerChunk
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from sse_starlette.sse import EventSourceResponse
-from src.agents.userproxy_agent import WebUserProxyAgent, userProxyAgent
+from src.agents.userproxy_agent import ReviewPolicy, review_registry
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
 import asyncio
+import uuid
 from src.core.state_models import BackToFrontData
+from src.services.job_registry import job_registry
+from src.services.job_scheduler import job_scheduler, QueueFullError
+from src.services.job_worker import get_worker_mode, relay_job_events, run_inline_job
+from src.services.job_queue import get_job_queue
+from src.core.config import config
+from src.utils.metrics import metrics_registry, JOBS, SSE_SUBSCRIBERS, EVENT_QUEUE_DEPTH
+from contextlib import asynccontextmanager
 # 设置日志
 logger = setup_logger(name='main', log_file='project.log')
 
 
-app = FastAPI()
+async def prune_jobs_periodically():
+    """定期删除过期的任务记录及其事件"""
+    retention = config.get_float("worker.retention-seconds", 604800)
+    interval = config.get_float("worker.prune-interval-seconds", 3600)
+    if retention <= 0:
+        return
+    while True:
+        try:
+            await asyncio.to_thread(get_job_queue().prune, retention)
+        except Exception as e:
+            logger.error(f"清理过期任务失败: {e}")
+        await asyncio.sleep(interval)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动过期任务清理；worker模式下按配置随API一起启动worker进程
+
+    持久化任务存储（记录任务状态和最终报告，worker模式下同时作为任务队列）在首次使用时才创建，
+    导入本模块不会创建数据库文件。
+    """
+    processes = []
+    if get_worker_mode() == "process":
+        if config.get_bool("worker.spawn-with-api", True):
+            from worker import start_workers
+            get_job_queue().requeue_running()
+            processes = start_workers(config.get_int("worker.count", 2))
+    pruner = asyncio.create_task(prune_jobs_periodically())
+    yield
+    pruner.cancel()
+    for process in processes:
+        process.terminate()
+
+
+app = FastAPI(lifespan=lifespan)
 # === CORS 配置（开发时可用 "*"，生产请限定具体域名） ===
 app.add_middleware(
     CORSMiddleware,
@@ -23,37 +65,320 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-state_queue = asyncio.Queue()
-
-# agent = WebUserProxyAgent("user_proxy")
-
 @app.post("/send_input")
 async def send_input(data: dict):
+    """提交指定任务的人工审核结果"""
+    job_id = data.get("job_id")
     user_input = data.get("input")
-    userProxyAgent.set_user_input(user_input)
-    return JSONResponse({"status": 200, "msg": "已收到人工输入"})
+    if not job_id:
+        return JSONResponse({"status": 400, "msg": "缺少job_id参数"}, status_code=400)
+    if review_registry.submit(job_id, user_input):
+        return JSONResponse({"status": 200, "msg": "已收到人工输入"})
+    # worker模式下审核在worker进程中等待，通过任务队列转交
+    if get_worker_mode() == "process" and await asyncio.to_thread(get_job_queue().submit_review_input, job_id, user_input):
+        return JSONResponse({"status": 200, "msg": "已收到人工输入"})
+    return JSONResponse({"status": 404, "msg": "该任务当前没有等待中的人工审核"}, status_code=404)
+
+def parse_review_policy(value: str):
+    """校验审核策略参数，返回(策略, 错误响应)"""
+    if not value:
+        return None, None
+    try:
+        return ReviewPolicy(value).value, None
+    except ValueError:
+        options = ", ".join(policy.value for policy in ReviewPolicy)
+        return None, JSONResponse({"status": 400, "msg": f"无效的审核策略: {value}，可选值: {options}"}, status_code=400)
+
+def parse_budget(value):
+    """校验运行预算参数，返回(预算, 错误响应)；各项须为正数，未指定的项使用全局配置"""
+    from src.core.run_budget import BUDGET_FIELDS
+
+    if not value:
+        return None, None
+    if not isinstance(value, dict):
+        return None, JSONResponse({"status": 400, "msg": "budget必须是对象"}, status_code=400)
+    unknown = set(value) - set(BUDGET_FIELDS)
+    if unknown:
+        return None, JSONResponse({"status": 400, "msg": f"未知的预算项: {', '.join(sorted(unknown))}，可选项: {', '.join(BUDGET_FIELDS)}"}, status_code=400)
+    budget = {}
+    for name, limit in value.items():
+        if limit is None:
+            continue
+        if isinstance(limit, bool) or not isinstance(limit, (int, float)) or limit <= 0:
+            return None, JSONResponse({"status": 400, "msg": f"预算项{name}必须是正数"}, status_code=400)
+        budget[name] = limit
+    return budget or None, None
+
+async def check_admission():
+    """准入控制：运行槽位和等待队列都满时直接拒绝，而不是无限堆积；允许提交时返回None"""
+    try:
+        if get_worker_mode() == "process":
+            if await asyncio.to_thread(get_job_queue().count_pending) >= job_scheduler.max_queue_size:
+                raise QueueFullError(job_scheduler.retry_after_seconds)
+        else:
+            job_scheduler.check_admission()
+    except QueueFullError as e:
+        logger.warning(f"拒绝调研请求: {e}")
+        return JSONResponse(
+            {"status": 429, "msg": "当前排队任务过多，请稍后重试"},
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return None
+
+async def submit_job(query: str, priority: int = 0, stream: bool = True, review_policy: str = None, budget: dict = None):
+    """创建并启动调研任务
+
+    参数:
+        stream: 请求方是否通过SSE长连接等待结果（/api/research）：需要在本进程内转发事件，连接断开且未重连时取消任务；
+            worker模式下不需要SSE的任务只写入队列
+        review_policy: 人工审核策略，None表示使用全局配置
+        budget: 运行预算，None表示使用全局配置
+
+    返回:
+        本进程内的Job对象；worker模式且stream为False时返回job_id
+    """
+    if get_worker_mode() == "process":
+        if not stream:
+            job_id = uuid.uuid4().hex
+            await asyncio.to_thread(get_job_queue().enqueue, job_id, query, priority, "pending", review_policy, budget)
+            return job_id
+        # worker模式：任务写入持久化队列，由worker进程执行，本进程只负责转发事件
+        job = job_registry.create_job(query, cancel_on_disconnect=True)
+        await asyncio.to_thread(get_job_queue().enqueue, job.job_id, query, priority, "pending", review_policy, budget)
+        job_registry.start(job, relay_job_events(get_job_queue(), job))
+        return job
+
+    # 由调度器决定何时真正开始执行，结果写入持久化存储
+    job = job_registry.create_job(query, cancel_on_disconnect=stream)
+    await asyncio.to_thread(get_job_queue().enqueue, job.job_id, query, priority, "running", review_policy, budget)
+    job_registry.start(job, run_inline_job(get_job_queue(), job, priority, review_policy, budget))
+    return job
+
+def parse_last_event_id(last_event_id: str):
+    """解析SSE事件id，格式为 {job_id}:{seq}，也兼容只有序号的形式"""
+    if not last_event_id:
+        return None, 0
+    job_id, _, seq = last_event_id.rpartition(":")
+    try:
+        return job_id, int(seq)
+    except ValueError:
+        return job_id, 0
+
+def stream_job_events(job, last_seq: int = 0) -> EventSourceResponse:
+    """将任务事件通道转为SSE流，每个事件带上id以支持Last-Event-ID断线续传"""
+    from src.core.state_models import ExecutionState
 
-@app.get('/api/research')
-async def research_stream(query: str):
-    from src.agents.orchestrator import PaperAgentOrchestrator
-    from src.core.state_models import State,ExecutionState
     async def event_generator():
-        while True:
-            state = await state_queue.get()
-            # yield {"data": f"{state.model_dump_json()}\n\n"}
-            yield {"data": f"{state.model_dump_json()}"}
-            # state_queue.task_done()  # 标记任务完成
-    
+        job_registry.attach(job)
+        try:
+            if last_seq == 0:
+                # 第一条事件告知前端本次任务的job_id
+                yield {"id": f"{job.job_id}:0", "data": BackToFrontData(step="job",state="created",data=job.job_id,seq=0).model_dump_json()}
+            async for state in job.channel.subscribe(last_seq):
+                yield {"id": f"{job.job_id}:{state.seq}", "data": f"{state.model_dump_json()}"}
+                if state.step == ExecutionState.FINISHED:
+                    break
+        finally:
+            # 客户端断开连接（生成器被取消）时，/api/research提交的任务宽限期内未重连则取消仍在运行的流水线
+            job_registry.detach(job)
+
+    return EventSourceResponse(event_generator(), media_type="text/event-stream")
+
+@app.get('/api/research')
+async def research_stream(request: Request, query: str, priority: int = 0, review: str = None):
+    # 浏览器EventSource断线自动重连时会携带Last-Event-ID，直接续传原任务而不是重新执行整个流程
+    job_id, last_seq = parse_last_event_id(request.headers.get("last-event-id"))
+    if job_id and job_registry.get(job_id) is not None:
+        logger.info(f"SSE重连，续传任务事件: job_id={job_id}, last_seq={last_seq}")
+        return stream_job_events(job_registry.get(job_id), last_seq)
+
+    review_policy, invalid = parse_review_policy(review)
+    if invalid is not None:
+        return invalid
+    rejected = await check_admission()
+    if rejected is not None:
+        return rejected
+
+    # 每个请求创建独立的任务和事件通道，避免多个会话互相读取事件
+    job = await submit_job(query, priority, review_policy=review_policy)
+
     # 启动事件生成器（此时已开始监听队列）
-    event_source = EventSourceResponse(event_generator(), media_type="text/event-stream")
+    return stream_job_events(job)
+
+@app.get('/api/research/{job_id}/events')
+async def research_events(request: Request, job_id: str, last_event_id: str = None):
+    """订阅已有任务的事件流，可通过Last-Event-ID请求头或last_event_id参数指定续传位置"""
+    job = job_registry.get(job_id)
+    if job is None and get_worker_mode() == "process":
+        # 通过/api/jobs提交的任务在首次订阅时才开始转发worker事件
+        row = await asyncio.to_thread(get_job_queue().get, job_id)
+        if row is not None:
+            job = job_registry.create_job(row["query"], job_id=job_id)
+            job_registry.start(job, relay_job_events(get_job_queue(), job))
+    if job is None:
+        return JSONResponse({"status": 404, "msg": "任务不存在"}, status_code=404)
+    _, last_seq = parse_last_event_id(request.headers.get("last-event-id") or last_event_id)
+    return stream_job_events(job, last_seq)
+
+@app.delete('/api/research/{job_id}')
+async def cancel_research(job_id: str):
+    """主动终止调研任务"""
+    if job_registry.get(job_id) is None:
+        row = await asyncio.to_thread(get_job_queue().get, job_id)
+        if row is None:
+            return JSONResponse({"status": 404, "msg": "任务不存在"}, status_code=404)
+        if row["status"] not in ("pending", "running"):
+            return JSONResponse({"status": 200, "msg": "任务已结束，无需取消"})
+        # worker模式下未被订阅的任务，通过队列通知worker取消
+        await asyncio.to_thread(get_job_queue().request_cancel, job_id)
+        return JSONResponse({"status": 200, "msg": "任务已取消"})
+    if not job_registry.cancel(job_id):
+        return JSONResponse({"status": 200, "msg": "任务已结束，无需取消"})
+    return JSONResponse({"status": 200, "msg": "任务已取消"})
+
+
+@app.post('/api/jobs')
+async def create_research_job(data: dict):
+    """异步提交调研任务，立即返回job_id，无需保持SSE长连接"""
+    query = data.get("query")
+    if not query:
+        return JSONResponse({"status": 400, "msg": "缺少query参数"}, status_code=400)
+    review_policy, invalid = parse_review_policy(data.get("review_policy"))
+    if invalid is not None:
+        return invalid
+    budget, invalid = parse_budget(data.get("budget"))
+    if invalid is not None:
+        return invalid
+    rejected = await check_admission()
+    if rejected is not None:
+        return rejected
+    job = await submit_job(query, int(data.get("priority", 0)), stream=False, review_policy=review_policy, budget=budget)
+    job_id = job if isinstance(job, str) else job.job_id
+    return JSONResponse({"status": 200, "job_id": job_id, "msg": "任务已提交"})
+
+@app.post('/api/batch')
+async def create_batch_research(data: dict):
+    """批量提交多个相关的调研请求：各请求共享论文阅读结果，每个请求仍对应一个独立任务
+
+    批次在API进程内协调执行（检索完成后统一去重阅读，再分发给各请求），不等待人工审核。
+    """
+    from src.services.batch_research import BatchResearch
+
+    queries = [query for query in data.get("queries") or [] if isinstance(query, str) and query.strip()]
+    if not queries:
+        return JSONResponse({"status": 400, "msg": "缺少queries参数"}, status_code=400)
+    budget, invalid = parse_budget(data.get("budget"))
+    if invalid is not None:
+        return invalid
+    rejected = await check_admission()
+    if rejected is not None:
+        return rejected
+    batch = BatchResearch(
+        get_job_queue(),
+        job_registry,
+        max_papers=int(data.get("max_papers", 50)),
+        priority=int(data.get("priority", 0)),
+        budget=budget,
+    )
+    jobs = batch.submit(queries)
+    return JSONResponse({"status": 200, "job_ids": [job.job_id for job in jobs], "msg": "批量任务已提交"})
+
+@app.get('/api/jobs/{job_id}')
+async def get_research_job(job_id: str):
+    """查询任务状态和当前所处阶段"""
+    from src.core.state_models import ExecutionState
+
+    row = await asyncio.to_thread(get_job_queue().get, job_id)
+    job = job_registry.get(job_id)
+    if row is None and job is None:
+        return JSONResponse({"status": 404, "msg": "任务不存在"}, status_code=404)
+    row = row or {}
+    info = {
+        "status": 200,
+        "job_id": job_id,
+        "query": row.get("query", job.query if job else None),
+        "job_status": row.get("status"),
+        "current_step": row.get("current_step"),
+        "error": row.get("error"),
+        "created_at": row.get("created_at"),
+        "finished_at": row.get("finished_at"),
+        "has_report": bool(row.get("report_markdown")),
+        "budget": row.get("budget"),
+        "budget_usage": row.get("budget_usage"),
+    }
+    # 本进程内仍在运行的任务，以内存中的最新事件为准
+    if job is not None and not job.done and job.channel.last_event is not None:
+        info["current_step"] = job.channel.last_event.step
+        info["job_status"] = "pending" if job.channel.last_event.step == ExecutionState.QUEUED else "running"
+    return JSONResponse(info)
+
+@app.get('/api/jobs/{job_id}/report')
+async def get_research_report(job_id: str):
+    """获取任务生成的最终Markdown报告"""
+    row = await asyncio.to_thread(get_job_queue().get, job_id)
+    if row is None:
+        return JSONResponse({"status": 404, "msg": "任务不存在"}, status_code=404)
+    if row["report_markdown"]:
+        return Response(content=row["report_markdown"], media_type="text/markdown; charset=utf-8")
+    if row["status"] in ("pending", "running"):
+        return JSONResponse({"status": 202, "msg": "任务尚未完成", "job_status": row["status"]}, status_code=202)
+    return JSONResponse({"status": 404, "msg": "任务未生成报告", "job_status": row["status"], "error": row["error"]}, status_code=404)
+
+@app.get('/api/jobs/{job_id}/trace')
+async def get_research_trace(job_id: str, format: str = "json"):
+    """获取任务的追踪记录：format=json 为span列表，format=chrome 为Chrome trace-event格式（可在Perfetto中打开）"""
+    from src.utils.tracing import load_trace, to_chrome_trace
+
+    if format not in ("json", "chrome"):
+        return JSONResponse({"status": 400, "msg": "format只能是json或chrome"}, status_code=400)
+    trace = await asyncio.to_thread(load_trace, job_id)
+    if trace is None:
+        return JSONResponse({"status": 404, "msg": "任务没有追踪记录，任务可能尚未结束或未启用追踪"}, status_code=404)
+    return JSONResponse(to_chrome_trace(trace) if format == "chrome" else trace)
+
+@app.post('/api/jobs/{job_id}/resume')
+async def resume_research_job(job_id: str):
+    """从最后一个成功节点的检查点继续执行失败或已取消的任务，已完成的阶段不会重新执行"""
+    from src.services.checkpoint_store import is_enabled
+
+    if not is_enabled():
+        return JSONResponse({"status": 400, "msg": "未启用检查点，无法恢复任务"}, status_code=400)
+    row = await asyncio.to_thread(get_job_queue().get, job_id)
+    if row is None:
+        return JSONResponse({"status": 404, "msg": "任务不存在"}, status_code=404)
+    job = job_registry.get(job_id)
+    if row["status"] not in ("failed", "cancelled") or (job is not None and not job.done):
+        return JSONResponse({"status": 409, "msg": "只能恢复失败或已取消的任务", "job_status": row["status"]}, status_code=409)
+    rejected = await check_admission()
+    if rejected is not None:
+        return rejected
 
-    # 初始化业务流程控制器
-    orchestrator = PaperAgentOrchestrator(state_queue = state_queue)
-    
-    # 启动异步任务
-    asyncio.create_task(orchestrator.run(user_request=query))
+    if get_worker_mode() == "process":
+        # 重新放回队列由worker执行；移除旧的转发任务，订阅事件时会重新建立转发
+        job_registry.remove(job_id)
+        await asyncio.to_thread(get_job_queue().reset_for_resume, job_id, "pending")
+    else:
+        await asyncio.to_thread(get_job_queue().reset_for_resume, job_id, "running")
+        job = job_registry.create_job(row["query"], job_id=job_id)
+        job_registry.start(job, run_inline_job(get_job_queue(), job, row["priority"], row["review_policy"], row["budget"]))
+    return JSONResponse({"status": 200, "job_id": job_id, "msg": "任务已恢复执行"})
 
-    return event_source
+@app.get('/metrics')
+async def metrics():
+    """Prometheus格式的运行指标"""
+    if get_worker_mode() == "process":
+        # 任务在worker进程中执行，以持久化队列中的状态为准；阶段和模型调用指标记录在各worker进程中
+        counts = await asyncio.to_thread(get_job_queue().count_by_status)
+        JOBS.labels("running").set(counts.get("running", 0))
+        JOBS.labels("waiting").set(counts.get("pending", 0))
+    else:
+        JOBS.labels("running").set(job_scheduler.running)
+        JOBS.labels("waiting").set(job_scheduler.waiting)
+    active_jobs = job_registry.active_jobs()
+    SSE_SUBSCRIBERS.set(sum(job.subscribers for job in active_jobs))
+    EVENT_QUEUE_DEPTH.set(sum(job.channel.qsize() for job in active_jobs))
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 async def main():
@@ -12,7 +12,6 @@ from typing import Any, Dict, List, Optional, Union, AsyncGenerator, Sequence,ge
 from autogen_agentchat.agents import BaseChatAgent
 import asyncio
 
-from starlette.routing import Route
 from src.utils.log_utils import setup_logger
 from src.utils.tool_utils import handlerChunk
 from src.agents.reading_agent import ExtractedPapersData,KeyMethodology,ExtractedPaperData
@@ -23,14 +22,26 @@ from autogen_core import CancellationToken, RoutedAgent
 from src.agents.sub_analyse_agent.cluster_agent import PaperClusterAgent
 from src.agents.sub_analyse_agent.deep_analyse_agent import DeepAnalyseAgent
 from src.agents.sub_analyse_agent.global_analyse_agent import GlobalanalyseAgent
-from src.core.model_client import create_default_client
+from src.core.model_client import create_default_client, get_model_name
+from src.core.prompts import clustering_agent_prompt, deep_analyse_agent_prompt, global_analyse_agent_prompt
+from src.services.stage_cache import get_stage_cache
+from src.core import deadline
 from src.core.state_models import BackToFrontData
 import json
 
-from src.core.state_models import State,ExecutionState
+from src.core.state_models import State,ExecutionState,ConfigSchema
+from langgraph.runtime import get_runtime
 from autogen_core import message_handler
 
 logger = setup_logger(__name__)
+
+# 聚类依赖的提示词和模型，任一变化都会使聚类结果缓存失效
+CLUSTER_PROMPTS = [clustering_agent_prompt]
+CLUSTER_MODELS = ["subanalyse-cluster-model", "cluster-embedding-model"]
+# 整个分析阶段依赖的提示词和模型
+ANALYSE_PROMPTS = [clustering_agent_prompt, deep_analyse_agent_prompt, global_analyse_agent_prompt]
+ANALYSE_MODELS = CLUSTER_MODELS + ["subanalyse-deep-analyse-model", "subanalyse-global-analyse-model"]
+
 # BaseChatAgent
 class AnalyseAgent(BaseChatAgent):
     """基于AutoGen框架的论文分析智能体"""
@@ -87,19 +98,36 @@ class AnalyseAgent(BaseChatAgent):
         """
         # 1. 调用聚类智能体进行论文聚类
         await self.state_queue.put(BackToFrontData(step=ExecutionState.ANALYZING,state="thinking",data="正在进行论文聚类分析\n"))
-        cluster_results = await self.cluster_agent.run(message)
+        # 聚类结果单独缓存，只修改深度分析或全局分析提示词时无需重新聚类
+        stage_cache = get_stage_cache()
+        cluster_key = stage_cache.make_key("cluster", message, CLUSTER_PROMPTS, [get_model_name(m) for m in CLUSTER_MODELS])
+        cluster_results = await stage_cache.aget(cluster_key)
+        if cluster_results is None:
+            cluster_results = await self.cluster_agent.run(message, cancellation_token)
+            if isinstance(cluster_results, list) and not deadline.output_degraded():
+                await stage_cache.aput(cluster_key, "cluster", cluster_results)
         await self.state_queue.put(BackToFrontData(step=ExecutionState.ANALYZING,state="thinking",data=f"论文聚类分析完成，共形成 {len(cluster_results)} 个聚类\n"))
 
         # 2. 调用深度分析智能体分析每个聚类的论文
         deep_analysis_results = []
         await self.state_queue.put(BackToFrontData(step=ExecutionState.ANALYZING,state="thinking",data="正在进行论文深度分析\n"))
-        deep_analysis_results = await asyncio.gather(*[self.deep_analyse_agent.run(cluster) for cluster in cluster_results])
+        # 临近截止时间时，论文数很少的聚类跳过深度分析，直接汇总论文要点
+        skipped = [deadline.skip_deep_analysis(len(cluster.papers)) for cluster in cluster_results]
+        if any(skipped):
+            deadline.record("skip_deep_analysis", f"剩余时间不足，{sum(skipped)}/{len(cluster_results)} 个小聚类跳过深度分析")
+
+        async def deep_analyse(cluster, skip: bool):
+            if skip:
+                return self.deep_analyse_agent.summarize_cluster(cluster)
+            return await self.deep_analyse_agent.run(cluster, cancellation_token)
+
+        deep_analysis_results = await asyncio.gather(*[deep_analyse(cluster, skip) for cluster, skip in zip(cluster_results, skipped)])
         await self.state_queue.put(BackToFrontData(step=ExecutionState.ANALYZING,state="thinking",data="论文深度分析完成\n"))
         
         # 3. 调用全局分析智能体生成整体分析报告
         await self.state_queue.put(BackToFrontData(step=ExecutionState.ANALYZING,state="thinking",data="等待全局分析\n"))
         is_thinking = None
-        async for chunk in self.global_analyse_agent.run(deep_analysis_results):
+        async for chunk in self.global_analyse_agent.run(deep_analysis_results, cancellation_token):
             if isinstance(chunk, Dict):
                 if not chunk.get("isSuccess", False):
                     await self.state_queue.put(BackToFrontData(step=ExecutionState.ANALYZING,state="error",data=chunk.get("global_analyse", "Unknown error")))
@@ -123,19 +151,32 @@ class AnalyseAgent(BaseChatAgent):
    
 async def analyse_node(state: State) -> State:
     """搜索论文节点"""
+    context = get_runtime(ConfigSchema).context
     try:
-        state_queue = state["state_queue"]
+        state_queue = context["state_queue"]
         current_state = state["value"]
         current_state.current_step = ExecutionState.ANALYZING
         await state_queue.put(BackToFrontData(step=ExecutionState.ANALYZING,state="initializing",data=None))
         extracted_papers = current_state.extracted_data
 
+        stage_cache = get_stage_cache()
+        analyse_key = stage_cache.make_key("analyse", extracted_papers, ANALYSE_PROMPTS, [get_model_name(m) for m in ANALYSE_MODELS])
+        analyse_results = await stage_cache.aget(analyse_key)
+        if analyse_results is not None:
+            logger.info("分析结果命中阶段缓存")
+            current_state.analyse_results = analyse_results
+            await state_queue.put(BackToFrontData(step=ExecutionState.ANALYZING,state="completed",data=analyse_results))
+            return {"value": current_state}
+
         analyse_agent = AnalyseAgent(state_queue=state_queue)
         task = StructuredMessage(content=extracted_papers, source="User")
         # task = TextMessage(content=json.dumps(extracted_papers.model_dump(),ensure_ascii=False), source="User")
-        response = await analyse_agent.run(task=task)
+        response = await analyse_agent.run(task=task, cancellation_token=context.get("cancellation_token"))
 
         analyse_results = response.messages[-1].content
+        # 降级产生的结果质量较低，不写入缓存
+        if not deadline.output_degraded():
+            await stage_cache.aput(analyse_key, "analyse", analyse_results)
         
         current_state.analyse_results = analyse_results
         await state_queue.put(BackToFrontData(step=ExecutionState.ANALYZING,state="completed",data=analyse_results))
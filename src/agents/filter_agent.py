@@ -0,0 +1,59 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+from langgraph.runtime import get_runtime
+
+from src.core.state_models import BackToFrontData, ConfigSchema, ExecutionState, PaperAgentState, State
+from src.tasks.paper_filter import filter_papers, get_scorer, is_enabled, min_score, relevance_query, top_n
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+async def select_relevant(current_state: PaperAgentState, candidates: List[dict]) -> Tuple[List[dict], Dict[str, float], str]:
+    """按与用户请求的相关性筛选候选论文，filter_node和批量调研共用
+
+    返回:
+        (保留的论文, 所有候选论文的分数, 打分器名称)
+    """
+    scorer = get_scorer()
+    query = relevance_query(current_state.user_request, current_state.search_query)
+    kept, scores = await asyncio.to_thread(
+        filter_papers, candidates, query, top_n(current_state.max_papers), scorer, min_score(),
+    )
+    return kept, scores, scorer.name
+
+
+async def filter_node(state: State) -> State:
+    """相关性筛选节点
+
+    位于检索和阅读之间：按与用户请求的相关性给候选论文打分，只保留最相关的max_papers篇（或relevance-filter.top-n篇），
+    被丢弃的论文不会进入阅读阶段，不消耗模型token。所有候选论文的分数记录在relevance_scores中。
+    未启用筛选时直接进入阅读阶段；流式检索时还没有检索结果，由阅读阶段对到达的论文逐篇筛选（见paper_filter.filter_stream）。
+    """
+    context = get_runtime(ConfigSchema).context
+    state_queue = context["state_queue"]
+    current_state = state["value"]
+    current_state.current_step = ExecutionState.FILTERING
+    candidates = list(current_state.search_results or [])
+    if not is_enabled() or not candidates:
+        return {"value": current_state}
+
+    await state_queue.put(BackToFrontData(step=ExecutionState.FILTERING,state="initializing",data=None))
+    try:
+        kept, scores, scorer_name = await select_relevant(current_state, candidates)
+    except Exception as e:
+        logger.error(f"相关性筛选失败: {e}")
+        current_state.error.filter_node_error = f"相关性筛选失败: {e}"
+        await state_queue.put(BackToFrontData(step=ExecutionState.FILTERING,state="error",data=current_state.error.filter_node_error))
+        return {"value": current_state}
+
+    current_state.relevance_scores = scores
+    if not kept:
+        current_state.error.filter_node_error = "没有与请求相关的论文,请尝试其他查询条件"
+        await state_queue.put(BackToFrontData(step=ExecutionState.FILTERING,state="error",data=current_state.error.filter_node_error))
+        return {"value": current_state}
+    current_state.search_results = kept
+    logger.info(f"相关性筛选({scorer_name}): 候选 {len(candidates)} 篇，保留 {len(kept)} 篇")
+    await state_queue.put(BackToFrontData(step=ExecutionState.FILTERING,state="completed",data=f"相关性筛选完成：从 {len(candidates)} 篇候选论文中保留最相关的 {len(kept)} 篇"))
+    return {"value": current_state}
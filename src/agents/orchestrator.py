@@ -1,8 +1,6 @@
 import sys
 import os
 
-from sqlalchemy import Null
-from sqlalchemy.sql.functions import current_date
 # 将项目根目录添加到Python路径
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
@@ -11,17 +9,27 @@ from langgraph.graph import StateGraph, END, START
 from langgraph.graph.message import add_messages
 from src.core.state_models import PaperAgentState, ExecutionState,NodeError
 from src.agents.search_agent import search_node
+from src.agents.filter_agent import filter_node
 from src.agents.reading_agent import reading_node
 from src.agents.analyse_agent import analyse_node
 from src.agents.writing_agent import writing_node
 from src.agents.report_agent import report_node
 from typing import Dict, Any
+from functools import lru_cache
+from autogen_core import CancellationToken
 from src.core.state_models import BackToFrontData
 from src.core.state_models import State,ConfigSchema
+from src.utils.metrics import timed_node
+from src.utils.tracing import job_trace, traced_node
+from src.core.run_budget import RunBudget, budgeted_node, current_budget
+from src.utils.log_utils import setup_logger
+from src.services.checkpoint_store import open_checkpointer, find_resume_config, thread_config
 
 
 import asyncio
 
+logger = setup_logger(__name__)
+
 
 # class State(TypedDict):
 #     """LangGraph兼容的状态定义"""
@@ -34,24 +42,29 @@ import asyncio
 #     value: Dict[str, Any]
 
 class PaperAgentOrchestrator:
-    def __init__(self,state_queue):
+    def __init__(self,state_queue, cancellation_token: CancellationToken = None):
         self.state_queue = state_queue
-        self.graph = self._build_graph()
+        # 取消令牌会传递给各节点中所有的智能体调用，取消时可立即中断进行中的模型请求
+        self.cancellation_token = cancellation_token or CancellationToken()
 
-    async def handle_error_node(self, state: State) -> str:
+    @staticmethod
+    async def handle_error_node(state: State) -> str:
         """错误处理节点"""
         current_state = state["value"]
         current_state.current_step = ExecutionState.FAILED
         print(f"Workflow failed at {current_state.current_step}: {current_state.error}")
         return {"value": current_state}
 
-    def condition_handler(self, state: State) -> bool:
+    @staticmethod
+    def condition_handler(state: State) -> bool:
         """条件处理函数"""
         # 如果state.get("error") is not None那么就返回到handle_error_node
         current_state = state["value"]
         err = current_state.error
         current_step = current_state.current_step
         if err.search_node_error is None and current_step == ExecutionState.SEARCHING:
+            return "filter_node"
+        elif err.filter_node_error is None and current_step == ExecutionState.FILTERING:
             return "reading_node"
         elif err.reading_node_error is None and current_step == ExecutionState.READING:
             return "analyse_node"
@@ -65,35 +78,69 @@ class PaperAgentOrchestrator:
             return "handle_error_node"
 
 
-    def _build_graph(self):
-        """构建并编译LangGraph工作流"""
+    @classmethod
+    def _build_graph(cls, checkpointer=None, entry_node: str = "search_node"):
+        """构建并编译LangGraph工作流
+
+        图中不保存任何与单次运行相关的数据（事件通道、取消令牌通过运行时上下文传入），
+        因此编译结果可以在进程内所有请求之间共享，见get_compiled_graph。
+
+        参数:
+            checkpointer: 检查点存储，设置后每个节点执行完都会保存一次PaperAgentState
+            entry_node: 起始节点，批量调研中已完成检索和阅读的请求从analyse_node开始执行
+        """
         builder = StateGraph(State, context_schema=ConfigSchema)
         
         # 添加节点
-        builder.add_node("search_node", search_node)
-        builder.add_node("reading_node", reading_node)
-        builder.add_node("analyse_node", analyse_node)
-        builder.add_node("writing_node", writing_node)
-        builder.add_node("report_node", report_node)
-        builder.add_node("handle_error_node", self.handle_error_node)
-
-        builder.set_entry_point("search_node")
-        
+        # 各阶段节点统一记录耗时，通过/metrics接口查看
+        # 各阶段开始前检查运行预算，并记录各阶段的token用量
+        # 各阶段记录追踪span，通过 /api/jobs/{job_id}/trace 查看
+        builder.add_node("search_node", budgeted_node("search")(traced_node("search_node")(timed_node("search")(search_node))))
+        builder.add_node("filter_node", budgeted_node("filter")(traced_node("filter_node")(timed_node("filter")(filter_node))))
+        builder.add_node("reading_node", budgeted_node("reading")(traced_node("reading_node")(timed_node("reading")(reading_node))))
+        builder.add_node("analyse_node", budgeted_node("analyse")(traced_node("analyse_node")(timed_node("analyse")(analyse_node))))
+        builder.add_node("writing_node", budgeted_node("writing")(traced_node("writing_node")(timed_node("writing")(writing_node))))
+        builder.add_node("report_node", budgeted_node("report")(traced_node("report_node")(timed_node("report")(report_node))))
+        builder.add_node("handle_error_node", cls.handle_error_node)
+
         # 定义工作流路径
-        builder.add_edge(START, "search_node")
-        builder.add_conditional_edges("search_node", self.condition_handler)
-        builder.add_conditional_edges("reading_node", self.condition_handler)
-        builder.add_conditional_edges("analyse_node", self.condition_handler)
-        builder.add_conditional_edges("writing_node", self.condition_handler)
-        builder.add_conditional_edges("report_node", self.condition_handler)
+        builder.add_edge(START, entry_node)
+        builder.add_conditional_edges("search_node", cls.condition_handler)
+        builder.add_conditional_edges("filter_node", cls.condition_handler)
+        builder.add_conditional_edges("reading_node", cls.condition_handler)
+        builder.add_conditional_edges("analyse_node", cls.condition_handler)
+        builder.add_conditional_edges("writing_node", cls.condition_handler)
+        builder.add_conditional_edges("report_node", cls.condition_handler)
         builder.add_edge("handle_error_node", END)
         
-        return builder.compile()
+        return builder.compile(checkpointer=checkpointer)
     
 
     
-    async def run(self, user_request: str, max_papers: int = 50):
-        """执行完整工作流"""
+    async def run(self,
+                  user_request: str,
+                  max_papers: int = 50,
+                  job_id: str = None,
+                  review_policy: str = None,
+                  budget: Dict[str, Any] = None) -> PaperAgentState:
+        """执行完整工作流，返回最终状态
+
+        参数:
+            review_policy: 人工审核策略(auto / approve_after / require)，默认使用全局配置
+            budget: 运行预算(max_papers / max_tokens / max_seconds / max_concurrent_calls)，未指定的项使用全局配置
+        """
+        run_budget = RunBudget.from_config(budget)
+        budget_token = current_budget.set(run_budget)
+        try:
+            with job_trace(job_id):
+                final_state = await self._run(user_request, run_budget.limit_papers(max_papers), job_id, review_policy, run_budget)
+        finally:
+            current_budget.reset(budget_token)
+            logger.info(f"运行预算使用情况: job_id={job_id}, {run_budget.report()}")
+        final_state.budget_usage = run_budget.report()
+        return final_state
+
+    async def _run(self, user_request: str, max_papers: int, job_id: str, review_policy: str, run_budget: RunBudget) -> PaperAgentState:
         # 初始化状态
         # await self.state_queue.put(BackToFrontData(step="start",state="processing",data=None))
         print("Starting workflow...")
@@ -101,14 +148,56 @@ class PaperAgentOrchestrator:
             user_request=user_request,
             max_papers=max_papers,
             error=NodeError(),
-            config={}  # 可以传入各种配置
+            config={"job_id": job_id, "review_policy": review_policy, "budget": run_budget.limits()}  # 可以传入各种配置
         )
 
-        # 运行图
-        await self.graph.ainvoke({"state_queue": self.state_queue, "value": initial_state})
+        # 事件通道和取消令牌不可序列化，放在运行时上下文中而不是检查点状态里
+        context = {"state_queue": self.state_queue, "cancellation_token": self.cancellation_token}
+        async with open_checkpointer() as checkpointer:
+            graph = get_compiled_graph()
+            if checkpointer is None or job_id is None:
+                result = await graph.ainvoke({"value": initial_state}, context=context)
+            else:
+                # 浅拷贝已编译的图并绑定本次运行的检查点连接，无需重新编译
+                graph = graph.copy(update={"checkpointer": checkpointer})
+                # 任务之前执行失败或中断过时，从最后一个成功节点之后继续，跳过已完成的阶段
+                resume_config = await find_resume_config(graph, job_id)
+                if resume_config is not None:
+                    logger.info(f"从检查点恢复任务: job_id={job_id}")
+                    result = await graph.ainvoke(None, resume_config, context=context)
+                else:
+                    result = await graph.ainvoke({"value": initial_state}, thread_config(job_id), context=context)
+                if result["value"].error.first_error() is None:
+                    # 成功结束的任务不会再恢复，删除其检查点；失败的任务保留检查点，供恢复执行时使用
+                    await checkpointer.adelete_thread(job_id)
         await self.state_queue.put(BackToFrontData(step=ExecutionState.FINISHED,state="finished",data=None))
+        return result["value"]
+
+    async def run_from(self, state: PaperAgentState, entry_node: str, budget: RunBudget = None) -> PaperAgentState:
+        """从指定节点开始执行工作流，state中需已包含该节点之前各阶段的结果；不保存检查点
+
+        参数:
+            budget: 之前各阶段已在使用的运行预算，沿用其计时和token用量；默认按state.config中的预算新建
+        """
+        context = {"state_queue": self.state_queue, "cancellation_token": self.cancellation_token}
+        run_budget = budget or RunBudget.from_config(state.config.get("budget"))
+        budget_token = current_budget.set(run_budget)
+        try:
+            with job_trace(state.config.get("job_id")):
+                result = await get_compiled_graph(entry_node).ainvoke({"value": state}, context=context)
+        finally:
+            current_budget.reset(budget_token)
+        await self.state_queue.put(BackToFrontData(step=ExecutionState.FINISHED,state="finished",data=None))
+        result["value"].budget_usage = run_budget.report()
+        return result["value"]
+
+
+@lru_cache(maxsize=None)
+def get_compiled_graph(entry_node: str = "search_node"):
+    """每个进程只编译一次主流水线图（每个起始节点一份），所有请求共享"""
+    return PaperAgentOrchestrator._build_graph(entry_node=entry_node)
+
 
-    
 if __name__ == "__main__":
     # from IPython.display import Image, display
 
@@ -1,14 +1,23 @@
 from autogen_agentchat.agents import AssistantAgent
+from src.core.traced_agent import TracedAssistantAgent
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 from src.utils.log_utils import setup_logger
 from src.core.prompts import reading_agent_prompt
-from src.core.model_client import create_default_client, create_reading_model_client
+from src.core.model_client import create_default_client, create_reading_model_client, get_model_name
+from src.services.stage_cache import get_stage_cache
 from src.core.state_models import BackToFrontData
-from src.core.state_models import State,ExecutionState
+from src.core.state_models import State,ExecutionState,ConfigSchema
+from langgraph.runtime import get_runtime
 from src.services.chroma_client import ChromaClient
+from src.agents.search_agent import stream_papers
+from src.tasks.paper_filter import relevance_query
+from src.core.run_budget import BudgetExceededError, current_budget
+from src.core import deadline
+from src.utils.tracing import span
 import asyncio
 import json
+from functools import lru_cache
 
 logger = setup_logger(__name__)
 
@@ -33,43 +42,156 @@ class ExtractedPaperData(BaseModel):
 class ExtractedPapersData(BaseModel):
     papers: List[ExtractedPaperData] = Field(default=[], description="提取的论文数据列表")
 
-model_client = create_reading_model_client()
+@lru_cache(maxsize=None)
+def get_read_agent() -> AssistantAgent:
+    """首次使用时才创建阅读智能体及其模型客户端，避免导入模块时就初始化"""
+    return TracedAssistantAgent(
+        name="read_agent",
+        model_client=create_reading_model_client(),
+        system_message=reading_agent_prompt,
+        output_content_type=ExtractedPaperData,
+        model_client_stream=True
+    )
+
+
+def __getattr__(name: str):
+    # 兼容直接从模块导入read_agent的旧代码
+    if name == "read_agent":
+        return get_read_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def iter_papers(papers: List[dict]) -> AsyncIterator[dict]:
+    """把已有的论文列表包装成异步流"""
+    for paper in papers:
+        yield paper
+
+
+async def read_papers(papers: AsyncIterator[dict],
+                      state_queue,
+                      cancellation_token=None,
+                      max_count: Optional[int] = None,
+                      corpus_id: Optional[str] = None) -> Tuple[List[dict], List[ExtractedPaperData]]:
+    """以异步流的方式消费论文：每到达一篇论文就立即开始提取，提取完成后立即写入向量数据库
+
+    运行预算耗尽后不再接收新论文，尚未提取的论文被跳过，只返回已完成提取的部分。
+    临近截止时间时，任务运行到截止时间的reading-share比例后也不再接收新论文。
+
+    参数:
+        max_count: 最多接收的论文数，None表示不限制
+        corpus_id: 向量数据库中的范围标识，写作阶段只检索同一范围的论文，避免并发任务读到彼此的论文
+
+    返回:
+        (按到达顺序排列的论文列表, 与之一一对应的提取结果列表)
+    """
+    budget = current_budget.get()
+    # 每篇论文的提取结果单独缓存，相近的调研请求检索到同一篇论文时无需重新阅读
+    read_agent = get_read_agent()
+    stage_cache = get_stage_cache()
+    model_name = get_model_name("reading-model")
+    chroma_client = await asyncio.to_thread(ChromaClient)
+    search_results = []
+    parsed_papers = []
+    finished = 0
+
+    async def read_paper(index: int, paper: dict) -> None:
+        with span("reading.paper", "task", paper_id=paper["paper_id"]) as record:
+            await extract_paper(index, paper, record)
+
+    async def extract_paper(index: int, paper: dict, record) -> None:
+        nonlocal finished
+        key = stage_cache.make_key("reading", str(paper), [reading_agent_prompt], [model_name])
+        parsed_paper = await stage_cache.aget(key)
+        if record is not None:
+            record.set(cached=parsed_paper is not None)
+        if parsed_paper is None:
+            try:
+                result = await read_agent.run(task=str(paper), cancellation_token=cancellation_token)
+            except BudgetExceededError:
+                return
+            parsed_paper = result.messages[-1].content
+            if not deadline.output_degraded():
+                await stage_cache.aput(key, "reading", parsed_paper)
+        parsed_papers[index] = parsed_paper
+        # 提取完成后立即写入向量数据库，文档ID为范围标识加paper_id，同一任务重复阅读同一篇论文时覆盖旧记录
+        await asyncio.to_thread(
+            chroma_client.upsert_documents,
+            documents=[json.dumps(parsed_paper.model_dump(), ensure_ascii=False)],
+            ids=[f"{corpus_id}:{paper['paper_id']}" if corpus_id else paper["paper_id"]],
+            metadatas=[{**paper, "corpus_id": corpus_id} if corpus_id else paper],
+        )
+        finished += 1
+        await state_queue.put(BackToFrontData(step=ExecutionState.READING,state="thinking",data=f"已阅读 {finished} 篇：{paper.get('title', paper['paper_id'])}\n"))
+
+    tasks = []
+    try:
+        async for paper in papers:
+            if budget is not None and budget.exceeded_reason():
+                break
+            if max_count is not None and len(search_results) >= max_count:
+                break
+            if deadline.reading_cutoff_reached(len(search_results)):
+                deadline.record("reading_cutoff", f"阅读阶段已用完时间份额，只阅读前 {len(search_results)} 篇论文")
+                await state_queue.put(BackToFrontData(step=ExecutionState.READING,state="thinking",data=f"临近截止时间，不再阅读新论文，共阅读 {len(search_results)} 篇\n"))
+                break
+            search_results.append(paper)
+            parsed_papers.append(None)
+            tasks.append(asyncio.create_task(read_paper(len(search_results) - 1, paper)))
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    read = [(paper, parsed) for paper, parsed in zip(search_results, parsed_papers) if parsed is not None]
+    if len(read) < len(search_results) or (budget is not None and budget.exceeded_reason()):
+        reason = budget.exceeded_reason() if budget is not None else None
+        logger.warning(f"运行预算耗尽，停止阅读: 已阅读 {len(read)}/{len(search_results)} 篇, {reason}")
+        await state_queue.put(BackToFrontData(step=ExecutionState.READING,state="thinking",data=f"{reason}，停止阅读，共完成 {len(read)} 篇\n"))
+    return [paper for paper, _ in read], [parsed for _, parsed in read]
 
-read_agent = AssistantAgent(
-    name="read_agent",
-    model_client=model_client,
-    system_message=reading_agent_prompt,
-    output_content_type=ExtractedPaperData,
-    model_client_stream=True
-)
 
 async def reading_node(state: State) -> State:
-    """搜索论文节点"""
-    state_queue = state["state_queue"]
+    """阅读论文节点
+
+    流式检索模式下检索和阅读同时进行，不必等待全部检索结果。
+    """
+    context = get_runtime(ConfigSchema).context
+    state_queue = context["state_queue"]
     current_state = state["value"]
     current_state.current_step = ExecutionState.READING
     await state_queue.put(BackToFrontData(step=ExecutionState.READING,state="initializing",data=None))
 
-    papers = current_state.search_results
+    max_count = None
+    if current_state.search_results:
+        # 非流式模式，或从检查点恢复时检索结果已经保存在状态中
+        candidates = list(current_state.search_results)
+        max_count = deadline.reading_paper_cap(len(candidates))
+        if max_count < len(candidates):
+            # 经过相关性筛选时沿用筛选的分数，不重新打分
+            query = relevance_query(current_state.user_request, current_state.search_query)
+            candidates = deadline.rank_by_relevance(candidates, query, current_state.relevance_scores)[:max_count]
+        papers = iter_papers(candidates)
+    elif current_state.search_query:
+        max_count = deadline.reading_paper_cap(current_state.max_papers)
+        papers = stream_papers(current_state.search_query, current_state.max_papers)
+        if max_count < current_state.max_papers:
+            # 流式检索按到达顺序产出论文，不是相关性顺序：需要减少论文数时先取完检索结果，按相关性排序后再截断
+            candidates = [paper async for paper in papers]
+            query = relevance_query(current_state.user_request, current_state.search_query)
+            papers = iter_papers(deadline.rank_by_relevance(candidates, query)[:max_count])
+    else:
+        papers = iter_papers([])
 
-    # 将papers合理分割成多个任务，交给多个read_agent并行执行，最后合并结果
-    # 并行执行任务，使用asyncio.gather
-    results = await asyncio.gather(*[read_agent.run(task=str(paper)) for paper in papers])
+    search_results, parsed_papers = await read_papers(papers, state_queue, context.get("cancellation_token"), max_count, current_state.corpus_id)
+    current_state.search_results = search_results
+    if not search_results:
+        current_state.error.reading_node_error = "没有找到相关论文,请尝试其他查询条件"
+        await state_queue.put(BackToFrontData(step=ExecutionState.READING,state="error",data=current_state.error.reading_node_error))
+        return {"value": current_state}
 
-    # 合并结果
-    extracted_papers = ExtractedPapersData()
-    for result in results:
-        parsed_paper = result.messages[-1].content
-        extracted_papers.papers.append(parsed_paper)     
-     # 还得存入向量数据库中
-    chroma_client = ChromaClient()
-    chroma_client.add_documents(
-        documents=[json.dumps(paper.model_dump(),ensure_ascii=False) for paper in extracted_papers.papers],
-        metadatas=[paper for paper in papers],
-    )   
-        
-    current_state.extracted_data = extracted_papers
-    await state_queue.put(BackToFrontData(step=ExecutionState.READING,state="completed",data=f"论文阅读完成，共阅读 {len(extracted_papers.papers)} 篇论文"))
+    # 合并结果，保持检索结果的顺序
+    current_state.extracted_data = ExtractedPapersData(papers=parsed_papers)
+    await state_queue.put(BackToFrontData(step=ExecutionState.READING,state="completed",data=f"论文阅读完成，共阅读 {len(parsed_papers)} 篇论文"))
     return {"value": current_state}
 
 
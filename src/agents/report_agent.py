@@ -1,31 +1,44 @@
 from autogen_agentchat.agents import AssistantAgent
+from src.core.traced_agent import TracedAssistantAgent
 
 from src.utils.log_utils import setup_logger
 from src.utils.tool_utils import handlerChunk
 from src.tasks.paper_search import PaperSearcher
-from src.core.state_models import State,ExecutionState
+from src.core.state_models import State,ExecutionState,ConfigSchema
+from langgraph.runtime import get_runtime
 from src.core.prompts import report_agent_prompt
 from src.core.state_models import BackToFrontData
 from autogen_agentchat.base import TaskResult
+from functools import lru_cache
 
-from src.core.model_client import create_default_client, create_report_model_client
+from src.core.model_client import create_default_client, create_report_model_client, get_model_name
+from src.services.stage_cache import get_stage_cache
+from src.core import deadline
 
 logger = setup_logger(__name__)
 
 
-model_client = create_report_model_client()
+@lru_cache(maxsize=None)
+def get_report_agent() -> AssistantAgent:
+    """首次使用时才创建报告智能体及其模型客户端，避免导入模块时就初始化"""
+    return TracedAssistantAgent(
+        name="report_agent",
+        model_client=create_report_model_client(),
+        system_message=report_agent_prompt,
+        model_client_stream=True
+    )
 
 
-report_agent = AssistantAgent(
-    name="report_agent",
-    model_client=model_client,
-    system_message=report_agent_prompt,
-    model_client_stream=True
-)
+def __getattr__(name: str):
+    # 兼容直接从模块导入report_agent的旧代码
+    if name == "report_agent":
+        return get_report_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 async def report_node(state: State) -> State:
     """报告生成节点"""
-    state_queue = state["state_queue"]
+    context = get_runtime(ConfigSchema).context
+    state_queue = context["state_queue"]
     try:
         current_state = state["value"]
         current_state.current_step = ExecutionState.REPORTING
@@ -49,9 +62,18 @@ async def report_node(state: State) -> State:
         【额外说明】
         请确保章节逻辑顺序合理，如有需要可调整章节排列。
         """
+        stage_cache = get_stage_cache()
+        report_key = stage_cache.make_key("report", prompt, [report_agent_prompt], [get_model_name("report-model")])
+        report_markdown = await stage_cache.aget(report_key)
+        if report_markdown is not None:
+            logger.info("报告命中阶段缓存")
+            current_state.report_markdown = report_markdown
+            await state_queue.put(BackToFrontData(step=ExecutionState.REPORTING,state="completed",data=report_markdown))
+            return {"value": current_state}
+
         is_thinking = None
         is_First = True
-        async for chunk in report_agent.run_stream(task = prompt):
+        async for chunk in get_report_agent().run_stream(task = prompt, cancellation_token=context.get("cancellation_token")):
             if is_First:
                 is_First = False
                 continue
@@ -67,6 +89,8 @@ async def report_node(state: State) -> State:
                     continue
                 await state_queue.put(BackToFrontData(step=ExecutionState.REPORTING,state=state,data=chunk.content))
         
+        if not deadline.output_degraded():
+            await stage_cache.aput(report_key, "report", current_state.report_markdown)
         await state_queue.put(BackToFrontData(step=ExecutionState.REPORTING,state="completed",data=None))
         return {"value": current_state}
 
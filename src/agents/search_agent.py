@@ -1,25 +1,29 @@
 from autogen_agentchat.agents import AssistantAgent
-from autogen_agentchat.messages import TextMessage
-from autogen_core import CancellationToken
-from src.agents.userproxy_agent import WebUserProxyAgent,userProxyAgent
+from src.core.traced_agent import TracedAssistantAgent
+from src.agents.userproxy_agent import ReviewPolicy, review_registry
+from functools import lru_cache
 from pydantic import BaseModel, Field
-from typing import Optional,List
+from typing import Any, AsyncIterator, Dict, Optional, List
 import re
 import ast
 
 from src.utils.log_utils import setup_logger
+from src.tasks import paper_search
 from src.tasks.paper_search import PaperSearcher
-from src.core.state_models import State,ExecutionState
+from src.tasks.paper_filter import candidate_count, is_enabled as filter_enabled
+from src.core.state_models import State,ExecutionState,ConfigSchema,PaperAgentState
+from langgraph.runtime import get_runtime
 from src.core.prompts import search_agent_prompt
 from src.core.state_models import BackToFrontData
 
-from src.core.model_client import create_search_model_client
+from src.core.model_client import create_search_model_client, get_model_name
+from src.services.query_cache import QueryCache, get_query_cache
+from src.services.stage_cache import get_stage_cache
+from src.core.config import config
 
 logger = setup_logger(__name__)
 
 
-model_client = create_search_model_client()
-
 # 创建一个查询条件类，包括查询内容、主题、时间范围等信息，用于存储用户的查询需求
 class SearchQuery(BaseModel):
     """查询条件类，存储用户查询需求"""
@@ -27,12 +31,22 @@ class SearchQuery(BaseModel):
     start_date: Optional[str] = Field(default=None, description="开始时间, 格式: YYYY-MM-DD")
     end_date: Optional[str] = Field(default=None, description="结束时间, 格式: YYYY-MM-DD")
 
-search_agent = AssistantAgent(
-    name="search_agent",
-    model_client=model_client,
-    system_message=search_agent_prompt,
-    output_content_type=SearchQuery
-)
+@lru_cache(maxsize=None)
+def get_search_agent() -> AssistantAgent:
+    """首次使用时才创建搜索智能体及其模型客户端，避免导入模块时就初始化"""
+    return TracedAssistantAgent(
+        name="search_agent",
+        model_client=create_search_model_client(),
+        system_message=search_agent_prompt,
+        output_content_type=SearchQuery
+    )
+
+
+def __getattr__(name: str):
+    # 兼容直接从模块导入search_agent的旧代码
+    if name == "search_agent":
+        return get_search_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def parse_search_query(s: str) -> SearchQuery:
     """将前端传回的字符串转为 SearchQuery 对象"""
@@ -53,37 +67,128 @@ def parse_search_query(s: str) -> SearchQuery:
 
     return SearchQuery(querys=querys, start_date=start_date, end_date=end_date)
 
+def format_date(date: str) -> str:
+    """与检索时相同的日期格式（YYYYMMDD0000）"""
+    return paper_search.PaperSearcher._format_date(date)
+
+def search_results_key(search_query: SearchQuery, max_results: int) -> str:
+    """检索结果的缓存键，流式检索和一次性检索共用，两者的结果可以互相复用"""
+    # 日期按检索时实际使用的格式计入缓存键，"2024-01-01"和"2024/01/01"共用缓存；
+    # 检索后端和是否分关键词检索会改变结果的排序和组成，一并计入缓存键
+    return get_stage_cache().make_key("search", {
+        "querys": QueryCache.normalize_querys(search_query.querys),
+        "start_date": format_date(search_query.start_date) if search_query.start_date else None,
+        "end_date": format_date(search_query.end_date) if search_query.end_date else None,
+        "max_results": max_results,
+        "fan_out": config.get_bool("search.fan-out", True),
+        "backend": config.get("search.backend") or "arxiv",
+    })
+
+async def load_search_results(key: str) -> Optional[List[Dict[str, Any]]]:
+    """读取缓存的检索结果：先查进程内热层，未命中再查阶段缓存；检索结果会随arXiv更新而变化，只在search-ttl-seconds内有效"""
+    results = get_query_cache().get(key)
+    if results is None:
+        results = await get_stage_cache().aget(key, max_age=config.get_float("stage-cache.search-ttl-seconds", 86400))
+    if results is not None:
+        logger.info(f"检索结果命中缓存: {len(results)} 篇论文")
+    return results
+
+async def save_search_results(key: str, papers: List[Dict[str, Any]]) -> None:
+    """新检索到的结果同时写入进程内热层和阶段缓存"""
+    if papers:
+        get_query_cache().put(key, papers)
+        await get_stage_cache().aput(key, "search", papers)
+
+async def stream_papers(search_query: Dict[str, Any], max_papers: int = 50) -> AsyncIterator[Dict[str, Any]]:
+    """按审核后的检索条件逐篇产出论文，供阅读阶段边检索边阅读
+
+    命中阶段缓存时直接回放缓存的检索结果；完整检索结束后把结果写入缓存。
+    """
+    search_query = SearchQuery(**search_query)
+    results_key = search_results_key(search_query, max_papers)
+    results = await load_search_results(results_key)
+    if results is not None:
+        for paper in results:
+            yield paper
+        return
+
+    papers = []
+    async for paper in PaperSearcher().iter_papers(
+        querys = search_query.querys,
+        max_results = max_papers,
+        page_size = config.get_int("search.page-size", 10),
+        start_date = search_query.start_date,
+        end_date = search_query.end_date,
+    ):
+        papers.append(paper)
+        yield paper
+    # 只缓存完整读取的检索结果，调用方提前停止时不写入
+    await save_search_results(results_key, papers)
+
+async def search_papers_cached(search_query: SearchQuery, max_results: int) -> List[Dict[str, Any]]:
+    """一次性检索全部论文，命中缓存时直接返回缓存的结果"""
+    results_key = search_results_key(search_query, max_results)
+    results = await load_search_results(results_key)
+    if results is not None:
+        return results
+    results = await PaperSearcher().search_papers(
+        querys = search_query.querys,
+        max_results = max_results,
+        start_date = search_query.start_date,
+        end_date = search_query.end_date,
+    )
+    await save_search_results(results_key, results)
+    return results
+
+async def generate_search_query(current_state: PaperAgentState, state_queue, cancellation_token=None) -> SearchQuery:
+    """根据用户请求生成检索条件，并按任务的审核策略等待人工审核，返回审核后的检索条件"""
+    prompt = f"""
+        请根据用户查询需求，生成检索查询条件。
+        用户查询需求：{current_state.user_request}
+        """
+    # 相同的用户请求直接复用上次生成的查询条件，人工审核仍照常进行
+    stage_cache = get_stage_cache()
+    query_key = stage_cache.make_key("search-query", prompt, [search_agent_prompt], [get_model_name("search-model")])
+    search_query = await stage_cache.aget(query_key)
+    if search_query is None:
+        response = await get_search_agent().run(task = prompt, cancellation_token=cancellation_token)
+        search_query = response.messages[-1].content
+        await stage_cache.aput(query_key, "search-query", search_query)
+    review_policy = current_state.config.get("review_policy") or review_registry.policy
+    if review_policy != ReviewPolicy.AUTO:
+        await state_queue.put(BackToFrontData(step=ExecutionState.SEARCHING,state="user_review",data=f"{search_query}"))
+
+    # 按任务等待人工审核，超时后根据审核策略自动通过或使任务失败
+    job_id = current_state.config.get("job_id")
+    reviewed = await review_registry.request_review(
+        job_id,
+        f"{search_query}",
+        cancellation_token=cancellation_token,
+        policy=review_policy,
+    )
+    return parse_search_query(reviewed)
+
 async def search_node(state: State) -> State:
     
     """搜索论文节点"""
-    state_queue = None
+    context = get_runtime(ConfigSchema).context
+    state_queue = context["state_queue"]
     try:
-        state_queue = state["state_queue"]
         current_state = state["value"]
         current_state.current_step = ExecutionState.SEARCHING
         await state_queue.put(BackToFrontData(step=ExecutionState.SEARCHING,state="initializing",data=None))
 
-        prompt = f"""
-        请根据用户查询需求，生成检索查询条件。
-        用户查询需求：{current_state.user_request}
-        """
-        response = await search_agent.run(task = prompt)
-        search_query = response.messages[-1].content
-        await state_queue.put(BackToFrontData(step=ExecutionState.SEARCHING,state="user_review",data=f"{search_query}"))
-        
-        result = await userProxyAgent.on_messages(
-            [TextMessage(content="请人工审核：查询条件是否符合？", source="AI")],
-            cancellation_token=CancellationToken()
-        )
-        search_query = parse_search_query(result.content)
-
-        # 调用检索服务
-        paper_searcher = PaperSearcher()
-        results = await paper_searcher.search_papers(
-            querys = search_query.querys,
-            start_date = search_query.start_date,
-            end_date = search_query.end_date,
-        )
+        search_query = await generate_search_query(current_state, state_queue, context.get("cancellation_token"))
+        current_state.search_query = search_query.model_dump()
+
+        if config.get_bool("search.streaming", True) and not filter_enabled():
+            # 流式模式：检索交给阅读阶段，拿到第一页结果就开始阅读，不必等待全部检索完成
+            # 相关性筛选需要全部候选论文才能排序，启用筛选时一次性检索，由filter_node保留最相关的论文
+            await state_queue.put(BackToFrontData(step=ExecutionState.SEARCHING,state="completed",data="检索条件已确定，开始边检索边阅读论文"))
+            return {"value": current_state}
+
+        # 启用相关性筛选时多检索一些候选论文，由filter_node保留最相关的max_papers篇
+        results = await search_papers_cached(search_query, candidate_count(current_state.max_papers))
         # [{'paper_id': '2411.11607v2', 'title': 'Performance evaluation of a ROS2 based Automated Driving System', 'authors': [...], 'summary': 'Automated driving is currently a prominent area of scientific work. In the\nfuture, highly automated driving and new Advanced Driver Assistance Systems\nwill become reality. While Advanced Driver Assistance Systems and automated\ndriving functions for certain domains are already commercially available,\nubiquitous automated driving in complex scenarios remains a subject of ongoing\nresearch. Contrarily to single-purpose Electronic Control Units, the software\nfor automated driving is often executed on high performance PCs. The Robot\nOperating System 2 (ROS2) is commonly used to connect components in an\nautomated driving system. Due to the time critical nature of automated driving\nsystems, the performance of the framework is especially important. In this\npaper, a thorough performance evaluation of ROS2 is conducted, both in terms of\ntimeliness and error rate. The results show that ROS2 is a suitable framework\nfor automated driving systems.', 'published': 2024, 'published_date': '2024-11-18T14:29:22+00:00', 'url': 'http://arxiv.org/abs/2411.11607v2', 'pdf_url': 'http://arxiv.org/pdf/2411.11607v2', 'primary_category': 'cs.RO', 'categories': [...], 'doi': '10.5220/0012556800003702'}, {'paper_id': '2307.06258v1', 'title': 'Connected Dependability Cage Approach for Safe Automated Driving', 'authors': [...], 'summary': "Automated driving systems can be helpful in a wide range of societal\nchallenges, e.g., mobility-on-demand and transportation logistics for last-mile\ndelivery, by aiding the vehicle driver or taking over the responsibility for\nthe dynamic driving task partially or completely. Ensuring the safety of\nautomated driving systems is no trivial task, even more so for those systems of\nSAE Level 3 or above. To achieve this, mechanisms are needed that can\ncontinuously monitor the system's operating conditions, also denoted as the\nsystem's operational design domain. This paper presents a safety concept for\nautomated driving systems which uses a combination of onboard runtime\nmonitoring via connected dependability cage and off-board runtime monitoring\nvia a remote command control center, to continuously monitor the system's ODD.\nOn one side, the connected dependability cage fulfills a double functionality:\n(1) to monitor continuously the operational design domain of the automated\ndriving system, and (2) to transfer the responsibility in a smooth and safe\nmanner between the automated driving system and the off-board remote safety\ndriver, who is present in the remote command control center. On the other side,\nthe remote command control center enables the remote safety driver the\nmonitoring and takeover of the vehicle's control. We evaluate our safety\nconcept for automated driving systems in a lab environment and on a test field\ntrack and report on results and lessons learned.", 'published': 2023, 'published_date': '2023-07-12T15:55:48+00:00', 'url': 'http://arxiv.org/abs/2307.06258v1', 'pdf_url': 'http://arxiv.org/pdf/2307.06258v1', 'primary_category': 'cs.RO', 'categories': [...], 'doi': None}]
         current_state.search_results = results
         if len(results) > 0:
@@ -7,17 +7,19 @@
 import asyncio
 import json
 from autogen_agentchat.agents import AssistantAgent
+from src.core.traced_agent import TracedAssistantAgent
+from autogen_core import CancellationToken
 from src.core.model_client import create_default_client, create_subanalyse_cluster_model_client, create_cluster_embedding_client
 from src.core.prompts import clustering_agent_prompt
 from src.agents.reading_agent import ExtractedPaperData, ExtractedPapersData
 import numpy as np
 from typing import List, Dict, Any, Tuple, Union
-from sklearn.cluster import KMeans
+# sklearn导入耗时较长，在真正执行聚类时才导入
 # from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from openai import OpenAI
 from dataclasses import dataclass
 from src.utils.log_utils import setup_logger
+from src.utils.metrics import EMBEDDING_LATENCY
+from src.utils.tracing import span
 
 # 配置日志
 logger = setup_logger(__name__)
@@ -38,7 +40,7 @@ class PaperClusterAgent:
     def __init__(self, model_client=None):
         """初始化聚类智能体"""
         self.model_client = create_subanalyse_cluster_model_client()
-        self.clustering_agent = AssistantAgent(
+        self.clustering_agent = TracedAssistantAgent(
             name="clustering_agent",
             model_client= self.model_client,
             system_message = clustering_agent_prompt
@@ -47,11 +49,13 @@ class PaperClusterAgent:
 
     def get_embedding(self, text: Union[str, List[str]]) -> list[float]:
         client = create_cluster_embedding_client()
-        response = client.embeddings.create(
-            model=client.default_headers["X-Model"],
-            input=text,
-            dimensions=1024
-        )
+        texts = 1 if isinstance(text, str) else len(text)
+        with EMBEDDING_LATENCY.labels("cluster").time(), span("embedding.cluster", "io", texts=texts):
+            response = client.embeddings.create(
+                model=client.default_headers["X-Model"],
+                input=text,
+                dimensions=1024
+            )
         res = []
         for tmp in response.data:
             res.append(tmp.embedding)
@@ -95,6 +99,8 @@ class PaperClusterAgent:
         
     def determine_optimal_clusters(self, embeddings: np.ndarray, max_k: int = 5) -> int:
         """使用肘部法则确定最佳聚类数量"""
+        from sklearn.cluster import KMeans
+
         if len(embeddings) <= 2:
             return 1
             
@@ -105,11 +111,12 @@ class PaperClusterAgent:
         inertias = []
         k_range = range(1, max_clusters + 1)
         
-        for k in k_range:
-            if k <= len(embeddings):
-                kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-                kmeans.fit(embeddings)
-                inertias.append(kmeans.inertia_)
+        with span("cluster.elbow_kmeans", "compute", papers=len(embeddings), max_k=max_clusters):
+            for k in k_range:
+                if k <= len(embeddings):
+                    kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
+                    kmeans.fit(embeddings)
+                    inertias.append(kmeans.inertia_)
         
         # 简单的肘部法则实现
         if len(inertias) >= 3:
@@ -141,8 +148,10 @@ class PaperClusterAgent:
             )]
         
         # 执行KMeans聚类
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        cluster_labels = kmeans.fit_predict(embeddings)
+        from sklearn.cluster import KMeans
+        with span("cluster.kmeans", "compute", papers=len(papers), clusters=n_clusters):
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+            cluster_labels = kmeans.fit_predict(embeddings)
         
         # 构建聚类结果
         clusters = []
@@ -243,7 +252,7 @@ class PaperClusterAgent:
             logger.error(f"解析LLM响应时出错:\n {e}")
             return "未分类研究主题", ["research"]
     
-    async def generate_cluster_theme(self, cluster: PaperCluster) -> str:
+    async def generate_cluster_theme(self, cluster: PaperCluster, cancellation_token: CancellationToken = None) -> str:
         """使用LLM为聚类生成主题描述和关键词"""
         try:
             # 准备聚类中的论文摘要
@@ -270,7 +279,7 @@ class PaperClusterAgent:
                 主题描述：[主题描述]
                 关键词：[关键词1, 关键词2, 关键词3]
             """
-            response = await self.clustering_agent.run(task=prompt)
+            response = await self.clustering_agent.run(task=prompt, cancellation_token=cancellation_token)
             
             # 解析LLM响应
             theme_description, keywords = self.parse_llm_response(response.messages[-1].content)
@@ -281,7 +290,7 @@ class PaperClusterAgent:
             return "未分类研究主题"
     
 
-    async def run_clustering_analyse(self, papers_data: Dict[str, Any]) -> List[PaperCluster]:
+    async def run_clustering_analyse(self, papers_data: Dict[str, Any], cancellation_token: CancellationToken = None) -> List[PaperCluster]:
         """运行完整的聚类分析"""
         papers = papers_data.get("papers", [])
         
@@ -296,7 +305,7 @@ class PaperClusterAgent:
         # 为每个聚类生成主题和关键词
         results = []
         for cluster in clusters:
-            theme_description, keywords = await self.generate_cluster_theme(cluster)
+            theme_description, keywords = await self.generate_cluster_theme(cluster, cancellation_token)
             paperCluster = PaperCluster(
                 cluster_id=cluster.cluster_id,
                 papers=cluster.papers,
@@ -305,10 +314,10 @@ class PaperClusterAgent:
             results.append(paperCluster)
         
         return results
-    def run(self, papers_data: ExtractedPapersData):
+    def run(self, papers_data: ExtractedPapersData, cancellation_token: CancellationToken = None):
         """统一接口方法"""
         papers = papers_data.model_dump()
-        return self.run_clustering_analyse(papers)
+        return self.run_clustering_analyse(papers, cancellation_token)
 
 async def main():
     """主测试函数"""
@@ -13,6 +13,8 @@ from dataclasses import dataclass
 from src.core.prompts import deep_analyse_agent_prompt
 from src.core.model_client import create_default_client, create_subanalyse_deep_analyse_model_client
 from autogen_agentchat.agents import AssistantAgent
+from src.core.traced_agent import TracedAssistantAgent
+from autogen_core import CancellationToken
 from src.agents.sub_analyse_agent.cluster_agent import PaperCluster
 from src.utils.log_utils import setup_logger
 
@@ -41,19 +43,34 @@ class DeepAnalyseResult:
         }
 
 class DeepAnalyseAgent:
-    async def run(self, cluster_data):
+    async def run(self, cluster_data, cancellation_token: CancellationToken = None):
         """统一接口方法"""
-        return await self.deep_analyze_cluster(cluster_data)
+        return await self.deep_analyze_cluster(cluster_data, cancellation_token)
         
     def __init__(self, model_client=None):
         """初始化聚类智能体"""
         self.model_client = create_subanalyse_deep_analyse_model_client()
-        self.deep_analyse_agent = AssistantAgent(
+        self.deep_analyse_agent = TracedAssistantAgent(
             name="deep_analyse_agent",
             model_client= self.model_client,
             system_message = deep_analyse_agent_prompt
         )
-    async def deep_analyze_cluster(self, cluster: PaperCluster) -> DeepAnalyseResult:
+    @staticmethod
+    def summarize_cluster(cluster: PaperCluster) -> DeepAnalyseResult:
+        """不调用模型，直接汇总聚类中各论文的核心问题和主要结果，临近截止时间时代替深度分析"""
+        lines = ["（时间不足，未进行深度分析，以下为论文要点汇总）"]
+        for paper in cluster.papers:
+            lines.append(f"- 核心问题：{paper.get('core_problem', '')}；主要结果：{paper.get('main_results', '')}")
+        return DeepAnalyseResult(
+            cluster_id=cluster.cluster_id,
+            theme=cluster.theme_description,
+            keywords=cluster.keywords,
+            paper_count=len(cluster.papers),
+            deep_analyse="\n".join(lines),
+            papers=cluster.papers
+        )
+
+    async def deep_analyze_cluster(self, cluster: PaperCluster, cancellation_token: CancellationToken = None) -> DeepAnalyseResult:
         """对单个聚类进行深入分析"""
         try:
             
@@ -71,7 +88,7 @@ class DeepAnalyseAgent:
                 请以结构化的方式组织你的分析结果。
 """
             
-            response = await self.deep_analyse_agent.run(task=prompt)
+            response = await self.deep_analyse_agent.run(task=prompt, cancellation_token=cancellation_token)
             analyse_content = response.messages[-1].content
             
             return DeepAnalyseResult(
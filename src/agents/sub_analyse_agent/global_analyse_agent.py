@@ -10,28 +10,30 @@ from typing import Dict, Any, List
 from src.core.prompts import global_analyse_agent_prompt
 from src.core.model_client import create_default_client, create_subanalyse_global_analyse_model_client
 from autogen_agentchat.agents import AssistantAgent
+from src.core.traced_agent import TracedAssistantAgent
+from autogen_core import CancellationToken
 from src.agents.sub_analyse_agent.deep_analyse_agent import DeepAnalyseResult
 from src.utils.log_utils import setup_logger
 
 logger = setup_logger(__name__)
 
 class GlobalanalyseAgent:
-    async def run(self, cluster_results: List[DeepAnalyseResult]):
+    async def run(self, cluster_results: List[DeepAnalyseResult], cancellation_token: CancellationToken = None):
         """统一接口方法"""
-        async for chunk in self.generate_global_analyse(cluster_results):
+        async for chunk in self.generate_global_analyse(cluster_results, cancellation_token):
             yield chunk
         
     def __init__(self, model_client=None):
         """初始化聚类智能体"""
         self.model_client = create_subanalyse_global_analyse_model_client()
-        self.global_analyse_agent = AssistantAgent(
+        self.global_analyse_agent = TracedAssistantAgent(
             name="global_analyse_agent",
             model_client= self.model_client,
             system_message = global_analyse_agent_prompt,
             model_client_stream=True
         )
     
-    async def generate_global_analyse(self, analyse_results: List[DeepAnalyseResult]) -> Dict[str, Any]:
+    async def generate_global_analyse(self, analyse_results: List[DeepAnalyseResult], cancellation_token: CancellationToken = None) -> Dict[str, Any]:
         """生成全局分析草稿 - 汇总各主题分析结果"""
         try:
             # 准备所有聚类的分析内容
@@ -112,7 +114,7 @@ class GlobalanalyseAgent:
             # response = await self.global_analyse_agent.run(task=prompt)
             # global_analyse = response.messages[-1].content
             is_First = True
-            response = self.global_analyse_agent.run_stream(task=prompt)
+            response = self.global_analyse_agent.run_stream(task=prompt, cancellation_token=cancellation_token)
             async for chunk in response: 
                 if is_First:
                     is_First = False
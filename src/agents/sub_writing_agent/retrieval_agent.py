@@ -1,5 +1,6 @@
 from autogen_core.tools import FunctionTool
 from autogen_agentchat.agents import AssistantAgent
+from src.core.traced_agent import TracedAssistantAgent
 from src.core.prompts import retrieval_agent_prompt
 from typing import Dict, Any
 from src.utils.log_utils import setup_logger
@@ -8,22 +9,30 @@ from src.core.model_client import create_default_client, create_subwriting_retri
 from src.services.retrieval_tool import retrieval_tool
 from src.agents.sub_writing_agent.writing_state_models import WritingState, SectionState
 import asyncio
+from functools import lru_cache
 
 logger = setup_logger(__name__)
 
 
-model_client = create_subwriting_retrieval_model_client()
+retriever = FunctionTool(retrieval_tool, description="用于联网查询外部资料，来辅助写作的工具")
 
+@lru_cache(maxsize=None)
+def get_retrieval_agent() -> AssistantAgent:
+    """首次使用时才创建检索智能体及其模型客户端，避免导入模块时就初始化"""
+    return TracedAssistantAgent(
+        name="retrieval_agent",
+        model_client=create_subwriting_retrieval_model_client(),
+        # tools=[retriever],
+        description="一个检索助手，负责根据条件联网查询外部资料。",
+        system_message=retrieval_agent_prompt,
+    )
 
-retriever = FunctionTool(retrieval_tool, description="用于联网查询外部资料，来辅助写作的工具")
 
-retrieval_agent = AssistantAgent(
-    name="retrieval_agent",
-    model_client=model_client,
-    # tools=[retriever],
-    description="一个检索助手，负责根据条件联网查询外部资料。",
-    system_message=retrieval_agent_prompt,
-)
+def __getattr__(name: str):
+    # 兼容直接从模块导入retrieval_agent的旧代码
+    if name == "retrieval_agent":
+        return get_retrieval_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def parse_to_list(s: str) -> list[str]:
     # 使用正则表达式提取[]之间的内容
@@ -58,7 +67,7 @@ async def retrieval_node(state: WritingState) -> Dict[str, Any]:
         querys  = ['语言模型', '大模型','语言模型原理']
         # retrieved_docs = []
         # 将querys并行交给retrieval_tool去执行，并将结果合并
-        results = retrieval_tool(querys)
+        results = retrieval_tool(querys, corpus_id=state.get("corpus_id"))
         # results = await asyncio.gather(*[retrieval_tool(query) for query in querys])
         # 去重
         for result in results:
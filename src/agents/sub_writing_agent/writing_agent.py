@@ -1,5 +1,5 @@
 from autogen_agentchat.agents import AssistantAgent
-from langchain_core.messages import content_blocks
+from src.core.traced_agent import TracedAssistantAgent
 from src.core.prompts import writing_agent_prompt
 from src.agents.sub_writing_agent.writing_state_models import WritingState, SectionState
 from typing import Dict, Any
@@ -7,19 +7,29 @@ from src.utils.log_utils import setup_logger
 
 from src.core.model_client import create_default_client, create_subwriting_writing_model_client
 from src.core.state_models import ExecutionState,BackToFrontData
+from src.core import deadline
+from functools import lru_cache
 
 
 logger = setup_logger(__name__)
 
 
-model_client = create_subwriting_writing_model_client()
+@lru_cache(maxsize=None)
+def get_writing_agent() -> AssistantAgent:
+    """首次使用时才创建写作智能体及其模型客户端，避免导入模块时就初始化"""
+    return TracedAssistantAgent(
+        name="writing_agent",
+        description="一个论文写作助手，负责根据指令写作。",
+        model_client=create_subwriting_writing_model_client(),
+        system_message=writing_agent_prompt,
+    )
 
-writing_agent = AssistantAgent(
-    name="writing_agent",
-    description="一个论文写作助手，负责根据指令写作。",
-    model_client=model_client,
-    system_message=writing_agent_prompt,
-)
+
+def __getattr__(name: str):
+    # 兼容直接从模块导入writing_agent的旧代码
+    if name == "writing_agent":
+        return get_writing_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 start_flag = 0
 async def section_writing_node(state: WritingState) -> Dict[str, Any]:
@@ -55,12 +65,21 @@ async def section_writing_node(state: WritingState) -> Dict[str, Any]:
                 请开始写作：
         """
 
-        response = await writing_agent.run(task = prompt)
+        response = await get_writing_agent().run(task = prompt, cancellation_token=state.get("cancellation_token"))
         content = response.messages[-1].content
         writted_sections[-1].content = content
         logger.info(f"写作内容: {content}")
 
-        if "APPROVED" in content:
+        approved = "APPROVED" in content
+        if not approved:
+            writted_sections[-1].revisions += 1
+            # 临近截止时间时限制每个小节的修改次数，达到上限后直接采用当前内容
+            max_revisions = deadline.max_section_revisions()
+            if max_revisions is not None and writted_sections[-1].revisions > max_revisions:
+                deadline.record("cap_revisions", f"剩余时间不足，每个小节最多修改 {max_revisions} 次")
+                approved = True
+
+        if approved:
             writted_sections[-1].completed = True
             retrieved_docs = []
             await state_queue.put(BackToFrontData(step=ExecutionState.SECTION_WRITING,state="generating",data=writted_sections[-1].content))
@@ -1,4 +1,5 @@
 from autogen_agentchat.agents import AssistantAgent
+from src.core.traced_agent import TracedAssistantAgent
 from src.core.prompts import writing_director_agent_prompt
 from src.agents.sub_writing_agent.writing_state_models import WritingState
 from src.core.state_models import BackToFrontData
@@ -11,21 +12,29 @@ from src.utils.tool_utils import handlerChunk
 
 from src.core.model_client import create_default_client, create_subwriting_writing_director_model_client
 from autogen_agentchat.base import TaskResult
+from functools import lru_cache
 
 
 logger = setup_logger(__name__)
 
 
-model_client = create_subwriting_writing_director_model_client()
+@lru_cache(maxsize=None)
+def get_writing_director_agent() -> AssistantAgent:
+    """首次使用时才创建写作主管智能体及其模型客户端，避免导入模块时就初始化"""
+    return TracedAssistantAgent(
+        name="writing_director_agent",
+        description="一个写作主管，你只负责拆分写作任务，并返回小节列表。",
+        model_client=create_subwriting_writing_director_model_client(),
+        system_message=writing_director_agent_prompt,
+        model_client_stream=True,
+    )
 
 
-writing_director_agent = AssistantAgent(
-    name="writing_director_agent",
-    description="一个写作主管，你只负责拆分写作任务，并返回小节列表。",
-    model_client=model_client,
-    system_message=writing_director_agent_prompt,
-    model_client_stream=True,
-)
+def __getattr__(name: str):
+    # 兼容直接从模块导入writing_director_agent的旧代码
+    if name == "writing_director_agent":
+        return get_writing_director_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def parse_outline(outline_str: str) -> List[str]:
     """
@@ -71,7 +80,7 @@ async def writing_director_node(state: WritingState) -> Dict[str, Any]:
         # response = await writing_director_agent.run(task = prompt)
         is_thinking = None
         is_first = True
-        async for chunk in writing_director_agent.run_stream(task = prompt):
+        async for chunk in get_writing_director_agent().run_stream(task = prompt, cancellation_token=state.get("cancellation_token")):
             if is_first:
                 is_first = False
                 continue
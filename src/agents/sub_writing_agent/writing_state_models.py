@@ -4,6 +4,7 @@ from typing import List, Optional, Dict, Any, TypedDict
 from typing_extensions import Annotated
 from langgraph.graph.message import add_messages
 from asyncio import Queue
+from autogen_core import CancellationToken
 
 
 class WritingStage(Enum):
@@ -19,9 +20,12 @@ class SectionState(BaseModel):
     content: Optional[str] = None
     # research_materials: List[Dict[str, Any]] = []
     completed: bool = False
+    # 未通过自检、需要检索资料后重写的次数
+    revisions: int = 0
 
 class WritingState(TypedDict):
     state_queue: Queue
+    cancellation_token: Optional[CancellationToken]
     user_request: str
     # 全局分析结果
     global_analysis: Optional[str] = None
@@ -34,4 +38,6 @@ class WritingState(TypedDict):
     current_section_index: int = 0
     # 检索到的相关资料
     retrieved_docs: List[Dict[str, Any]] = []
+    # 向量数据库中本任务论文的范围标识，检索时只查询本任务阅读过的论文
+    corpus_id: Optional[str] = None
 
@@ -1,7 +1,10 @@
 import asyncio
+from enum import Enum
+from typing import Dict, Optional
 from autogen_agentchat.agents import UserProxyAgent
 from autogen_agentchat.messages import TextMessage
 from autogen_core import CancellationToken
+from src.core.config import config
 from src.utils.log_utils import setup_logger
 
 logger = setup_logger(__name__)
@@ -10,18 +13,90 @@ class WebUserProxyAgent(UserProxyAgent):
     def __init__(self, name):
         super().__init__(name)
         self.waiting_future = None  # 保存等待的future对象
-    
+
     async def on_messages(self, messages, cancellation_token: CancellationToken):
         # 触发等待：通知前端“等待人工输入”
         self.waiting_future = asyncio.get_event_loop().create_future()
+        # 任务被取消时同时取消等待中的人工输入
+        cancellation_token.link_future(self.waiting_future)
         # 等待前端输入
         user_input = await self.waiting_future
         # 收到输入后返回给AutoGen
         return TextMessage(content=user_input, source="human")
 
-    def set_user_input(self, user_input: str):
-        """外部接口：被前端调用时唤醒等待"""
+    def set_user_input(self, user_input: str) -> bool:
+        """外部接口：被前端调用时唤醒等待，当前没有等待中的输入时返回False"""
         if self.waiting_future and not self.waiting_future.done():
             self.waiting_future.set_result(user_input)
+            return True
+        return False
+
+
+class ReviewPolicy(str, Enum):
+    """人工审核策略"""
+    AUTO = "auto"                    # 不等待人工审核，直接采用模型生成的结果（适合无人值守的批量任务）
+    APPROVE_AFTER = "approve_after"  # 等待人工审核，超时后自动采用模型生成的结果
+    REQUIRE = "require"              # 必须人工审核，超时后任务失败
+
+
+class ReviewTimeoutError(Exception):
+    """人工审核超时"""
+
+
+class ReviewRegistry:
+    """按任务管理人工审核：每个任务使用独立的WebUserProxyAgent，互不覆盖
+
+    等待人工输入时最多等待timeout_seconds，避免无人处理的审核一直占用流水线运行槽位。
+    """
+
+    def __init__(self, policy: Optional[str] = None, timeout_seconds: Optional[float] = None):
+        self.policy = ReviewPolicy(policy or config.get("review.policy", ReviewPolicy.APPROVE_AFTER.value))
+        self.timeout_seconds = timeout_seconds or config.get_float("review.timeout-seconds", 300)
+        self._agents: Dict[str, WebUserProxyAgent] = {}
+
+    async def request_review(self,
+                             job_id: str,
+                             proposal: str,
+                             cancellation_token: Optional[CancellationToken] = None,
+                             policy: Optional[str] = None) -> str:
+        """等待人工审核，返回审核后的内容
+
+        参数:
+            job_id: 任务id，前端提交审核结果时据此找到对应的等待
+            proposal: 模型生成的待审核内容，自动通过时原样返回
+            policy: 本任务的审核策略，默认使用全局配置
+        """
+        policy = ReviewPolicy(policy or self.policy)
+        if policy == ReviewPolicy.AUTO:
+            return proposal
+
+        agent = WebUserProxyAgent(f"user_proxy_{job_id}")
+        self._agents[job_id] = agent
+        try:
+            result = await asyncio.wait_for(
+                agent.on_messages(
+                    [TextMessage(content="请人工审核：查询条件是否符合？", source="AI")],
+                    cancellation_token=cancellation_token or CancellationToken()
+                ),
+                self.timeout_seconds,
+            )
+            return result.content
+        except asyncio.TimeoutError:
+            if policy == ReviewPolicy.APPROVE_AFTER:
+                logger.info(f"人工审核超时，自动通过: job_id={job_id}, timeout={self.timeout_seconds}s")
+                return proposal
+            raise ReviewTimeoutError(f"人工审核超时（{self.timeout_seconds:.0f}秒内未提交审核结果）")
+        finally:
+            self._agents.pop(job_id, None)
+
+    def submit(self, job_id: str, user_input: str) -> bool:
+        """提交审核结果，任务当前没有等待中的审核时返回False"""
+        agent = self._agents.get(job_id)
+        return agent is not None and agent.set_user_input(user_input)
+
+    def is_waiting(self, job_id: str) -> bool:
+        return job_id in self._agents
+
 
-userProxyAgent = WebUserProxyAgent("user_proxy")
+# 创建全局人工审核注册表
+review_registry = ReviewRegistry()
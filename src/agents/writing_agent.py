@@ -4,10 +4,11 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
 from typing import Dict, Any
+from functools import lru_cache
 from langgraph.graph import StateGraph
-from sqlalchemy.sql.functions import current_date
 from src.agents.sub_writing_agent.writing_state_models import WritingState
-from src.core.state_models import State
+from src.core.state_models import State, ConfigSchema
+from langgraph.runtime import get_runtime
 from src.agents.sub_writing_agent import writing_director_agent, writing_agent, retrieval_agent
 from src.agents.sub_writing_agent.writing_director_agent import writing_director_node
 from src.agents.sub_writing_agent.writing_agent import section_writing_node
@@ -16,7 +17,17 @@ from src.core.state_models import ExecutionState
 from src.core.state_models import BackToFrontData
 from src.utils.tool_utils import handlerChunk
 from src.utils.log_utils import setup_logger
+from src.core.model_client import get_model_name
+from src.core.prompts import writing_director_agent_prompt, retrieval_agent_prompt, writing_agent_prompt
+from src.services.stage_cache import get_stage_cache
+from src.core import deadline
+from src.utils.tracing import traced_node
 logger = setup_logger(__name__)
+
+# 写作阶段依赖的提示词和模型，任一变化都会使写作结果缓存失效
+WRITING_PROMPTS = [writing_director_agent_prompt, retrieval_agent_prompt, writing_agent_prompt]
+WRITING_MODELS = ["subwriting-writing-director-model", "subwriting-retrieval-model", "subwriting-writing-model"]
+
 async def condition_edge(state: WritingState) -> str:
     """判断是否继续下一个小节"""
     current_section_index = state["current_section_index"]
@@ -43,9 +54,10 @@ class WritingWorkflow:
         builder = StateGraph(WritingState)
 
         # 添加节点
-        builder.add_node("writing_director_node", writing_director_node)
-        builder.add_node("retrieval_node", retrieval_node)
-        builder.add_node("section_writing_node", section_writing_node)
+        # 各节点记录追踪span，可区分大纲、资料检索和逐节写作各自的耗时
+        builder.add_node("writing_director_node", traced_node("writing_director_node")(writing_director_node))
+        builder.add_node("retrieval_node", traced_node("retrieval_node")(retrieval_node))
+        builder.add_node("section_writing_node", traced_node("section_writing_node")(section_writing_node))
 
         # 设置入口点
         builder.set_entry_point("writing_director_node")
@@ -55,30 +67,56 @@ class WritingWorkflow:
         builder.add_edge("retrieval_node", "section_writing_node")
         builder.add_conditional_edges("section_writing_node", condition_edge)
 
-        # 编译图
-        graph = builder.compile()
+        # 编译图；写作状态中包含事件通道，不继承外层流水线的检查点
+        graph = builder.compile(checkpointer=False)
     
         return graph
-    
+
+
+@lru_cache(maxsize=None)
+def get_writing_graph():
+    """每个进程只编译一次写作子图；事件通道等每次运行的数据都通过WritingState传入"""
+    return WritingWorkflow().workflow
+
+
 async def writing_node(state: State) -> State:
     """运行写入工作流"""
-    state_queue = state["state_queue"]
+    context = get_runtime(ConfigSchema).context
+    state_queue = context["state_queue"]
     try:
         current_state = state["value"]
         current_state.current_step = ExecutionState.WRITING
         # await state_queue.put(BackToFrontData(step=ExecutionState.WRITING,state="initializing",data=None))
+        stage_cache = get_stage_cache()
+        writing_key = stage_cache.make_key(
+            "writing",
+            {"user_request": current_state.user_request, "global_analysis": current_state.analyse_results},
+            WRITING_PROMPTS,
+            [get_model_name(m) for m in WRITING_MODELS],
+        )
+        writted_sections = await stage_cache.aget(writing_key)
+        if writted_sections is not None:
+            logger.info("写作结果命中阶段缓存")
+            current_state.writted_sections = writted_sections
+            await state_queue.put(BackToFrontData(step=ExecutionState.WRITING,state="initializing",data=None))
+            await state_queue.put(BackToFrontData(step=ExecutionState.WRITING,state="completed",data="\n\n".join(writted_sections)))
+            return {"value": current_state}
+
         writing_state = WritingState()
         writing_state["state_queue"] = state_queue
+        writing_state["cancellation_token"] = context.get("cancellation_token")
         writing_state["user_request"] = current_state.user_request
         writing_state["global_analysis"] = current_state.analyse_results
         writing_state["sections"] = []
         writing_state["writted_sections"] = []
         writing_state["current_section_index"] = -1
         writing_state["retrieved_docs"] = []
-        writingWorkFlow = WritingWorkflow()
-        writing_state = await writingWorkFlow.workflow.ainvoke(writing_state)
+        writing_state["corpus_id"] = current_state.corpus_id
+        writing_state = await get_writing_graph().ainvoke(writing_state)
         logger.info(f"writing_state: {writing_state}")
         current_state.writted_sections = [section.content for section in writing_state["writted_sections"]]
+        if current_state.writted_sections and all(current_state.writted_sections) and not deadline.output_degraded():
+            await stage_cache.aput(writing_key, "writing", current_state.writted_sections)
         # await state_queue.put(BackToFrontData(step=ExecutionState.WRITING,state="completed",data=writing_state["writted_sections"]))
         return {"value": current_state}
         
@@ -98,8 +136,7 @@ async def main():
     writing_state["writted_sections"] = []
     writing_state["current_section_index"] = -1
     writing_state["retrieved_docs"] = []
-    writingWorkFlow = WritingWorkflow()
-    result = await writingWorkFlow.workflow.ainvoke(writing_state)
+    result = await get_writing_graph().ainvoke(writing_state)
     # result是WritingState，而WritingState本质上就是一个字典
     print("result:")
     print(result)
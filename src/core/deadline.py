@@ -0,0 +1,109 @@
+"""截止时间降级策略
+
+任务的截止时间即运行预算的max_seconds。各阶段通过这里的函数查询剩余时间，
+在时间不足时以较低的质量完成本阶段，而不是等到超时后整个任务失败：
+- 阅读：只阅读按相关性排序的前一部分论文，超过阅读阶段的时间份额后不再阅读新论文
+- 分析：论文数很少的聚类跳过深度分析，直接汇总论文摘要
+- 写作：限制每个小节的修改次数
+- 模型：剩余时间很少时改用fast-model配置的更快模型
+
+应用的降级措施记录在PaperAgentState.degradations中。没有截止时间或未启用降级时所有函数都不做任何限制。
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+from src.core.config import config
+from src.core.run_budget import current_budget
+from src.tasks.paper_filter import BM25Scorer
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# 会降低阶段输出质量的降级措施；只减少论文数量的措施不影响单篇论文的提取结果
+QUALITY_ACTIONS = ("fast_model", "skip_deep_analysis", "cap_revisions")
+
+
+def remaining_ratio() -> Optional[float]:
+    """当前任务剩余时间占截止时间的比例，没有截止时间或未启用降级时返回None"""
+    budget = current_budget.get()
+    if budget is None or not config.get_bool("deadline.enabled", True):
+        return None
+    return budget.remaining_ratio()
+
+
+def is_short_on_time(threshold_key: str, default: float) -> bool:
+    """剩余时间比例是否低于deadline配置中threshold_key指定的阈值"""
+    ratio = remaining_ratio()
+    return ratio is not None and ratio < config.get_float(f"deadline.{threshold_key}", default)
+
+
+def record(action: str, detail: str) -> None:
+    """记录当前阶段应用的降级措施"""
+    budget = current_budget.get()
+    if budget is not None and budget.degrade(action, detail):
+        logger.warning(f"临近截止时间，阶段{budget.stage}降级: {action}, {detail}")
+
+
+def output_degraded() -> bool:
+    """当前阶段是否应用了降低输出质量的降级措施，此时阶段输出不应写入阶段缓存"""
+    budget = current_budget.get()
+    return budget is not None and any(
+        d["stage"] == budget.stage and d["action"] in QUALITY_ACTIONS for d in budget.degradations
+    )
+
+
+def rank_by_relevance(papers: List[Dict[str, Any]],
+                      query: str,
+                      scores: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """按相关性从高到低排序，分数相同时保持原有顺序
+
+    参数:
+        scores: 相关性筛选阶段记录的分数 {paper_id: 分数}，与筛选的排序一致；为空时用BM25对papers打分
+    """
+    if scores:
+        values = [scores.get(paper["paper_id"], 0.0) for paper in papers]
+    else:
+        values = BM25Scorer().score(query, papers)
+    return [papers[i] for i in sorted(range(len(papers)), key=lambda i: -values[i])]
+
+
+def reading_paper_cap(max_papers: int) -> int:
+    """阅读阶段开始时剩余时间不足，按剩余时间比例减少要阅读的论文数，至少保留min-papers篇"""
+    if not is_short_on_time("reading-below", 0.8):
+        return max_papers
+    min_papers = config.get_int("deadline.min-papers", 5)
+    cap = min(max_papers, max(min_papers, math.ceil(max_papers * remaining_ratio())))
+    if cap < max_papers:
+        record("reduce_papers", f"剩余时间不足，只阅读相关性最高的 {cap}/{max_papers} 篇论文")
+    return cap
+
+
+def reading_cutoff_reached(accepted: int) -> bool:
+    """任务已运行到截止时间的reading-share比例，阅读阶段不再开始阅读新论文，为后续阶段留出时间
+
+    参数:
+        accepted: 已开始阅读的论文数，不足min-papers篇时继续阅读
+    """
+    ratio = remaining_ratio()
+    if ratio is None or accepted < config.get_int("deadline.min-papers", 5):
+        return False
+    return 1 - ratio >= config.get_float("deadline.reading-share", 0.5)
+
+
+def skip_deep_analysis(paper_count: int) -> bool:
+    """剩余时间不足时，论文数少于min-cluster-size的聚类跳过深度分析"""
+    return (paper_count < config.get_int("deadline.min-cluster-size", 3)
+            and is_short_on_time("analyse-below", 0.5))
+
+
+def max_section_revisions() -> Optional[int]:
+    """剩余时间不足时每个小节允许的最多修改次数，时间充足时返回None（不限制）"""
+    if not is_short_on_time("writing-below", 0.4):
+        return None
+    return config.get_int("deadline.max-revisions", 1)
+
+
+def use_fast_model() -> bool:
+    """剩余时间不足且配置了fast-model时，模型调用改用更快的模型"""
+    return bool((config.get("fast-model") or {}).get("model")) and is_short_on_time("fast-model-below", 0.3)
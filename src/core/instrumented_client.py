@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Any, AsyncGenerator, Union
+
+from autogen_core.models import CreateResult
+from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+from src.core import deadline
+from src.core.run_budget import current_budget
+from src.utils.metrics import LLM_LATENCY, LLM_REQUESTS, LLM_TOKENS
+from src.utils.tracing import span
+
+# fast-model客户端的指标标签（create_model_client以去掉-model后缀的客户端类型作为标签）
+FAST_MODEL_LABEL = "fast"
+
+
+class InstrumentedChatCompletionClient(OpenAIChatCompletionClient):
+    """带指标统计的模型客户端：按智能体记录请求次数、耗时和token用量
+
+    在流水线运行中调用时，同时受当前运行预算(RunBudget)约束：限制并发调用数、调用前检查预算并累计token用量。
+    临近任务截止时间且配置了fast-model时，调用转交给更快的模型客户端。
+    """
+
+    def __init__(self, metrics_label: str = "default", **kwargs: Any):
+        """
+        参数:
+            metrics_label: 指标中的agent标签，通常为模型客户端类型（如search、reading）
+        """
+        super().__init__(**kwargs)
+        self.metrics_label = metrics_label
+
+    def _span(self, stream: bool = False):
+        # 流式调用在异步生成器中执行，span不设为当前span
+        return span(f"llm.{self.metrics_label}", "llm", activate=not stream,
+                    agent=self.metrics_label, model=self._raw_config.get("model"), stream=stream)
+
+    @staticmethod
+    def _record_span_usage(record, result: Union[CreateResult, None]) -> None:
+        if record is not None and result is not None and result.usage is not None:
+            record.set(prompt_tokens=result.usage.prompt_tokens or 0, completion_tokens=result.usage.completion_tokens or 0)
+
+    def _record(self, start: float, status: str, result: Union[CreateResult, None] = None) -> None:
+        LLM_REQUESTS.labels(self.metrics_label, status).inc()
+        LLM_LATENCY.labels(self.metrics_label).observe(time.perf_counter() - start)
+        if result is not None and result.usage is not None:
+            LLM_TOKENS.labels(self.metrics_label, "prompt").inc(result.usage.prompt_tokens or 0)
+            LLM_TOKENS.labels(self.metrics_label, "completion").inc(result.usage.completion_tokens or 0)
+            budget = current_budget.get()
+            if budget is not None:
+                budget.record_usage(result.usage.prompt_tokens, result.usage.completion_tokens)
+
+    def _deadline_client(self) -> "InstrumentedChatCompletionClient":
+        """返回本次调用实际使用的客户端：剩余时间不足时为fast-model客户端，否则为自身"""
+        if self.metrics_label == FAST_MODEL_LABEL or not deadline.use_fast_model():
+            return self
+        from src.core.model_client import get_fast_model_client, get_model_name
+
+        deadline.record("fast_model", f"剩余时间不足，模型调用改用 {get_model_name('fast-model')}")
+        return get_fast_model_client()
+
+    async def create(self, *args: Any, **kwargs: Any) -> CreateResult:
+        client = self._deadline_client()
+        if client is not self:
+            return await client.create(*args, **kwargs)
+        budget = current_budget.get()
+        if budget is None:
+            return await self._create(*args, **kwargs)
+        async with budget.llm_call():
+            return await self._create(*args, **kwargs)
+
+    async def _create(self, *args: Any, **kwargs: Any) -> CreateResult:
+        start = time.perf_counter()
+        with self._span() as record:
+            try:
+                result = await super().create(*args, **kwargs)
+            except asyncio.CancelledError:
+                self._record(start, "cancelled")
+                raise
+            except BaseException:
+                self._record(start, "error")
+                raise
+            self._record(start, "ok", result)
+            self._record_span_usage(record, result)
+        return result
+
+    async def create_stream(self, *args: Any, **kwargs: Any) -> AsyncGenerator[Union[str, CreateResult], None]:
+        client = self._deadline_client()
+        if client is not self:
+            async for chunk in client.create_stream(*args, **kwargs):
+                yield chunk
+            return
+        budget = current_budget.get()
+        if budget is None:
+            async for chunk in self._create_stream(*args, **kwargs):
+                yield chunk
+            return
+        async with budget.llm_call():
+            async for chunk in self._create_stream(*args, **kwargs):
+                yield chunk
+
+    async def _create_stream(self, *args: Any, **kwargs: Any) -> AsyncGenerator[Union[str, CreateResult], None]:
+        start = time.perf_counter()
+        result = None
+        with self._span(stream=True) as record:
+            try:
+                async for chunk in super().create_stream(*args, **kwargs):
+                    if isinstance(chunk, CreateResult):
+                        result = chunk
+                    yield chunk
+            except asyncio.CancelledError:
+                self._record(start, "cancelled")
+                raise
+            except BaseException:
+                self._record(start, "error")
+                raise
+            self._record(start, "ok", result)
+            self._record_span_usage(record, result)
@@ -1,8 +1,12 @@
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_core.models import ModelInfo
+from functools import lru_cache
+from typing import TYPE_CHECKING
 from .config import config
 from src.utils.log_utils import setup_logger
-from openai import OpenAI
+
+# openai相关依赖导入耗时较长，只在真正创建客户端时才导入
+if TYPE_CHECKING:
+    from autogen_ext.models.openai import OpenAIChatCompletionClient
+    from openai import OpenAI
 
 
 logger = setup_logger(__name__)
@@ -20,8 +24,9 @@ class ModelClient:
         function_calling: bool = True,
         json_output: bool = True,
         structured_output: bool = True,
-        family: str = "Qwen"
-    ) -> OpenAIChatCompletionClient:
+        family: str = "Qwen",
+        metrics_label: str = "default"
+    ) -> "OpenAIChatCompletionClient":
         """
         创建并返回一个配置好的OpenAIChatCompletionClient实例
         
@@ -35,10 +40,14 @@ class ModelClient:
             json_output: 是否支持JSON输出
             structured_output: 是否支持结构化输出
             family: 模型家族名称，默认根据provider设置
+            metrics_label: /metrics中区分调用方的agent标签
             
         返回:
             配置好的OpenAIChatCompletionClient实例
         """
+        from autogen_core.models import ModelInfo
+        from src.core.instrumented_client import InstrumentedChatCompletionClient
+
         # 从配置中加载默认值
         provider_config = config.get(provider)
 
@@ -66,7 +75,8 @@ class ModelClient:
         )
         
         # 创建并返回客户端实例
-        return OpenAIChatCompletionClient(
+        return InstrumentedChatCompletionClient(
+            metrics_label=metrics_label,
             model=model,
             api_key=api_key,
             base_url=base_url,
@@ -79,7 +89,9 @@ class ModelClient:
         model: str = None,
         api_key: str = None,
         base_url: str = None,
-    ) -> OpenAI:
+    ) -> "OpenAI":
+        from openai import OpenAI
+
         provider_config = config.get(provider)
 
         # 如果未提供参数，则使用配置中的默认值
@@ -102,7 +114,9 @@ class ModelClient:
         return client
 
 
-def create_model_client(client_type: str) -> OpenAIChatCompletionClient:
+def create_model_client(client_type: str) -> "OpenAIChatCompletionClient":
+    # 指标中以去掉-model后缀的客户端类型作为agent标签，如search、subwriting-writing
+    metrics_label = client_type.removesuffix("-model")
     try:
         """创建用于阅读论文的客户端实例"""
         model_config = config.get(client_type, {})
@@ -112,17 +126,18 @@ def create_model_client(client_type: str) -> OpenAIChatCompletionClient:
         # 检查是否配置了阅读模型
         if not provider or not model:
             logger.warning(f"警告：未配置{client_type}模型，使用默认模型代替")
-            return create_default_client()
+            return create_default_client(metrics_label)
         
         return ModelClient.create_client(
                 provider=provider,
-                model=model
+                model=model,
+                metrics_label=metrics_label
         )
     except Exception as e:
         print(f"创建阅读模型客户端失败: {e}，使用默认模型代替")
-        return create_default_client()
+        return create_default_client(metrics_label)
 
-def create_embedding_client(client_type: str) -> OpenAI:
+def create_embedding_client(client_type: str) -> "OpenAI":
     try:
         """创建用于阅读论文的客户端实例"""
         model_config = config.get(client_type, {})
@@ -142,7 +157,7 @@ def create_embedding_client(client_type: str) -> OpenAI:
         print(f"创建{client_type}模型客户端失败: {e}，使用默认模型代替")
         return create_default_embedding_client()
 
-def create_default_client() -> OpenAIChatCompletionClient:
+def create_default_client(metrics_label: str = "default") -> "OpenAIChatCompletionClient":
     """创建默认的OpenAIChatCompletionClient实例，使用配置中指定的默认模型"""
     default_model_config = config.get("default-model", {})
     provider = default_model_config.get("model-provider", "siliconflow")
@@ -150,10 +165,11 @@ def create_default_client() -> OpenAIChatCompletionClient:
     
     return ModelClient.create_client(
         provider=provider,
-        model=model
+        model=model,
+        metrics_label=metrics_label
     )
 
-def create_default_embedding_client() -> OpenAI:
+def create_default_embedding_client() -> "OpenAI":
     """创建默认的OpenAIEmbeddingClient实例，使用配置中指定的默认模型"""
     default_model_config = config.get("default-embedding-model", {})
     provider = default_model_config.get("model-provider", "siliconflow")
@@ -164,43 +180,57 @@ def create_default_embedding_client() -> OpenAI:
         model=model
     )
 
-def create_search_model_client() -> OpenAIChatCompletionClient:
+def get_model_name(client_type: str) -> str:
+    """返回某类模型客户端实际使用的模型名，未单独配置时为默认模型"""
+    model = config.get(client_type, {}).get("model")
+    if model:
+        return model
+    if client_type.endswith("embedding-model"):
+        return config.get("default-embedding-model", {}).get("model", "Qwen/Qwen3-Embedding-8B")
+    return config.get("default-model", {}).get("model", "Qwen/Qwen3-32B")
+
+def create_search_model_client() -> "OpenAIChatCompletionClient":
     """创建用于搜索的模型客户端实例"""
     return create_model_client("search-model")
 
-def create_reading_model_client() -> OpenAIChatCompletionClient:
+def create_reading_model_client() -> "OpenAIChatCompletionClient":
     """创建用于阅读论文的模型客户端实例"""
     return create_model_client("reading-model")
 
-def create_subanalyse_cluster_model_client() -> OpenAIChatCompletionClient:
+def create_subanalyse_cluster_model_client() -> "OpenAIChatCompletionClient":
     """创建用于分析聚类的模型客户端实例"""
     return create_model_client("subanalyse-cluster-model")
 
-def create_subanalyse_deep_analyse_model_client() -> OpenAIChatCompletionClient:
+def create_subanalyse_deep_analyse_model_client() -> "OpenAIChatCompletionClient":
     """创建用于深度分析的模型客户端实例"""
     return create_model_client("subanalyse-deep-analyse-model")
 
-def create_subanalyse_global_analyse_model_client() -> OpenAIChatCompletionClient:
+def create_subanalyse_global_analyse_model_client() -> "OpenAIChatCompletionClient":
     """创建用于全局分析的模型客户端实例"""
     return create_model_client("subanalyse-global-analyse-model") 
 
-def create_subwriting_writing_director_model_client() -> OpenAIChatCompletionClient:
+def create_subwriting_writing_director_model_client() -> "OpenAIChatCompletionClient":
     """创建用于写作主管的模型客户端实例"""
     return create_model_client("subwriting-writing-director-model") 
 
-def create_subwriting_writing_model_client() -> OpenAIChatCompletionClient:
+def create_subwriting_writing_model_client() -> "OpenAIChatCompletionClient":
     """创建用于写作的模型客户端实例"""
     return create_model_client("subwriting-writing-model") 
 
-def create_subwriting_retrieval_model_client() -> OpenAIChatCompletionClient:
+def create_subwriting_retrieval_model_client() -> "OpenAIChatCompletionClient":
     """创建用于检索的模型客户端实例"""
     return create_model_client("subwriting-retrieval-model") 
 
-def create_report_model_client() -> OpenAIChatCompletionClient:
+def create_report_model_client() -> "OpenAIChatCompletionClient":
     """创建用于写作报告的模型客户端实例"""
     return create_model_client("report-model")
 
-def create_cluster_embedding_client() -> OpenAI:
+@lru_cache(maxsize=None)
+def get_fast_model_client() -> "OpenAIChatCompletionClient":
+    """临近任务截止时间时代替各智能体模型的更快模型客户端，所有智能体共享一个实例"""
+    return create_model_client("fast-model")
+
+def create_cluster_embedding_client() -> "OpenAI":
     """创建用于聚类嵌入的模型客户端实例"""
     return create_embedding_client("cluster-embedding-model")
 
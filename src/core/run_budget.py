@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from src.core.config import config
+
+# 预算限制项，对应models.yaml中budget段的 max-papers / max-tokens / max-seconds / max-concurrent-calls
+BUDGET_FIELDS = ("max_papers", "max_tokens", "max_seconds", "max_concurrent_calls")
+
+
+class BudgetExceededError(Exception):
+    """本次运行的token或时间预算已耗尽"""
+
+
+class RunBudget:
+    """单次调研运行的成本与延迟预算
+
+    限制项为None或0时表示不限制。流水线运行期间通过current_budget在协程上下文中传递，
+    模型客户端据此限制并发调用数并累计token用量，各阶段在开始前和每次模型调用前检查预算。
+
+    max_seconds同时是任务的截止时间：临近截止时各阶段按src.core.deadline中的策略降级，
+    只有运行时间超过 max_seconds * grace_ratio 后才拒绝新的模型调用。
+    """
+
+    def __init__(self,
+                 max_papers: Optional[int] = None,
+                 max_tokens: Optional[int] = None,
+                 max_seconds: Optional[float] = None,
+                 max_concurrent_calls: Optional[int] = None,
+                 grace_ratio: float = 1.0):
+        self.max_papers = int(max_papers) if max_papers else None
+        self.max_tokens = int(max_tokens) if max_tokens else None
+        self.max_seconds = float(max_seconds) if max_seconds else None
+        self.max_concurrent_calls = int(max_concurrent_calls) if max_concurrent_calls else None
+        self.tokens_used = 0
+        self.llm_calls = 0
+        self.grace_ratio = max(float(grace_ratio or 1.0), 1.0)
+        self.started_at = time.monotonic()
+        # 当前正在执行的阶段，由budgeted_node设置
+        self.stage: Optional[str] = None
+        # 已应用的降级措施，按执行顺序排列
+        self.degradations: List[Dict[str, Any]] = []
+        # 各阶段的token用量和耗时，key为阶段名
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_calls) if self.max_concurrent_calls else None
+
+    @classmethod
+    def from_config(cls, overrides: Optional[Dict[str, Any]] = None) -> "RunBudget":
+        """以models.yaml中的budget配置为默认值，overrides中非空的项覆盖默认值"""
+        values = {name: config.get(f"budget.{name.replace('_', '-')}") for name in BUDGET_FIELDS}
+        values.update({k: v for k, v in (overrides or {}).items() if k in BUDGET_FIELDS and v is not None})
+        if config.get_bool("deadline.enabled", True):
+            values["grace_ratio"] = config.get_float("deadline.grace-ratio", 1.5)
+        return cls(**values)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining_ratio(self) -> Optional[float]:
+        """距截止时间的剩余时间占max_seconds的比例（0~1），没有截止时间时返回None"""
+        if self.max_seconds is None:
+            return None
+        return max(0.0, 1 - self.elapsed / self.max_seconds)
+
+    def limits(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in BUDGET_FIELDS}
+
+    def exceeded_reason(self) -> Optional[str]:
+        """返回预算耗尽的原因，预算充足时返回None"""
+        if self.max_tokens is not None and self.tokens_used >= self.max_tokens:
+            return f"token预算已耗尽（已使用 {self.tokens_used} / {self.max_tokens}）"
+        if self.max_seconds is not None and self.elapsed >= self.max_seconds * self.grace_ratio:
+            return f"时间预算已耗尽（已运行 {self.elapsed:.0f} / {self.max_seconds * self.grace_ratio:.0f} 秒）"
+        return None
+
+    def check(self) -> None:
+        reason = self.exceeded_reason()
+        if reason is not None:
+            raise BudgetExceededError(reason)
+
+    def limit_papers(self, max_papers: int) -> int:
+        return min(max_papers, self.max_papers) if self.max_papers else max_papers
+
+    @asynccontextmanager
+    async def llm_call(self) -> AsyncIterator[None]:
+        """包裹一次模型调用：限制并发调用数，调用前检查预算"""
+        if self._semaphore is None:
+            self.check()
+            yield
+            return
+        async with self._semaphore:
+            # 排队等待期间预算可能已经耗尽，拿到调用槽位后再检查一次
+            self.check()
+            yield
+
+    def record_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.llm_calls += 1
+        self.tokens_used += (prompt_tokens or 0) + (completion_tokens or 0)
+
+    def degrade(self, action: str, detail: str) -> bool:
+        """记录一项降级措施，同一阶段的同一措施只记录一次
+
+        返回:
+            本次是否为新记录
+        """
+        if any(d["stage"] == self.stage and d["action"] == action for d in self.degradations):
+            return False
+        self.degradations.append({
+            "stage": self.stage,
+            "action": action,
+            "detail": detail,
+            "elapsed_seconds": round(self.elapsed, 2),
+        })
+        return True
+
+    def report(self) -> Dict[str, Any]:
+        """预算使用情况，写入最终状态并随任务状态返回"""
+        return {
+            "limits": self.limits(),
+            "tokens_used": self.tokens_used,
+            "llm_calls": self.llm_calls,
+            "elapsed_seconds": round(self.elapsed, 2),
+            "stages": self.stages,
+            "degradations": self.degradations,
+            "exceeded": self.exceeded_reason(),
+        }
+
+
+# 当前协程上下文中正在执行的运行预算，asyncio任务创建时会自动继承
+current_budget: ContextVar[Optional[RunBudget]] = ContextVar("current_budget", default=None)
+
+
+def budgeted_node(stage: str) -> Callable:
+    """LangGraph节点装饰器：节点开始前检查预算，结束后记录该阶段的token用量和耗时，
+    并把该阶段应用的降级措施写入PaperAgentState.degradations"""
+    def decorator(node: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(node)
+        async def wrapper(state, *args, **kwargs):
+            budget = current_budget.get()
+            if budget is None:
+                return await node(state, *args, **kwargs)
+            budget.check()
+            budget.stage = stage
+            tokens_before, start = budget.tokens_used, time.monotonic()
+            degradations_before = len(budget.degradations)
+            try:
+                result = await node(state, *args, **kwargs)
+                value = result.get("value") if isinstance(result, dict) else None
+                if value is not None and hasattr(value, "degradations"):
+                    value.degradations.extend(budget.degradations[degradations_before:])
+                return result
+            finally:
+                budget.stages[stage] = {
+                    "tokens": budget.tokens_used - tokens_before,
+                    "seconds": round(time.monotonic() - start, 2),
+                }
+
+        return wrapper
+
+    return decorator
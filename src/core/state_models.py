@@ -2,18 +2,22 @@ from asyncio import Queue
 from typing import List, Dict, Any, Optional,TypedDict
 from pydantic import BaseModel, Field
 from enum import Enum
+from autogen_core import CancellationToken
 
 
 class BackToFrontData(BaseModel):
     step: str
     state: str
     data: Any
+    seq: Optional[int] = Field(default=None, description="事件序号，由任务事件通道分配，用于断线重连后的事件回放")
 
 
 class ExecutionState(str, Enum):
     """工作流执行状态枚举"""
+    QUEUED = "queued"
     INITIALIZING = "initializing"
     SEARCHING = "searching"
+    FILTERING = "filtering"
     READING = "reading"
     PARSING = "parsing"
     EXTRACTING = "extracting"
@@ -58,12 +62,20 @@ class AnalysisResults(BaseModel):
 
 class NodeError(BaseModel):
     search_node_error: Optional[str] = Field(default=None, description="搜索节点错误信息")
+    filter_node_error: Optional[str] = Field(default=None, description="相关性筛选节点错误信息")
     reading_node_error: Optional[str] = Field(default=None, description="阅读节点错误信息")
     analyse_node_error: Optional[str] = Field(default=None, description="分析节点错误信息")
     writing_node_error: Optional[str] = Field(default=None, description="写作节点错误信息")
     report_node_error: Optional[str] = Field(default=None, description="报告生成节点错误信息")
     error: Optional[str] = Field(default=None, description="错误信息")
 
+    def first_error(self) -> Optional[str]:
+        """返回第一个非空的节点错误信息，没有错误时返回None"""
+        for value in self.model_dump().values():
+            if value:
+                return value
+        return None
+
 class PaperAgentState(BaseModel):
     """LangGraph工作流的全局状态对象"""
     # 用户输入
@@ -79,23 +91,34 @@ class PaperAgentState(BaseModel):
     # 数据流
     # search_results: List[PaperMetadata] = Field(default_factory=list, description="检索到的论文元数据列表")
     search_results: Optional[List[Dict[str, Any]]] = Field(default_factory=list, description="检索到的论文元数据列表")
+    search_query: Optional[Dict[str, Any]] = Field(default=None, description="审核后的检索条件，流式检索时由阅读阶段按此边检索边阅读")
+    relevance_scores: Dict[str, float] = Field(default_factory=dict, description="相关性筛选中所有候选论文的分数, key: paper_id, value: 分数")
     paper_contents: Optional[Dict[str, str]] = Field(default_factory=dict, description="解析后的论文全文字典, key: paper_id, value: 文本内容")
     extracted_data: Optional[ExtractedPapersData] = Field(default_factory=list, description="提取后的结构化信息列表")
     analyse_results: Optional[str] = Field(default=None, description="分析洞察结果")
     outline: Optional[str] = Field(default=None, description="报告大纲")
     writted_sections: Optional[List[str]] = Field(default=None, description="已写章节内容")
     report_markdown: Optional[str] = Field(default=None, description="最终生成的Markdown报告内容")
+    budget_usage: Optional[Dict[str, Any]] = Field(default=None, description="运行预算的使用情况：token用量、耗时及各阶段明细")
+    degradations: List[Dict[str, Any]] = Field(default_factory=list, description="临近截止时间时各阶段应用的降级措施")
     
     # 配置与上下文
     llm_provider: Any = Field(default=None, description="LLM提供者实例", exclude=True)  # 排除序列化
     config: Dict[str, Any] = Field(default_factory=dict, description="运行时配置")
 
+    @property
+    def corpus_id(self) -> Optional[str]:
+        """本任务的论文在向量数据库中的范围标识：批量任务共用批次的标识，其他任务使用job_id"""
+        return self.config.get("corpus_id") or self.config.get("job_id")
+
 class State(TypedDict):
-    """LangGraph兼容的状态定义"""
-    state_queue: Queue
+    """LangGraph兼容的状态定义，每个节点执行后都会写入检查点，只能包含可序列化的数据"""
     value: PaperAgentState
 
 class ConfigSchema(TypedDict):
-    """LangGraph兼容的配置定义"""
+    """LangGraph兼容的运行时上下文定义，保存事件通道等不可序列化、也不需要持久化的对象
+
+    节点中通过 langgraph.runtime.get_runtime(ConfigSchema).context 获取
+    """
     state_queue: Queue
-    value: Dict[str, Any]
\ No newline at end of file
+    cancellation_token: Optional[CancellationToken]
\ No newline at end of file
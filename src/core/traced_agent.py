@@ -0,0 +1,36 @@
+from typing import Any, AsyncGenerator, Sequence
+
+from autogen_agentchat.agents import AssistantAgent
+from autogen_agentchat.base import TaskResult
+
+from src.utils.tracing import span
+
+
+def _usage(messages: Sequence[Any]) -> dict:
+    """汇总一次智能体调用中各条消息的token用量"""
+    prompt_tokens = completion_tokens = 0
+    for message in messages:
+        usage = getattr(message, "models_usage", None)
+        if usage is not None:
+            prompt_tokens += usage.prompt_tokens or 0
+            completion_tokens += usage.completion_tokens or 0
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+
+class TracedAssistantAgent(AssistantAgent):
+    """为run / run_stream记录追踪span的AssistantAgent，span属性包含消息数和token用量"""
+
+    async def run(self, *args: Any, **kwargs: Any) -> TaskResult:
+        with span(f"agent.{self.name}", "agent", agent=self.name) as record:
+            result = await super().run(*args, **kwargs)
+            if record is not None:
+                record.set(messages=len(result.messages), **_usage(result.messages))
+            return result
+
+    async def run_stream(self, *args: Any, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        # 异步生成器可能在调用方的其他上下文中被关闭，不把该span设为当前span
+        with span(f"agent.{self.name}", "agent", activate=False, agent=self.name, stream=True) as record:
+            async for item in super().run_stream(*args, **kwargs):
+                if record is not None and isinstance(item, TaskResult):
+                    record.set(messages=len(item.messages), **_usage(item.messages))
+                yield item
@@ -0,0 +1,332 @@
+import asyncio
+import math
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Union
+from urllib.parse import urlencode
+
+import arxiv
+import feedparser
+
+from src.core.config import config
+from src.utils.log_utils import setup_logger
+from src.utils.metrics import ARXIV_REQUESTS
+
+logger = setup_logger(__name__)
+
+DEFAULT_BASE_URL = "https://export.arxiv.org/api/query"
+
+
+class ArxivAPIError(Exception):
+    """arXiv API请求重试后仍然失败"""
+
+
+class ArxivRequestError(ArxivAPIError):
+    """arXiv拒绝了请求（429以外的4xx），不重试"""
+
+
+def _reserve_slot(tokens: float, updated: float, paused_until: float, now: float, delay_seconds: float, burst: int) -> "tuple[float, float, float]":
+    """令牌桶预占一个时间槽，返回(剩余令牌数, 更新时间, 需要等待的秒数)
+
+    按 1 / delay_seconds 的速率补充令牌，最多积累burst个；令牌不足时先预占后等待，
+    并发请求按到达顺序排队，各自等待自己的时间槽。暂停期间不补充令牌。
+    """
+    if delay_seconds <= 0:
+        return tokens, updated, paused_until - now
+    rate = 1.0 / delay_seconds
+    refill_from = max(updated, min(now, paused_until))
+    tokens = min(float(burst), tokens + max(0.0, now - refill_from) * rate) - 1
+    return tokens, now, max(-tokens / rate, 0.0) + max(paused_until - now, 0.0)
+
+
+class _TokenBucket:
+    """进程内的arXiv请求令牌桶（arxiv.shared-limiter为false时使用）
+
+    arXiv API要求相邻请求间隔约3秒，burst为1时即为严格的固定间隔。遇到429或503时调用pause，所有请求一起暂停。
+    只在事件循环线程中使用，分配时间槽的过程中没有await，因此无需加锁，也不绑定某个事件循环。
+    """
+
+    def __init__(self):
+        # 初始时令牌桶是满的，第一个请求不必等待
+        self._tokens = 0.0
+        self._updated = -math.inf
+        self._paused_until = 0.0
+
+    async def acquire(self, delay_seconds: float, burst: int = 1) -> None:
+        self._tokens, self._updated, wait = _reserve_slot(
+            self._tokens, self._updated, self._paused_until, time.monotonic(), delay_seconds, burst,
+        )
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def pause(self, seconds: float) -> None:
+        """arXiv要求降速时暂停所有请求，已排队的请求在暂停结束后按原来的间隔继续"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class _SharedTokenBucket:
+    """跨进程共享的arXiv请求令牌桶：桶的状态保存在SQLite的一行中
+
+    process模式下每个worker进程都会请求arXiv，各进程在同一行上预占时间槽（BEGIN IMMEDIATE串行化），
+    整台机器的请求速率仍不超过arXiv的要求，暂停也对所有进程生效。时间使用系统时钟，各进程可以比较。
+    数据库读写在线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS arxiv_rate_limit (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    paused_until REAL NOT NULL
+                )
+            """)
+            # 初始时令牌桶是满的
+            conn.execute("INSERT OR IGNORE INTO arxiv_rate_limit (id, tokens, updated, paused_until) VALUES (1, 0, 0, 0)")
+
+    def _reserve(self, delay_seconds: float, burst: int) -> float:
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, updated, paused_until = conn.execute(
+                    "SELECT tokens, updated, paused_until FROM arxiv_rate_limit WHERE id = 1"
+                ).fetchone()
+                tokens, updated, wait = _reserve_slot(tokens, updated, paused_until, time.time(), delay_seconds, burst)
+                conn.execute("UPDATE arxiv_rate_limit SET tokens = ?, updated = ? WHERE id = 1", (tokens, updated))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def _pause(self, seconds: float) -> None:
+        with self._connection() as conn:
+            conn.execute("UPDATE arxiv_rate_limit SET paused_until = MAX(paused_until, ?) WHERE id = 1", (time.time() + seconds,))
+
+    async def acquire(self, delay_seconds: float, burst: int = 1) -> None:
+        wait = await asyncio.to_thread(self._reserve, delay_seconds, burst)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def pause(self, seconds: float) -> None:
+        """arXiv要求降速时暂停所有进程的请求"""
+        await asyncio.to_thread(self._pause, seconds)
+
+
+class _SingleFlight:
+    """合并并发的相同请求：同一个key只发起一次上游请求，其余调用方等待同一结果
+
+    所有调用方都放弃等待（被取消）时才取消上游请求。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, "tuple[asyncio.Task, List[int]]"] = {}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        call = self._calls.get(key)
+        if call is None or call[0].get_loop() is not loop:
+            call = (loop.create_task(factory()), [0])
+            self._calls[key] = call
+            call[0].add_done_callback(lambda task, key=key: self._forget(key, task))
+        else:
+            ARXIV_REQUESTS.labels("coalesced").inc()
+            logger.info(f"合并相同的arXiv请求: {key}")
+        task, waiters = call
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            waiters[0] -= 1
+            if waiters[0] == 0 and not task.done():
+                task.cancel()
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        call = self._calls.get(key)
+        if call is not None and call[0] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # 已由等待方处理，避免没有等待方时出现未获取异常的警告
+            task.exception()
+
+
+_inflight = _SingleFlight()
+
+
+@lru_cache(maxsize=None)
+def get_limiter() -> Union[_TokenBucket, _SharedTokenBucket]:
+    """首次请求时才创建令牌桶；默认与任务队列共用数据库，同一台机器上的API进程和worker进程共用一个令牌桶"""
+    if not config.get_bool("arxiv.shared-limiter", True):
+        return _TokenBucket()
+    from src.services.job_queue import DEFAULT_DB_PATH
+
+    return _SharedTokenBucket(config.get("arxiv.limiter-db-path") or config.get("worker.db-path") or DEFAULT_DB_PATH)
+
+
+def _retry_after(response) -> Optional[float]:
+    """解析Retry-After响应头（秒数形式）"""
+    try:
+        return max(float(response.headers.get("Retry-After", "")), 0.0)
+    except ValueError:
+        return None
+
+
+def _parse_page(text: str) -> "tuple[List[arxiv.Result], int]":
+    """解析一页Atom结果，返回(论文列表, 检索结果总数)；在线程池中执行，不阻塞事件循环"""
+    feed = feedparser.parse(text)
+    results = []
+    for entry in feed.entries:
+        try:
+            results.append(arxiv.Result._from_feed_entry(entry))
+        except arxiv.Result.MissingFieldError as e:
+            logger.warning(f"跳过字段不完整的检索结果: {e}")
+    total = int(feed.feed.get("opensearch_totalresults", 0) or 0)
+    return results, total
+
+
+class AsyncArxivClient:
+    """基于aiohttp的非阻塞arXiv API客户端
+
+    - 请求和等待都在事件循环中异步进行，Atom解析放到线程池，检索期间其他请求和SSE推送不受影响
+    - 第一页返回后即可得到结果总数，其余各页并发请求，按页的顺序产出结果，保持arXiv的相关性排序
+    - 所有客户端（默认包括同一台机器上的所有进程）共用一个令牌桶限速，并发的多个任务不会超过arXiv要求的请求间隔
+    - 网络错误、429、5xx和意外的空页按带随机抖动的指数退避重试；429或带Retry-After的503会让所有请求一起暂停
+    - 并发的相同分页请求（如多个任务检索同一组关键词）只向arXiv请求一次
+    """
+
+    def __init__(self,
+                 page_size: Optional[int] = None,
+                 base_url: Optional[str] = None,
+                 delay_seconds: Optional[float] = None,
+                 max_concurrent_pages: Optional[int] = None,
+                 num_retries: Optional[int] = None,
+                 timeout_seconds: Optional[float] = None,
+                 burst: Optional[int] = None,
+                 backoff_base_seconds: Optional[float] = None,
+                 backoff_max_seconds: Optional[float] = None,
+                 coalesce: Optional[bool] = None):
+        self.page_size = page_size or config.get_int("arxiv.page-size", 100)
+        self.base_url = base_url or config.get("arxiv.base-url") or DEFAULT_BASE_URL
+        self.delay_seconds = config.get_float("arxiv.delay-seconds", 3.0) if delay_seconds is None else delay_seconds
+        self.max_concurrent_pages = max_concurrent_pages or config.get_int("arxiv.max-concurrent-pages", 3)
+        self.num_retries = config.get_int("arxiv.num-retries", 3) if num_retries is None else num_retries
+        self.timeout_seconds = timeout_seconds or config.get_float("arxiv.timeout-seconds", 30)
+        self.burst = burst or config.get_int("arxiv.burst", 1)
+        self.backoff_base_seconds = config.get_float("arxiv.backoff-base-seconds", 1.0) if backoff_base_seconds is None else backoff_base_seconds
+        self.backoff_max_seconds = config.get_float("arxiv.backoff-max-seconds", 30.0) if backoff_max_seconds is None else backoff_max_seconds
+        self.coalesce = config.get_bool("arxiv.coalesce", True) if coalesce is None else coalesce
+
+    def _page_url(self, search: arxiv.Search, start: int, page_size: int) -> str:
+        url_args = search._url_args()
+        url_args.update({"start": str(start), "max_results": str(page_size)})
+        return f"{self.base_url}?{urlencode(url_args)}"
+
+    def _backoff_cap(self, attempt: int) -> float:
+        return min(self.backoff_base_seconds * 2 ** attempt, self.backoff_max_seconds)
+
+    def _backoff(self, attempt: int) -> float:
+        """第attempt次重试前的等待时间：指数退避加完全随机抖动，避免多个任务同时重试"""
+        return random.uniform(0, self._backoff_cap(attempt))
+
+    async def _fetch_page(self, search: arxiv.Search, start: int, page_size: int) -> "tuple[List[arxiv.Result], int]":
+        url = self._page_url(search, start, page_size)
+        if not self.coalesce:
+            return await self._request_page(url, start)
+        return await _inflight.do(url, lambda: self._request_page(url, start))
+
+    async def _request_page(self, url: str, start: int) -> "tuple[List[arxiv.Result], int]":
+        import aiohttp
+
+        attempt = 0
+        limiter = get_limiter()
+        # 合并后的请求可能比发起它的检索活得更久，每个分页请求使用自己的会话
+        timeout = aiohttp.ClientTimeout(total=self.timeout_seconds)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                await limiter.acquire(self.delay_seconds, self.burst)
+                retry_after = None
+                try:
+                    async with session.get(url) as response:
+                        if response.status == 429 or response.status >= 500:
+                            retry_after = _retry_after(response)
+                            if retry_after is None and response.status == 429:
+                                # 没有Retry-After的429也要让其他进行中的请求一起降速，按本次的退避上限暂停
+                                retry_after = self._backoff_cap(attempt)
+                            if retry_after is not None:
+                                await limiter.pause(retry_after)
+                            raise ArxivAPIError(f"arXiv返回 HTTP {response.status}")
+                        if response.status >= 400:
+                            # 其余4xx说明请求本身有误，重试没有意义
+                            ARXIV_REQUESTS.labels("failed").inc()
+                            raise ArxivRequestError(f"arXiv拒绝了请求: HTTP {response.status}, {url}")
+                        text = await response.text()
+                    results, total = await asyncio.to_thread(_parse_page, text)
+                    # arXiv偶尔会对范围内的请求返回空页，重试通常可以恢复
+                    if not results and start < total:
+                        raise ArxivAPIError(f"arXiv返回意外的空页: start={start}")
+                    ARXIV_REQUESTS.labels("ok").inc()
+                    return results, total
+                except (aiohttp.ClientError, asyncio.TimeoutError, ArxivAPIError) as e:
+                    if isinstance(e, ArxivRequestError):
+                        raise
+                    if attempt >= self.num_retries:
+                        ARXIV_REQUESTS.labels("failed").inc()
+                        raise ArxivAPIError(f"arXiv请求失败（已重试 {attempt} 次）: {e}") from e
+                    ARXIV_REQUESTS.labels("retry").inc()
+                    backoff = max(self._backoff(attempt), retry_after or 0.0)
+                    attempt += 1
+                    logger.warning(f"arXiv请求失败，{backoff:.1f} 秒后重试: start={start}, {e}")
+                    await asyncio.sleep(backoff)
+
+    async def results(self, search: arxiv.Search) -> AsyncIterator[arxiv.Result]:
+        """按页异步产出检索结果，结果数不超过search.max_results"""
+        max_results = search.max_results if search.max_results is not None else float("inf")
+        first_size = int(min(self.page_size, max_results))
+        if first_size <= 0:
+            return
+        results, total = await self._fetch_page(search, 0, first_size)
+        if not results:
+            logger.info("arXiv第一页没有结果，检索结束")
+            return
+        limit = int(min(total, max_results))
+        logger.info(f"arXiv第一页返回 {len(results)} 篇，共 {total} 篇，本次最多获取 {limit} 篇")
+        for result in results[:limit]:
+            yield result
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_pages)
+
+        async def fetch(start: int):
+            async with semaphore:
+                return await self._fetch_page(search, start, min(self.page_size, limit - start))
+
+        # 其余各页一次性发出（受并发数和令牌桶限制），按顺序等待，先完成的页在内存中等待前面的页
+        pages = [asyncio.create_task(fetch(start)) for start in range(len(results), limit, self.page_size)]
+        try:
+            for page in pages:
+                page_results, _ = await page
+                for result in page_results:
+                    yield result
+        finally:
+            # 调用方提前停止读取（如达到论文数上限）时取消尚未完成的页
+            for page in pages:
+                page.cancel()
+            await asyncio.gather(*pages, return_exceptions=True)
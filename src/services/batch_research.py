@@ -0,0 +1,197 @@
+import asyncio
+import uuid
+from typing import Any, Dict, List, Optional
+
+from autogen_core import CancellationToken
+
+from src.agents.userproxy_agent import ReviewPolicy
+from src.core.run_budget import RunBudget, budgeted_node, current_budget
+from src.core.state_models import BackToFrontData, ExecutionState, NodeError, PaperAgentState
+from src.services.job_queue import SqliteJobQueue
+from src.services.job_registry import Job, JobRegistry, JobStatus
+from src.services.job_worker import save_result
+from src.services.paper_store import get_paper_store
+from src.tasks.deduplicator import base_arxiv_id, dedupe_papers
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class _Broadcast:
+    """把共享阅读阶段的进度事件同时推送给批次中的所有任务"""
+
+    def __init__(self, jobs: List[Job]):
+        self.jobs = jobs
+
+    def put_nowait(self, item: BackToFrontData) -> None:
+        for job in self.jobs:
+            if not job.done:
+                job.channel.put_nowait(item.model_copy())
+
+    async def put(self, item: BackToFrontData) -> None:
+        self.put_nowait(item)
+
+
+class BatchResearch:
+    """批量调研：多个相关请求共享论文阅读结果
+
+    1. 各请求分别生成检索条件并检索论文（不等待人工审核），与单个请求一样按运行预算限制论文数并经过相关性筛选
+    2. 所有请求的检索结果合并后按arXiv id去重，每篇论文只提取一次并写入向量数据库
+    3. 共享的提取结果分发给各请求，各自独立执行分析、写作和报告生成
+
+    每个请求仍是一个独立的任务，可以单独订阅事件、查询状态和报告、取消。检索、共享阅读和后续阶段都通过job_scheduler
+    占用运行槽位；各请求的检索和后续阶段使用各自的运行预算，共享阅读使用批次的运行预算（计时都从提交时开始）。
+    """
+
+    def __init__(self,
+                 queue: SqliteJobQueue,
+                 registry: JobRegistry,
+                 max_papers: int = 50,
+                 priority: int = 0,
+                 budget: Optional[Dict[str, Any]] = None):
+        self.queue = queue
+        self.registry = registry
+        self.max_papers = max_papers
+        self.priority = priority
+        self.budget = budget
+        self._reading_budget = RunBudget.from_config(budget)
+        self._budgets: Dict[str, RunBudget] = {}
+        self.cancellation_token = CancellationToken()
+        # 批次中的请求共用一次阅读结果，向量数据库中的论文以批次为范围
+        self.corpus_id = f"batch-{uuid.uuid4().hex}"
+        self._papers: Dict[str, asyncio.Future] = {}
+        self._extraction: Optional[asyncio.Task] = None
+
+    def submit(self, queries: List[str]) -> List[Job]:
+        """为每个请求登记任务并开始执行，返回各请求对应的任务"""
+        jobs = [self.registry.create_job(query) for query in queries]
+        loop = asyncio.get_running_loop()
+        for job in jobs:
+            self.queue.enqueue(job.job_id, job.query, self.priority, "running", ReviewPolicy.AUTO.value, self.budget)
+            self._papers[job.job_id] = loop.create_future()
+            self._budgets[job.job_id] = RunBudget.from_config(self.budget)
+        self._extraction = asyncio.create_task(self._extract_shared(jobs))
+        for job in jobs:
+            self.registry.start(job, self._run_job(job))
+        logger.info(f"批量调研开始: {len(jobs)} 个请求")
+        return jobs
+
+    async def wait(self, jobs: List[Job]) -> List[Optional[PaperAgentState]]:
+        """等待批次中的所有任务结束，返回各任务的最终状态（失败或取消时为None）"""
+        results = await asyncio.gather(*[job.task for job in jobs], return_exceptions=True)
+        return [result if isinstance(result, PaperAgentState) else None for result in results]
+
+    async def _search(self, job: Job, state: PaperAgentState) -> List[dict]:
+        """与search_node、filter_node相同：检索max_papers * candidate-factor篇候选论文，再按相关性保留max_papers篇"""
+        from src.agents.filter_agent import select_relevant
+        from src.agents.search_agent import generate_search_query, search_papers_cached
+        from src.tasks.paper_filter import candidate_count, is_enabled as filter_enabled
+
+        channel = job.channel
+        state.current_step = ExecutionState.SEARCHING
+        await channel.put(BackToFrontData(step=ExecutionState.SEARCHING, state="initializing", data=None))
+        search_query = await generate_search_query(state, channel, job.cancellation_token)
+        state.search_query = search_query.model_dump()
+        papers = await search_papers_cached(search_query, candidate_count(state.max_papers))
+        if papers:
+            await channel.put(BackToFrontData(step=ExecutionState.SEARCHING, state="completed", data=f"论文搜索完成，共找到 {len(papers)} 篇论文"))
+        if papers and filter_enabled():
+            candidates = len(papers)
+            papers, state.relevance_scores, _ = await select_relevant(state, papers)
+            await channel.put(BackToFrontData(step=ExecutionState.FILTERING, state="completed", data=f"相关性筛选完成：从 {candidates} 篇候选论文中保留最相关的 {len(papers)} 篇"))
+        return papers
+
+    async def _extract_shared(self, jobs: List[Job]) -> Dict[str, object]:
+        """等待所有请求检索完成后，对去重后的论文统一提取一次
+
+        提取在批次的运行预算下进行并占用一个调度槽位：预算耗尽或临近截止时间时停止阅读新论文，未提取的论文不分发给各请求。
+        """
+        from src.agents.reading_agent import iter_papers, read_papers
+        from src.services.job_scheduler import job_scheduler
+
+        paper_lists = await asyncio.gather(*self._papers.values())
+        unique = dedupe_papers(paper_lists)
+        if unique and get_paper_store().enabled:
+            # 各请求的检索结果可能来自不同时间的缓存，按id从论文库批量读取一次，统一为已知的最新版本
+            from src.tasks.paper_search import PaperSearcher
+
+            try:
+                for paper in await PaperSearcher().lookup_papers(list(unique)):
+                    unique[base_arxiv_id(paper["paper_id"])] = paper
+            except Exception as e:
+                logger.warning(f"从论文元数据库读取批量调研的论文失败，使用检索结果: {e}")
+        total = sum(len(papers) for papers in paper_lists)
+        logger.info(f"批量调研共检索到 {total} 篇论文，去重后需阅读 {len(unique)} 篇")
+        waiting = [job for job in jobs if not job.done]
+        if not unique or not waiting:
+            return {}
+        broadcast = _Broadcast(waiting)
+        await broadcast.put(BackToFrontData(step=ExecutionState.READING, state="initializing", data=None))
+        await broadcast.put(BackToFrontData(step=ExecutionState.READING, state="thinking", data=f"批量调研共检索到 {total} 篇论文，去重后阅读 {len(unique)} 篇\n"))
+
+        @budgeted_node("reading")
+        async def read(papers: List[dict]):
+            return await read_papers(iter_papers(papers), broadcast, self.cancellation_token, corpus_id=self.corpus_id)
+
+        # 排队位置推送给批次中的所有任务
+        handle = Job(job_id=self.corpus_id, query="", channel=broadcast)
+        budget_token = current_budget.set(self._reading_budget)
+        try:
+            papers, parsed_papers = await job_scheduler.run(handle, read(list(unique.values())), self.priority)
+        finally:
+            current_budget.reset(budget_token)
+        logger.info(f"批量调研共享阅读的预算使用情况: {self._reading_budget.report()}")
+        return {base_arxiv_id(paper["paper_id"]): parsed for paper, parsed in zip(papers, parsed_papers)}
+
+    async def _run_job(self, job: Job) -> PaperAgentState:
+        from src.agents.orchestrator import PaperAgentOrchestrator
+        from src.agents.reading_agent import ExtractedPapersData
+        from src.services.job_scheduler import job_scheduler
+
+        budget = self._budgets[job.job_id]
+        state = PaperAgentState(
+            user_request=job.query,
+            max_papers=budget.limit_papers(self.max_papers),
+            error=NodeError(),
+            config={"job_id": job.job_id, "review_policy": ReviewPolicy.AUTO.value, "batch": True,
+                    "corpus_id": self.corpus_id, "budget": budget.limits()},
+        )
+        final_state, error = None, None
+        papers = []
+        try:
+            budget_token = current_budget.set(budget)
+            try:
+                papers = await job_scheduler.run(job, budgeted_node("search")(self._search)(job, state), self.priority)
+            finally:
+                current_budget.reset(budget_token)
+                # 失败或取消的请求以空结果参与合并，不阻塞批次中的其他请求
+                self._papers[job.job_id].set_result(papers)
+            if not papers:
+                state.error.search_node_error = "没有找到相关论文,请尝试其他查询条件"
+                await job.channel.put(BackToFrontData(step=ExecutionState.SEARCHING, state="error", data=state.error.search_node_error))
+                await job.channel.put(BackToFrontData(step=ExecutionState.FINISHED, state="finished", data=None))
+                final_state = state
+                return state
+
+            # 共享的阅读任务由所有请求共同等待，单个请求取消时不能取消它
+            extracted = await asyncio.shield(self._extraction)
+            # 共享阅读因预算或截止时间提前停止时，只保留已提取的论文
+            unique = {base_id: paper for base_id, paper in dedupe_papers([papers]).items() if base_id in extracted}
+            state.search_results = list(unique.values())
+            state.extracted_data = ExtractedPapersData(papers=[extracted[base_id] for base_id in unique])
+            state.current_step = ExecutionState.READING
+            await job.channel.put(BackToFrontData(step=ExecutionState.READING, state="completed", data=f"论文阅读完成，本请求共 {len(unique)} 篇论文"))
+
+            orchestrator = PaperAgentOrchestrator(state_queue=job.channel, cancellation_token=job.cancellation_token)
+            final_state = await job_scheduler.run(job, orchestrator.run_from(state, "analyse_node", budget), self.priority)
+            return final_state
+        except asyncio.CancelledError:
+            error = "任务已取消"
+            job.status = JobStatus.CANCELLED
+            raise
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            save_result(self.queue, job, final_state, error)
+
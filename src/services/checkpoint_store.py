@@ -0,0 +1,121 @@
+import pickle
+import sqlite3
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Tuple
+
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from pydantic import BaseModel
+
+from src.core.config import config
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent.parent / "data" / "checkpoints.db"
+
+# 出错后会路由到的错误处理节点，从这里恢复没有意义
+ERROR_NODE = "handle_error_node"
+
+# SQLite单条语句的参数个数有上限（旧版本为999），批量删除时分块
+_DELETE_CHUNK = 500
+
+
+class StateSerializer(JsonPlusSerializer):
+    """检查点序列化器
+
+    默认的msgpack序列化会把嵌套的pydantic模型展开为字典再重新校验，
+    PaperAgentState中由各节点写入的子模型类型与声明不完全一致，还原时会退化成字典，
+    因此pydantic模型直接用pickle保存，其余数据沿用默认序列化。
+    """
+
+    def __init__(self):
+        super().__init__(pickle_fallback=True)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        if isinstance(obj, BaseModel):
+            return "pickle", pickle.dumps(obj)
+        return super().dumps_typed(obj)
+
+
+def is_enabled() -> bool:
+    return config.get_bool("checkpoint.enabled", True)
+
+
+@asynccontextmanager
+async def open_checkpointer() -> AsyncIterator[Optional[Any]]:
+    """打开SQLite检查点存储，未启用检查点时返回None"""
+    if not is_enabled():
+        yield None
+        return
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    db_path = get_db_path()
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    async with aiosqlite.connect(db_path) as conn:
+        yield AsyncSqliteSaver(conn, serde=StateSerializer())
+
+
+def get_db_path() -> Path:
+    return Path(config.get("checkpoint.db-path") or DEFAULT_DB_PATH)
+
+
+def delete_threads(job_ids: Iterable[str]) -> int:
+    """删除任务的所有检查点（同步短事务，异步代码中应通过asyncio.to_thread调用），返回删除的检查点数
+
+    清理过期任务时与任务记录一起调用；检查点数据库或表尚不存在时直接返回0。
+    """
+    job_ids = list(dict.fromkeys(job_ids))
+    db_path = get_db_path()
+    if not job_ids or not db_path.exists():
+        return 0
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        # 表由LangGraph在首次写入检查点时创建
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'checkpoints'").fetchone() is None:
+            return 0
+        deleted = 0
+        for i in range(0, len(job_ids), _DELETE_CHUNK):
+            chunk = job_ids[i:i + _DELETE_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            deleted += conn.execute(f"DELETE FROM checkpoints WHERE thread_id IN ({placeholders})", chunk).rowcount
+            conn.execute(f"DELETE FROM writes WHERE thread_id IN ({placeholders})", chunk)
+        conn.commit()
+        return deleted
+    finally:
+        conn.close()
+
+
+def thread_config(job_id: str) -> Dict[str, Any]:
+    """同一任务的所有检查点都保存在以job_id为thread_id的线程下"""
+    return {"configurable": {"thread_id": job_id}}
+
+
+async def find_resume_config(graph, job_id: str) -> Optional[Dict[str, Any]]:
+    """查找任务最后一个成功节点之后的检查点
+
+    返回:
+        可直接传给graph.ainvoke(None, config)继续执行的检查点配置；
+        任务没有检查点或已经完整执行结束时返回None
+    """
+    latest = None
+    async for snapshot in graph.aget_state_history(thread_config(job_id)):
+        if latest is None:
+            latest = snapshot
+            if not snapshot.next and not _has_error(snapshot):
+                # 最近一次执行已正常结束，无需恢复
+                return None
+        if snapshot.next and ERROR_NODE not in snapshot.next and not _has_error(snapshot):
+            logger.info(f"找到可恢复的检查点: job_id={job_id}, 下一个节点={snapshot.next}")
+            return snapshot.config
+    return None
+
+
+def _has_error(snapshot) -> bool:
+    value = snapshot.values.get("value") if snapshot.values else None
+    error = getattr(value, "error", None)
+    # 读取历史快照时LangGraph会重新构造状态对象，嵌套的NodeError可能是字典
+    if isinstance(error, dict):
+        return any(error.values())
+    return bool(error and error.first_error())
@@ -1,11 +1,13 @@
 import os
-from typing import Any, List, Dict, Optional
-import chromadb
-from chromadb.config import Settings
-from chromadb.utils import embedding_functions
+from typing import Any, List, Dict, Optional, TYPE_CHECKING
 from pathlib import Path
-from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
 from src.core.config import config
+from src.utils.metrics import CHROMA_LATENCY
+from src.utils.tracing import span
+
+# chromadb导入耗时较长，只在真正创建客户端时才导入
+if TYPE_CHECKING:
+    from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
 
 
 class ChromaClient:
@@ -26,6 +28,8 @@ class ChromaClient:
         self.collection_name = collection_name
         self.embedding_model = embedding_model
         
+        import chromadb
+
         # 创建Chroma客户端
         self.client = chromadb.PersistentClient(path=Path(__file__).parent.parent.parent / "data" / "chromadb")
         
@@ -39,7 +43,9 @@ class ChromaClient:
             embedding_function=self.embedding_function
         )
 
-    def create_embedding_client(self) -> OpenAIEmbeddingFunction:
+    def create_embedding_client(self) -> "OpenAIEmbeddingFunction":
+        from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
         try:
             model_config = config.get("chroma-embedding-model", {})
             provider = model_config.get("model-provider")
@@ -66,7 +72,9 @@ class ChromaClient:
             print(f"创建嵌入模型客户端失败: {e}，使用默认模型代替")
             return self.create_default_embedding_client()
 
-    def create_default_embedding_client() -> OpenAIEmbeddingFunction:
+    def create_default_embedding_client() -> "OpenAIEmbeddingFunction":
+        from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
         default_model_config = config.get("default-embedding-model", {})
         provider = default_model_config.get("model-provider", "siliconflow")
         model = default_model_config.get("model", "Qwen/Qwen3-Embedding-8B")
@@ -100,13 +108,37 @@ class ChromaClient:
 
         metadatas = [self.safe_metadata_conversion(metadata) for metadata in metadatas]
 
-        self.collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        with CHROMA_LATENCY.labels("add").time(), span("chroma.add", "io", documents=len(documents)):
+            self.collection.add(
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
+            )
         
     
+    def upsert_documents(self,
+                         documents: List[str],
+                         ids: List[str],
+                         metadatas: Optional[List[dict]] = None) -> None:
+        """
+        按ID写入文档，ID已存在时覆盖，重复写入同一篇论文不会产生多条记录
+
+        :param documents: 文档内容列表
+        :param ids: 文档ID列表，如论文的paper_id
+        :param metadatas: 元数据列表(可选)
+        """
+        if not metadatas:
+            metadatas = [{} for _ in documents]
+
+        metadatas = [self.safe_metadata_conversion(metadata) for metadata in metadatas]
+
+        with CHROMA_LATENCY.labels("upsert").time(), span("chroma.upsert", "io", documents=len(documents)):
+            self.collection.upsert(
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
+            )
+
     def query(self, 
               query_texts: List[str], 
               n_results: int = 5, 
@@ -119,12 +151,13 @@ class ChromaClient:
         :param where: 过滤条件(可选)
         :return: 查询结果字典
         """
-        return self.collection.query(
-            query_texts=query_texts,
-            n_results=n_results,
-            where=where,
-            include=["metadatas"]
-        )
+        with CHROMA_LATENCY.labels("query").time(), span("chroma.query", "io", queries=len(query_texts), n_results=n_results):
+            return self.collection.query(
+                query_texts=query_texts,
+                n_results=n_results,
+                where=where,
+                include=["metadatas"]
+            )
     
     def delete_collection(self) -> None:
         """删除当前集合"""
@@ -0,0 +1,69 @@
+import asyncio
+from typing import Callable, List, Optional
+
+from src.core.state_models import BackToFrontData
+
+# 只有流式输出的文本片段才会被合并，状态切换类事件（initializing/completed/error等）始终原样透传
+COALESCIBLE_STATES = ("thinking", "generating")
+
+
+class EventCoalescer:
+    """流式事件合并器
+
+    模型流式输出时每个token都会产生一个BackToFrontData，逐个序列化并推送给前端开销很大。
+    合并器把同一step、同一state下连续的文本片段拼接成一个事件，
+    在时间窗口到期或累计字节数达到上限时再统一下发；step或state一旦变化就先下发已缓存的内容，
+    因此不会跨阶段合并，前端按顺序拼接得到的内容与逐个推送完全一致。
+    """
+
+    def __init__(self, sink: Callable[[BackToFrontData], None], window_ms: float = 100, max_bytes: int = 4096):
+        """
+        参数:
+            sink: 合并后事件的下游处理函数
+            window_ms: 合并时间窗口（毫秒），小于等于0表示不合并
+            max_bytes: 单个合并事件的最大字节数，达到后立即下发
+        """
+        self.sink = sink
+        self.window_ms = window_ms
+        self.max_bytes = max_bytes
+        self._pending: Optional[BackToFrontData] = None
+        self._parts: List[str] = []
+        self._size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @staticmethod
+    def _coalescible(item: BackToFrontData) -> bool:
+        return item.state in COALESCIBLE_STATES and isinstance(item.data, str)
+
+    def push(self, item: BackToFrontData) -> None:
+        """接收上游事件"""
+        if self.window_ms <= 0 or not self._coalescible(item):
+            self.flush()
+            self.sink(item)
+            return
+
+        if self._pending is not None and (self._pending.step != item.step or self._pending.state != item.state):
+            self.flush()
+
+        if self._pending is None:
+            self._pending = BackToFrontData(step=item.step, state=item.state, data=None)
+            self._timer = asyncio.get_running_loop().call_later(self.window_ms / 1000, self.flush)
+        self._parts.append(item.data)
+        self._size += len(item.data.encode("utf-8"))
+
+        if self._size >= self.max_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        """立即下发已缓存的合并事件"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending is None:
+            return
+        pending = self._pending
+        pending.data = "".join(self._parts)
+        self._pending = None
+        self._parts = []
+        self._size = 0
+        self.sink(pending)
@@ -0,0 +1,353 @@
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from src.core.config import config
+from src.core.state_models import BackToFrontData
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent.parent / "data" / "jobs.db"
+
+
+class SqliteJobQueue:
+    """基于SQLite的本地持久化任务队列
+
+    API进程把调研任务写入jobs表，worker进程从中领取并执行，执行过程中产生的事件写入events表，
+    API进程再从events表读取事件推送给前端。单机即可运行，不依赖任何外部消息中间件。
+    jobs表同时记录任务的当前阶段和最终报告，任务结束后仍可随时查询结果。
+    worker执行任务期间定期通过heartbeat续租，超过lease-seconds没有心跳的任务（worker进程崩溃或被杀死）
+    会在下一次claim时重新放回等待队列，由其他worker接手。
+    所有方法都是同步的短事务，异步代码中应通过asyncio.to_thread调用。
+    """
+
+    def __init__(self, db_path: Optional[Union[str, Path]] = None):
+        db_path = db_path or config.get("worker.db-path") or DEFAULT_DB_PATH
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        # 自动提交模式，每条语句即一个事务；需要原子性的操作显式使用BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        with self._connection() as conn:
+            # WAL模式下读写互不阻塞，适合多个worker进程并发写事件
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker_id TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    current_step TEXT,
+                    report_markdown TEXT,
+                    review_policy TEXT,
+                    review_input TEXT,
+                    budget TEXT,
+                    budget_usage TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    finished_at REAL
+                )
+            """)
+            # 兼容旧版本创建的数据库，补齐新增的列
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column in ("current_step", "report_markdown", "review_policy", "review_input", "budget", "budget_usage"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+            if "heartbeat_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs (status, priority, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                )
+            """)
+
+    def enqueue(self,
+                job_id: str,
+                query: str,
+                priority: int = 0,
+                status: str = "pending",
+                review_policy: Optional[str] = None,
+                budget: Optional[Dict[str, Any]] = None) -> None:
+        """新任务入队
+
+        参数:
+            status: 初始状态；API进程内直接执行的任务以running登记，不会被worker领取
+            review_policy: 任务的人工审核策略，None表示使用worker的全局配置
+            budget: 任务的运行预算(max_papers / max_tokens / max_seconds / max_concurrent_calls)，None表示使用全局配置
+        """
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, query, priority, status, review_policy, budget, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, query, priority, status, review_policy, json.dumps(budget) if budget else None, time.time()),
+            )
+
+    def claim(self, worker_id: str, lease_seconds: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """领取一个待执行任务（优先级数值小的优先，同优先级先进先出），没有任务时返回None
+
+        领取前先回收租约已过期的任务：执行中但超过lease_seconds没有心跳的任务重新放回等待队列，
+        已请求取消的直接标记为已取消。API进程内执行的任务没有worker_id，不受租约影响。
+
+        参数:
+            lease_seconds: 租约时长（秒），None表示使用worker.lease-seconds配置，0表示不回收
+        """
+        lease_seconds = config.get_float("worker.lease-seconds", 60) if lease_seconds is None else lease_seconds
+        with self._connection() as conn:
+            # IMMEDIATE事务保证多个worker不会领取到同一个任务
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                if lease_seconds:
+                    self._reclaim_expired(conn, now - lease_seconds)
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'pending' AND cancel_requested = 0 "
+                    "ORDER BY priority, created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', worker_id = ?, started_at = ?, heartbeat_at = ? WHERE job_id = ?",
+                        (worker_id, now, now, row["job_id"]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._row_to_dict(row)
+
+    @staticmethod
+    def _reclaim_expired(conn: sqlite3.Connection, cutoff: float) -> None:
+        expired = [
+            (row["job_id"], row["worker_id"], row["cancel_requested"])
+            for row in conn.execute(
+                "SELECT job_id, worker_id, cancel_requested FROM jobs "
+                "WHERE status = 'running' AND worker_id IS NOT NULL AND COALESCE(heartbeat_at, started_at) < ?",
+                (cutoff,),
+            )
+        ]
+        for job_id, worker_id, cancel_requested in expired:
+            if cancel_requested:
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', error = ?, finished_at = ? WHERE job_id = ?",
+                    ("任务已取消", time.time(), job_id),
+                )
+                continue
+            # 重新执行时事件序号从头开始，先清掉上一次执行留下的事件
+            conn.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+            conn.execute(
+                "UPDATE jobs SET status = 'pending', worker_id = NULL, started_at = NULL, heartbeat_at = NULL WHERE job_id = ?",
+                (job_id,),
+            )
+        if expired:
+            logger.warning(f"回收租约过期的任务: {[(job_id, worker_id) for job_id, worker_id, _ in expired]}")
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """worker续租正在执行的任务；任务已被回收或不再由该worker执行时返回False"""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+                (time.time(), job_id, worker_id),
+            )
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row)
+
+    @staticmethod
+    def _row_to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        for column in ("budget", "budget_usage"):
+            if job.get(column):
+                job[column] = json.loads(job[column])
+        return job
+
+    def position(self, job_id: str) -> int:
+        """任务在等待队列中的位置，从1开始；任务已不在等待状态时返回0"""
+        with self._connection() as conn:
+            job = conn.execute("SELECT status, priority, created_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None or job["status"] != "pending":
+                return 0
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'pending' AND cancel_requested = 0 "
+                "AND (priority < ? OR (priority = ? AND created_at < ?))",
+                (job["priority"], job["priority"], job["created_at"]),
+            ).fetchone()[0]
+        return ahead + 1
+
+    def count_pending(self) -> int:
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending' AND cancel_requested = 0").fetchone()[0]
+
+    def count_by_status(self) -> Dict[str, int]:
+        """按状态统计任务数"""
+        with self._connection() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    def finish(self,
+               job_id: str,
+               status: str,
+               error: Optional[str] = None,
+               report_markdown: Optional[str] = None,
+               current_step: Optional[str] = None,
+               budget_usage: Optional[Dict[str, Any]] = None) -> None:
+        """记录任务最终状态(finished / failed / cancelled)、生成的报告及预算使用情况"""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, "
+                "report_markdown = COALESCE(?, report_markdown), current_step = COALESCE(?, current_step), "
+                "budget_usage = COALESCE(?, budget_usage) "
+                "WHERE job_id = ?",
+                (status, error, time.time(), report_markdown, current_step,
+                 json.dumps(budget_usage, ensure_ascii=False) if budget_usage else None, job_id),
+            )
+
+    def request_cancel(self, job_id: str) -> None:
+        """请求取消任务；尚未被领取的任务直接标记为已取消，执行中的任务由worker轮询到后自行中止"""
+        with self._connection() as conn:
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'pending'",
+                (time.time(), job_id),
+            )
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._connection() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def submit_review_input(self, job_id: str, user_input: str) -> bool:
+        """API进程写入人工审核结果，由执行任务的worker读取；任务不在执行中时返回False"""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET review_input = ? WHERE job_id = ? AND status = 'running'",
+                (user_input, job_id),
+            )
+        return cursor.rowcount > 0
+
+    def take_review_input(self, job_id: str) -> Optional[str]:
+        """worker读取并清除人工审核结果，没有新的审核结果时返回None"""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT review_input FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                if row is not None and row["review_input"] is not None:
+                    conn.execute("UPDATE jobs SET review_input = NULL WHERE job_id = ?", (job_id,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row["review_input"] if row else None
+
+    def requeue_running(self) -> int:
+        """把上次异常退出时仍处于执行中的任务重新放回等待队列，返回重新入队的任务数"""
+        with self._connection() as conn:
+            # 重新执行时事件序号从头开始，先清掉上一次执行留下的事件
+            conn.execute(
+                "DELETE FROM events WHERE job_id IN "
+                "(SELECT job_id FROM jobs WHERE status = 'running' AND cancel_requested = 0)"
+            )
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', worker_id = NULL, started_at = NULL, heartbeat_at = NULL "
+                "WHERE status = 'running' AND cancel_requested = 0"
+            )
+            count = cursor.rowcount
+        if count:
+            logger.info(f"重新入队未完成的任务: {count} 个")
+        return count
+
+    def reset_for_resume(self, job_id: str, status: str = "pending") -> None:
+        """把失败或已取消的任务重新置为可执行状态，流水线会从检查点继续执行"""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = NULL, worker_id = NULL, started_at = NULL, heartbeat_at = NULL, finished_at = NULL, "
+                "cancel_requested = 0, review_input = NULL, report_markdown = NULL, current_step = NULL, budget_usage = NULL "
+                "WHERE job_id = ?",
+                (status, job_id),
+            )
+
+    def append_events(self, job_id: str, events: List[BackToFrontData]) -> None:
+        """批量写入任务事件，事件需已由EventChannel分配序号"""
+        if not events:
+            return
+        with self._connection() as conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO events (job_id, seq, payload) VALUES (?, ?, ?)",
+                [(job_id, event.seq, event.model_dump_json()) for event in events],
+            )
+            # 同时记录任务当前所处阶段，供任务状态查询
+            conn.execute("UPDATE jobs SET current_step = ? WHERE job_id = ?", (events[-1].step, job_id))
+            conn.execute("COMMIT")
+
+    def fetch_events(self, job_id: str, after_seq: int = 0, limit: int = 500) -> List[BackToFrontData]:
+        """读取序号大于after_seq的事件"""
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT payload FROM events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after_seq, limit),
+            ).fetchall()
+        return [BackToFrontData(**json.loads(row["payload"])) for row in rows]
+
+    def prune(self, retention_seconds: float) -> int:
+        """删除结束超过retention_seconds的任务及其事件和检查点，返回删除的任务数
+
+        事件只在任务结束前后用于SSE推送和断线回放，与任务记录一起删除，events表不会无限增长；
+        失败任务为恢复执行保留的检查点也一并删除，任务记录删除后已无法恢复。
+        """
+        from src.services.checkpoint_store import delete_threads
+
+        cutoff = time.time() - retention_seconds
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                job_ids = [row["job_id"] for row in conn.execute("SELECT job_id FROM jobs WHERE finished_at < ?", (cutoff,))]
+                conn.execute(
+                    "DELETE FROM events WHERE job_id IN (SELECT job_id FROM jobs WHERE finished_at < ?)",
+                    (cutoff,),
+                )
+                count = conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,)).rowcount
+                # 任务记录已不存在的事件（如手动删除任务后残留的）一并清理
+                conn.execute("DELETE FROM events WHERE job_id NOT IN (SELECT job_id FROM jobs)")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if job_ids:
+            delete_threads(job_ids)
+        if count:
+            logger.info(f"清理过期任务: {count} 个")
+        return count
+
+
+@lru_cache(maxsize=None)
+def get_job_queue() -> SqliteJobQueue:
+    """首次使用时才创建全局任务队列，导入模块不会创建数据库文件"""
+    return SqliteJobQueue()
@@ -0,0 +1,240 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, AsyncIterator, Coroutine, Dict, List, Optional
+
+from autogen_core import CancellationToken
+
+from src.core.config import config
+from src.core.state_models import BackToFrontData, ExecutionState
+from src.services.event_coalescer import EventCoalescer
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class JobStatus(str, Enum):
+    """调研任务状态枚举"""
+    PENDING = "pending"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class EventChannel:
+    """单个任务的有界事件通道
+
+    每个事件写入时分配递增的序号(seq)，并保存在固定长度的环形缓冲区中。
+    通道满时自动淘汰最旧的事件而不是阻塞生产者，这样即使前端已断开、无人消费，
+    流水线也不会被卡住，内存占用也不会无限增长。
+    订阅者可以从任意序号开始读取，断线重连时据此回放错过的事件再继续接收实时事件。
+    写入的流式文本片段会先经过EventCoalescer合并，再分配序号进入缓冲区。
+    """
+
+    def __init__(self, maxsize: int = 1000, coalesce_window_ms: float = 0, coalesce_max_bytes: int = 4096):
+        self._buffer: deque = deque(maxlen=maxsize)
+        self._seq = 0
+        self._closed = False
+        self._new_event = asyncio.Event()
+        self._coalescer = EventCoalescer(self._publish, coalesce_window_ms, coalesce_max_bytes)
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def last_event(self) -> Optional[BackToFrontData]:
+        return self._buffer[-1] if self._buffer else None
+
+    def put_nowait(self, item: BackToFrontData) -> None:
+        self._coalescer.push(item)
+
+    def _publish(self, item: BackToFrontData) -> None:
+        self._seq += 1
+        item.seq = self._seq
+        self._buffer.append(item)
+        # 唤醒所有等待中的订阅者，并为下一批事件准备新的Event
+        self._new_event.set()
+        self._new_event = asyncio.Event()
+
+    async def put(self, item: BackToFrontData) -> None:
+        self.put_nowait(item)
+
+    def close(self) -> None:
+        """任务结束后关闭通道，订阅者读完剩余事件后即退出"""
+        self._coalescer.flush()
+        self._closed = True
+        self._new_event.set()
+
+    async def subscribe(self, last_seq: int = 0) -> AsyncIterator[BackToFrontData]:
+        """订阅事件：先回放序号大于last_seq的缓存事件，再持续接收新事件
+
+        参数:
+            last_seq: 客户端已收到的最后一个事件序号，0表示从头读取
+        """
+        oldest = self._buffer[0].seq if self._buffer else self._seq + 1
+        if last_seq + 1 < oldest:
+            logger.warning(f"请求回放的事件已被淘汰: last_seq={last_seq}, 最早可用序号={oldest}")
+        while True:
+            # 先取得当前的Event再遍历缓冲区，避免遍历期间写入的事件被漏掉
+            waiter = self._new_event
+            for item in self.events_after(last_seq):
+                last_seq = item.seq
+                yield item
+            if self._closed and last_seq >= self._seq:
+                return
+            await waiter.wait()
+
+    def events_after(self, seq: int) -> List[BackToFrontData]:
+        """返回缓冲区中序号大于seq的事件"""
+        return [item for item in list(self._buffer) if item.seq > seq]
+
+    def qsize(self) -> int:
+        return len(self._buffer)
+
+
+@dataclass
+class Job:
+    """一次调研请求对应的任务，持有独立的事件通道和流水线协程"""
+    job_id: str
+    query: str
+    channel: EventChannel
+    status: JobStatus = JobStatus.PENDING
+    task: Optional[asyncio.Task] = None
+    cancellation_token: CancellationToken = field(default_factory=CancellationToken)
+    subscribers: int = 0
+    # 只有通过/api/research以SSE长连接提交的任务在连接断开后取消；异步提交的任务不受订阅者断开影响
+    cancel_on_disconnect: bool = False
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JobStatus.FINISHED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+class JobRegistry:
+    """任务注册表：为每个请求分配job_id和独立事件通道，并管理流水线任务的生命周期"""
+
+    def __init__(self, queue_size: Optional[int] = None, ttl_seconds: Optional[int] = None):
+        self.queue_size = queue_size or config.get_int("job.event-queue-size", 1000)
+        self.ttl_seconds = ttl_seconds or config.get_int("job.ttl-seconds", 3600)
+        self.disconnect_grace_seconds = config.get_float("job.disconnect-grace-seconds", 30)
+        self.coalesce_window_ms = config.get_float("job.coalesce-window-ms", 100)
+        self.coalesce_max_bytes = config.get_int("job.coalesce-max-bytes", 4096)
+        self._jobs: Dict[str, Job] = {}
+
+    def create_job(self, query: str, job_id: Optional[str] = None, cancel_on_disconnect: bool = False) -> Job:
+        """创建新任务，同时清理过期的已结束任务
+
+        参数:
+            query: 用户的调研请求
+            job_id: 指定任务id（如worker进程执行队列中已有的任务），默认自动生成
+            cancel_on_disconnect: 所有SSE订阅者断开且宽限期内未重连时取消任务
+        """
+        self.cleanup()
+        channel = EventChannel(self.queue_size, self.coalesce_window_ms, self.coalesce_max_bytes)
+        job = Job(job_id=job_id or uuid.uuid4().hex, query=query, channel=channel, cancel_on_disconnect=cancel_on_disconnect)
+        self._jobs[job.job_id] = job
+        logger.info(f"创建任务: job_id={job.job_id}, 当前任务数={len(self._jobs)}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def start(self, job: Job, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """在当前事件循环中启动任务对应的流水线协程"""
+        job.status = JobStatus.RUNNING
+        job.task = asyncio.create_task(coro)
+        job.task.add_done_callback(lambda task: self._on_done(job, task))
+        return job.task
+
+    def _on_done(self, job: Job, task: asyncio.Task) -> None:
+        job.finished_at = time.time()
+        if task.cancelled():
+            job.status = JobStatus.CANCELLED
+            job.channel.put_nowait(BackToFrontData(step=ExecutionState.FAILED, state="error", data="任务已取消"))
+            job.channel.put_nowait(BackToFrontData(step=ExecutionState.FINISHED, state="finished", data=None))
+        elif task.exception() is not None:
+            err = task.exception()
+            logger.error(f"任务执行失败: job_id={job.job_id}, error={err}")
+            job.status = JobStatus.FAILED
+            # 流水线异常退出时也要通知前端结束，避免SSE连接一直挂起
+            job.channel.put_nowait(BackToFrontData(step=ExecutionState.FAILED, state="error", data=str(err)))
+            job.channel.put_nowait(BackToFrontData(step=ExecutionState.FINISHED, state="finished", data=None))
+        else:
+            job.status = JobStatus.FINISHED
+        job.channel.close()
+        logger.info(f"任务结束: job_id={job.job_id}, status={job.status.value}")
+
+    def attach(self, job: Job) -> None:
+        """SSE客户端开始订阅任务事件"""
+        job.subscribers += 1
+
+    def detach(self, job: Job) -> None:
+        """SSE客户端断开连接
+
+        只有cancel_on_disconnect的任务会因断开而取消：不立即取消，而是等待一段宽限期，
+        期间客户端携带Last-Event-ID重连即可继续接收事件，超过宽限期仍无订阅者时才取消流水线，释放模型调用。
+        异步提交的任务只是少了一个观察者，继续运行。
+        """
+        job.subscribers = max(0, job.subscribers - 1)
+        if job.done or job.subscribers > 0 or not job.cancel_on_disconnect:
+            return
+
+        def cancel_if_abandoned():
+            if job.subscribers == 0 and not job.done:
+                logger.info(f"SSE客户端断开且未重连，取消任务: job_id={job.job_id}")
+                self.cancel(job.job_id)
+
+        if self.disconnect_grace_seconds <= 0:
+            cancel_if_abandoned()
+        else:
+            asyncio.get_running_loop().call_later(self.disconnect_grace_seconds, cancel_if_abandoned)
+
+    def cancel(self, job_id: str) -> bool:
+        """取消任务：先取消所有进行中的模型调用，再取消流水线协程
+
+        返回:
+            任务存在且仍在运行时返回True
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        logger.info(f"取消任务: job_id={job_id}")
+        job.cancellation_token.cancel()
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+        return True
+
+    def active_jobs(self) -> List[Job]:
+        """返回尚未结束的任务"""
+        return [job for job in self._jobs.values() if not job.done]
+
+    def remove(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+
+    def cleanup(self) -> None:
+        """移除已结束且超过保留时间的任务"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and job.finished_at and now - job.finished_at > self.ttl_seconds
+        ]
+        for job_id in expired:
+            self.remove(job_id)
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+
+# 创建全局任务注册表
+job_registry = JobRegistry()
@@ -0,0 +1,120 @@
+import asyncio
+import bisect
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Coroutine, List, Optional
+
+from src.core.config import config
+from src.core.state_models import BackToFrontData, ExecutionState
+from src.services.job_registry import Job
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class QueueFullError(Exception):
+    """等待队列已满，拒绝新的调研任务"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"等待队列已满，请在{retry_after}秒后重试")
+        self.retry_after = retry_after
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    order: int
+    job: Job = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class JobScheduler:
+    """调研任务调度器
+
+    限制同时运行的流水线数量，超出的任务按优先级（数值越小越优先，同优先级先进先出）排队等待，
+    排队期间通过任务事件通道向前端推送当前排队位置；等待队列也满时拒绝新任务。
+    """
+
+    def __init__(self,
+                 max_concurrent: Optional[int] = None,
+                 max_queue_size: Optional[int] = None,
+                 retry_after_seconds: Optional[int] = None):
+        self.max_concurrent = max_concurrent or config.get_int("scheduler.max-concurrent-jobs", 2)
+        self.max_queue_size = max_queue_size if max_queue_size is not None else config.get_int("scheduler.max-queue-size", 20)
+        self.retry_after_seconds = retry_after_seconds or config.get_int("scheduler.retry-after-seconds", 60)
+        self._running = 0
+        self._waiting: List[_Waiter] = []
+        self._order = itertools.count()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def check_admission(self) -> None:
+        """准入检查，运行槽位和等待队列都已满时抛出QueueFullError"""
+        if self._running >= self.max_concurrent and len(self._waiting) >= self.max_queue_size:
+            raise QueueFullError(self.retry_after_seconds)
+
+    async def run(self, job: Job, coro: Coroutine[Any, Any, Any], priority: int = 0) -> Any:
+        """等待获得运行槽位后执行流水线协程"""
+        try:
+            await self._acquire(job, priority)
+        except BaseException:
+            # 排队期间被取消，流水线协程从未开始执行
+            coro.close()
+            raise
+        try:
+            return await coro
+        finally:
+            self._release()
+
+    async def _acquire(self, job: Job, priority: int) -> None:
+        if self._running < self.max_concurrent and not self._waiting:
+            self._running += 1
+            return
+
+        waiter = _Waiter(priority, next(self._order), job, asyncio.get_running_loop().create_future())
+        bisect.insort(self._waiting, waiter)
+        logger.info(f"任务进入等待队列: job_id={job.job_id}, 排队任务数={len(self._waiting)}")
+        self._notify_positions()
+        try:
+            await waiter.future
+        except BaseException:
+            if waiter in self._waiting:
+                self._waiting.remove(waiter)
+                self._notify_positions()
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # 槽位已经分配给该任务但任务随即被取消，归还槽位
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self._running -= 1
+        admitted = False
+        while self._waiting and self._running < self.max_concurrent:
+            waiter = self._waiting.pop(0)
+            if waiter.future.done():
+                continue
+            self._running += 1
+            waiter.future.set_result(None)
+            admitted = True
+        if admitted:
+            self._notify_positions()
+
+    def _notify_positions(self) -> None:
+        """向所有排队中的任务推送最新排队位置"""
+        total = len(self._waiting)
+        for position, waiter in enumerate(self._waiting, start=1):
+            waiter.job.channel.put_nowait(BackToFrontData(
+                step=ExecutionState.QUEUED,
+                state="waiting",
+                data={"position": position, "queue_length": total},
+            ))
+
+
+# 创建全局任务调度器
+job_scheduler = JobScheduler()
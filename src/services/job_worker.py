@@ -0,0 +1,226 @@
+import asyncio
+import os
+import socket
+from typing import Any, Dict, Optional
+
+from src.core.config import config
+from src.core.state_models import BackToFrontData, ExecutionState, PaperAgentState
+from src.services.job_queue import SqliteJobQueue
+from src.services.job_registry import Job, JobRegistry, JobStatus
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# worker进程中任务的最终状态与队列中记录的状态一一对应
+TERMINAL_STATUSES = (JobStatus.FINISHED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value)
+
+
+def get_worker_mode() -> str:
+    """inline: 在API进程内执行流水线；process: API只负责入队，由独立的worker进程执行"""
+    return config.get("worker.mode", "inline")
+
+
+def save_result(queue: SqliteJobQueue, job: Job, final_state: Optional[PaperAgentState], error: Optional[str] = None) -> None:
+    """把任务最终状态和报告写入持久化存储"""
+    if job.status == JobStatus.CANCELLED:
+        status = JobStatus.CANCELLED.value
+    elif error is not None:
+        status = JobStatus.FAILED.value
+    else:
+        error = final_state.error.first_error() if final_state and final_state.error else None
+        status = JobStatus.FAILED.value if error else JobStatus.FINISHED.value
+    current_step = job.channel.last_event.step if job.channel.last_event else None
+    if final_state is not None and final_state.current_step is not None:
+        current_step = final_state.current_step.value
+    queue.finish(
+        job.job_id,
+        status,
+        error=error,
+        report_markdown=final_state.report_markdown if final_state else None,
+        current_step=current_step,
+        budget_usage=final_state.budget_usage if final_state else None,
+    )
+
+
+async def run_inline_job(queue: SqliteJobQueue,
+                         job: Job,
+                         priority: int = 0,
+                         review_policy: Optional[str] = None,
+                         budget: Optional[Dict[str, Any]] = None) -> Optional[PaperAgentState]:
+    """在API进程内经调度器执行任务，并持久化执行结果；任务需已以running状态登记到queue中"""
+    from src.agents.orchestrator import PaperAgentOrchestrator
+    from src.services.job_scheduler import job_scheduler
+
+    orchestrator = PaperAgentOrchestrator(state_queue=job.channel, cancellation_token=job.cancellation_token)
+    final_state, error = None, None
+    try:
+        final_state = await job_scheduler.run(
+            job,
+            orchestrator.run(user_request=job.query, job_id=job.job_id, review_policy=review_policy, budget=budget),
+            priority,
+        )
+        return final_state
+    except asyncio.CancelledError:
+        error = "任务已取消"
+        job.status = JobStatus.CANCELLED
+        raise
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        # 取消时不能再等待其他协程，直接同步写入
+        save_result(queue, job, final_state, error)
+
+
+async def forward_events(queue: SqliteJobQueue, job: Job, poll_interval: float) -> None:
+    """worker侧：把任务事件通道中的事件批量写入SQLite，直到通道关闭"""
+    last_seq = 0
+    while True:
+        closed = job.channel.closed
+        events = job.channel.events_after(last_seq)
+        if events:
+            await asyncio.to_thread(queue.append_events, job.job_id, events)
+            last_seq = events[-1].seq
+        if closed:
+            return
+        await asyncio.sleep(poll_interval)
+
+
+async def watch_job_requests(queue: SqliteJobQueue, registry: JobRegistry, job: Job, poll_interval: float) -> None:
+    """worker侧：轮询API进程写入的取消请求和人工审核结果"""
+    from src.agents.userproxy_agent import review_registry
+
+    while not job.done:
+        if await asyncio.to_thread(queue.is_cancel_requested, job.job_id):
+            registry.cancel(job.job_id)
+            return
+        # 只在任务确实等待审核时读取，避免审核结果被提前取走而丢失
+        if review_registry.is_waiting(job.job_id):
+            user_input = await asyncio.to_thread(queue.take_review_input, job.job_id)
+            if user_input is not None:
+                review_registry.submit(job.job_id, user_input)
+        await asyncio.sleep(poll_interval)
+
+
+async def keep_lease(queue: SqliteJobQueue, registry: JobRegistry, job: Job, worker_id: str, lease_lost: asyncio.Event) -> None:
+    """worker侧：任务执行期间定期续租；租约已被回收（如心跳因长时间阻塞而中断）时取消本地执行，由接手的worker继续"""
+    lease_seconds = config.get_float("worker.lease-seconds", 60)
+    if not lease_seconds:
+        return
+    while not job.done:
+        await asyncio.sleep(lease_seconds / 3)
+        if not await asyncio.to_thread(queue.heartbeat, job.job_id, worker_id):
+            if job.done:
+                return
+            logger.warning(f"任务租约已被回收，停止执行: job_id={job.job_id}, worker_id={worker_id}")
+            lease_lost.set()
+            registry.cancel(job.job_id)
+            return
+
+
+async def execute_job(queue: SqliteJobQueue,
+                      registry: JobRegistry,
+                      row: Dict[str, Any],
+                      poll_interval: float,
+                      worker_id: Optional[str] = None) -> None:
+    """在worker进程中执行一个已领取的任务，worker_id为领取任务的worker，用于续租"""
+    from src.agents.orchestrator import PaperAgentOrchestrator
+
+    job = registry.create_job(row["query"], job_id=row["job_id"])
+    orchestrator = PaperAgentOrchestrator(state_queue=job.channel, cancellation_token=job.cancellation_token)
+    registry.start(job, orchestrator.run(
+        user_request=row["query"],
+        job_id=job.job_id,
+        review_policy=row.get("review_policy"),
+        budget=row.get("budget"),
+    ))
+    forwarder = asyncio.create_task(forward_events(queue, job, poll_interval))
+    watcher = asyncio.create_task(watch_job_requests(queue, registry, job, poll_interval))
+    lease_lost = asyncio.Event()
+    lease = asyncio.create_task(keep_lease(queue, registry, job, worker_id, lease_lost)) if worker_id else None
+    final_state, error = None, None
+    try:
+        final_state = await job.task
+    except asyncio.CancelledError:
+        error = "任务已取消"
+    except Exception as e:
+        error = str(e)
+    finally:
+        watcher.cancel()
+        if lease is not None:
+            lease.cancel()
+        if lease_lost.is_set():
+            # 任务已交给其他worker重新执行，不再写入事件和结果，避免覆盖新一次执行的记录
+            forwarder.cancel()
+        else:
+            await forwarder
+            await asyncio.to_thread(save_result, queue, job, final_state, error)
+        registry.remove(job.job_id)
+
+
+async def run_worker(worker_id: Optional[str] = None, poll_interval: Optional[float] = None) -> None:
+    """worker主循环：不断领取并执行队列中的任务，每个worker同一时间只执行一个任务"""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    poll_interval = poll_interval or config.get_float("worker.poll-interval", 0.5)
+    queue = SqliteJobQueue()
+    registry = JobRegistry()
+    logger.info(f"worker启动: worker_id={worker_id}, db={queue.db_path}")
+    while True:
+        row = await asyncio.to_thread(queue.claim, worker_id)
+        if row is None:
+            await asyncio.sleep(poll_interval)
+            continue
+        logger.info(f"worker领取任务: worker_id={worker_id}, job_id={row['job_id']}")
+        await execute_job(queue, registry, row, poll_interval, worker_id)
+
+
+def run_worker_process(index: int = 0) -> None:
+    """worker子进程入口"""
+    asyncio.run(run_worker(f"{socket.gethostname()}-{os.getpid()}-{index}"))
+
+
+async def relay_job_events(queue: SqliteJobQueue, job: Job, poll_interval: Optional[float] = None) -> None:
+    """API侧：把worker写入SQLite的事件转发到本进程的任务事件通道，供SSE推送
+
+    任务仍在排队时推送排队位置。任务被取消（主动终止，或/api/research的连接断开后未重连）时
+    JobRegistry.cancel先取消CancellationToken再取消转发协程，此时向worker发出取消请求；
+    其他原因（如API进程关闭）结束转发时worker上的任务继续执行。
+    """
+    poll_interval = poll_interval or config.get_float("worker.poll-interval", 0.5)
+    last_seq = 0
+    last_position = None
+    try:
+        while True:
+            events = await asyncio.to_thread(queue.fetch_events, job.job_id, last_seq)
+            for event in events:
+                last_seq = event.seq
+                # 序号由本进程的事件通道重新分配
+                await job.channel.put(BackToFrontData(step=event.step, state=event.state, data=event.data))
+                if event.step == ExecutionState.FINISHED:
+                    return
+            if events:
+                continue
+
+            row = await asyncio.to_thread(queue.get, job.job_id)
+            if row is None or row["status"] in TERMINAL_STATUSES:
+                # 状态更新与最后一批事件写入之间可能有时间差，结束前再确认一次没有遗漏的事件
+                if await asyncio.to_thread(queue.fetch_events, job.job_id, last_seq, 1):
+                    continue
+                if row is not None and row["status"] != JobStatus.FINISHED.value:
+                    raise RuntimeError(row["error"] or f"任务执行失败: {row['status']}")
+                return
+            if row["status"] == "pending":
+                position = await asyncio.to_thread(queue.position, job.job_id)
+                if position and position != last_position:
+                    last_position = position
+                    await job.channel.put(BackToFrontData(
+                        step=ExecutionState.QUEUED,
+                        state="waiting",
+                        data={"position": position, "queue_length": await asyncio.to_thread(queue.count_pending)},
+                    ))
+            await asyncio.sleep(poll_interval)
+    except asyncio.CancelledError:
+        if job.cancellation_token.is_cancelled():
+            # 取消请求写入SQLite可能等待其他连接的写锁，不能阻塞事件循环
+            await asyncio.to_thread(queue.request_cancel, job.job_id)
+        raise
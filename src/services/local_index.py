@@ -0,0 +1,347 @@
+import gzip
+import json
+import re
+import sqlite3
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from src.core.config import config
+from src.tasks.deduplicator import arxiv_version, base_arxiv_id
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent.parent / "data" / "arxiv_index.db"
+
+# 每批写入的论文数，导入数百万条的元数据快照时分批提交
+_INGEST_BATCH = 5000
+
+# bm25各列权重：标题 > 摘要 > 作者
+_BM25_WEIGHTS = (10.0, 1.0, 0.5)
+
+_ORDER_COLUMNS = {
+    "relevance": "score",
+    "submittedDate": "p.published_date",
+    "lastUpdatedDate": "p.updated_date",
+}
+
+
+class LocalIndexError(Exception):
+    """本地索引不可用，如SQLite未编译FTS5或索引数据库不存在"""
+
+
+def _tag(element: ET.Element) -> str:
+    """去掉XML命名空间后的标签名"""
+    return element.tag.rsplit("}", 1)[-1]
+
+
+def _child_text(element: ET.Element, name: str) -> Optional[str]:
+    for child in element:
+        if _tag(child) == name:
+            return " ".join((child.text or "").split()) or None
+    return None
+
+
+def _to_iso(value: Optional[str]) -> Optional[str]:
+    """把快照中的日期（YYYY-MM-DD 或 RFC 2822）转换为与arXiv API结果一致的ISO格式"""
+    if not value:
+        return None
+    try:
+        if re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+            parsed = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        else:
+            parsed = parsedate_to_datetime(value)
+        return parsed.astimezone(timezone.utc).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_jsonl_record(record: Dict[str, Any]) -> Optional[dict]:
+    """解析arXiv元数据JSONL快照（如Kaggle的arxiv-metadata-oai-snapshot.json）中的一条记录"""
+    arxiv_id = record.get("id")
+    if not arxiv_id or not record.get("title"):
+        return None
+    versions = record.get("versions") or []
+    if record.get("authors_parsed"):
+        authors = [" ".join(part for part in (forenames, keyname) if part) for keyname, forenames, *_ in record["authors_parsed"]]
+    else:
+        authors = [name.strip() for name in re.split(r",| and ", record.get("authors") or "") if name.strip()]
+    categories = (record.get("categories") or "").split()
+    return {
+        "paper_id": f"{arxiv_id}{versions[-1]['version']}" if versions else arxiv_id,
+        "title": " ".join(record["title"].split()),
+        "authors": authors,
+        "summary": " ".join((record.get("abstract") or "").split()),
+        "published_date": _to_iso(versions[0].get("created")) if versions else _to_iso(record.get("update_date")),
+        "updated_date": _to_iso(versions[-1].get("created")) if versions else _to_iso(record.get("update_date")),
+        "primary_category": categories[0] if categories else None,
+        "categories": categories,
+        "doi": record.get("doi"),
+    }
+
+
+def parse_oai_record(metadata: ET.Element) -> Optional[dict]:
+    """解析OAI-PMH arXiv格式（metadataPrefix=arXiv）中的一条 <arXiv> 元数据"""
+    arxiv_id = _child_text(metadata, "id")
+    title = _child_text(metadata, "title")
+    if not arxiv_id or not title:
+        return None
+    authors = []
+    for element in metadata.iter():
+        if _tag(element) == "author":
+            name = " ".join(part for part in (_child_text(element, "forenames"), _child_text(element, "keyname")) if part)
+            if name:
+                authors.append(name)
+    categories = (_child_text(metadata, "categories") or "").split()
+    created = _child_text(metadata, "created")
+    return {
+        "paper_id": arxiv_id,
+        "title": title,
+        "authors": authors,
+        "summary": _child_text(metadata, "abstract") or "",
+        "published_date": _to_iso(created),
+        "updated_date": _to_iso(_child_text(metadata, "updated") or created),
+        "primary_category": categories[0] if categories else None,
+        "categories": categories,
+        "doi": _child_text(metadata, "doi"),
+    }
+
+
+def _open_dump(path: Path) -> IO[bytes]:
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def iter_dump(path: Union[str, Path]) -> Iterator[dict]:
+    """逐条读取元数据快照，按扩展名识别格式：.xml为OAI-PMH响应，其余按JSONL处理，可以是.gz压缩文件"""
+    path = Path(path)
+    suffixes = [suffix for suffix in path.suffixes if suffix != ".gz"]
+    with _open_dump(path) as f:
+        if suffixes and suffixes[-1] == ".xml":
+            for _, element in ET.iterparse(f):
+                if _tag(element) == "arXiv":
+                    paper = parse_oai_record(element)
+                    element.clear()
+                    if paper:
+                        yield paper
+            return
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                paper = parse_jsonl_record(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"跳过无法解析的记录: {path}:{line_no}, {e}")
+                continue
+            if paper:
+                yield paper
+
+
+def _match_expression(querys: Iterable[str]) -> str:
+    """与PaperSearcher._build_query相同的语义：每个关键词作为短语，关键词之间为OR"""
+    phrases = []
+    for query in querys:
+        query = " ".join((query or "").split())
+        if query:
+            phrases.append('"' + query.replace('"', '""') + '"')
+    return " OR ".join(phrases)
+
+
+class LocalArxivIndex:
+    """基于SQLite FTS5的本地arXiv元数据索引
+
+    从arXiv元数据快照（OAI-PMH XML或JSONL）导入论文，标题、摘要和作者建立全文索引，按BM25排序，
+    支持与search_papers相同的关键词（OR关系）和提交日期过滤，以及按分类过滤。
+    检索不访问网络、不受arXiv请求频率限制，结果完全由索引内容决定，适合离线运行、基准测试和单元测试。
+    所有方法都是同步的，异步代码中应通过asyncio.to_thread调用。
+    """
+
+    def __init__(self, db_path: Optional[Union[str, Path]] = None):
+        db_path = db_path or config.get("local-index.db-path") or DEFAULT_DB_PATH
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS papers (
+                    id INTEGER PRIMARY KEY,
+                    base_id TEXT NOT NULL UNIQUE,
+                    paper_id TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    authors TEXT,
+                    summary TEXT,
+                    primary_category TEXT,
+                    categories TEXT,
+                    published_date TEXT,
+                    updated_date TEXT,
+                    doi TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_papers_published ON papers (published_date)")
+            try:
+                # 全文索引的rowid即papers表的id（显式的INTEGER PRIMARY KEY，VACUUM后不会变化）
+                conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                        title, summary, authors, tokenize = 'porter unicode61 remove_diacritics 2'
+                    )
+                """)
+            except sqlite3.OperationalError as e:
+                raise LocalIndexError(f"当前SQLite不支持FTS5，无法使用本地索引: {e}") from e
+
+    def add_papers(self, papers: Iterable[dict]) -> int:
+        """写入或更新论文，同一篇论文只保留最新版本，返回写入的条数"""
+        written = 0
+        with self._connection() as conn:
+            batch: List[dict] = []
+            for paper in papers:
+                batch.append(paper)
+                if len(batch) >= _INGEST_BATCH:
+                    written += self._write_batch(conn, batch)
+                    batch = []
+            if batch:
+                written += self._write_batch(conn, batch)
+        return written
+
+    def _write_batch(self, conn: sqlite3.Connection, papers: List[dict]) -> int:
+        written = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for paper in papers:
+                base_id = base_arxiv_id(paper["paper_id"])
+                row = conn.execute("SELECT id, paper_id FROM papers WHERE base_id = ?", (base_id,)).fetchone()
+                if row is not None and arxiv_version(row["paper_id"]) > arxiv_version(paper["paper_id"]):
+                    continue
+                authors = paper.get("authors") or []
+                values = (
+                    paper["paper_id"], paper["title"], json.dumps(authors, ensure_ascii=False), paper.get("summary"),
+                    paper.get("primary_category"), " ".join(paper.get("categories") or []),
+                    paper.get("published_date"), paper.get("updated_date"), paper.get("doi"),
+                )
+                if row is None:
+                    rowid = conn.execute(
+                        "INSERT INTO papers (paper_id, title, authors, summary, primary_category, categories, "
+                        "published_date, updated_date, doi, base_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (*values, base_id),
+                    ).lastrowid
+                else:
+                    rowid = row["id"]
+                    conn.execute(
+                        "UPDATE papers SET paper_id = ?, title = ?, authors = ?, summary = ?, primary_category = ?, "
+                        "categories = ?, published_date = ?, updated_date = ?, doi = ? WHERE id = ?",
+                        (*values, rowid),
+                    )
+                    conn.execute("DELETE FROM papers_fts WHERE rowid = ?", (rowid,))
+                conn.execute(
+                    "INSERT INTO papers_fts (rowid, title, summary, authors) VALUES (?, ?, ?, ?)",
+                    (rowid, paper["title"], paper.get("summary") or "", " ".join(authors)),
+                )
+                written += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return written
+
+    def ingest(self, path: Union[str, Path]) -> int:
+        """导入元数据快照文件，返回写入的论文数"""
+        logger.info(f"开始导入arXiv元数据: {path}")
+        written = self.add_papers(iter_dump(path))
+        with self._connection() as conn:
+            conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('optimize')")
+        logger.info(f"arXiv元数据导入完成: 写入 {written} 篇，索引共 {self.count()} 篇")
+        return written
+
+    def count(self) -> int:
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def search(self,
+               querys: Sequence[str],
+               max_results: int = 50,
+               sort_by: str = "relevance",
+               descending: bool = True,
+               start_date: Optional[str] = None,
+               end_date: Optional[str] = None,
+               categories: Optional[Sequence[str]] = None) -> List[dict]:
+        """
+        检索本地索引
+
+        参数:
+            querys: 关键词，每个关键词作为短语匹配标题、摘要或作者，关键词之间为OR关系
+            sort_by: relevance（BM25）、submittedDate 或 lastUpdatedDate，与arxiv.SortCriterion的取值一致
+            descending: 是否降序；按相关性排序时降序为最相关的在前
+            start_date / end_date: 提交日期范围，格式为PaperSearcher._format_date返回的YYYYMMDDhhmm，包含两端
+            categories: 只返回属于这些分类之一的论文，如 ["cs.CL", "cs.AI"]
+
+        返回:
+            与PaperSearcher检索结果结构相同的论文列表
+        """
+        expression = _match_expression(querys)
+        if not expression or max_results <= 0:
+            return []
+        # bm25越小越相关，"降序"对应bm25升序
+        rank = f"bm25(papers_fts, {', '.join(map(str, _BM25_WEIGHTS))})"
+        column = _ORDER_COLUMNS.get(sort_by, "score")
+        ascending = (column == "score") == descending
+        sql = [f"SELECT p.*, {rank} AS score FROM papers_fts JOIN papers p ON p.id = papers_fts.rowid WHERE papers_fts MATCH ?"]
+        params: List[Any] = [expression]
+        if start_date:
+            sql.append("AND substr(p.published_date, 1, 16) >= ?")
+            params.append(self._iso_minute(start_date))
+        if end_date:
+            sql.append("AND substr(p.published_date, 1, 16) <= ?")
+            params.append(self._iso_minute(end_date))
+        if categories:
+            sql.append("AND (" + " OR ".join("(' ' || p.categories || ' ') LIKE ?" for _ in categories) + ")")
+            params.extend(f"% {category} %" for category in categories)
+        sql.append(f"ORDER BY {column} {'ASC' if ascending else 'DESC'} LIMIT ?")
+        params.append(max_results)
+        with self._connection() as conn:
+            rows = conn.execute(" ".join(sql), params).fetchall()
+        return [self._row_to_paper(row) for row in rows]
+
+    @staticmethod
+    def _iso_minute(value: str) -> str:
+        """YYYYMMDDhhmm -> YYYY-MM-DDThh:mm，可直接与ISO格式的日期按字符串比较"""
+        return f"{value[0:4]}-{value[4:6]}-{value[6:8]}T{value[8:10]}:{value[10:12]}"
+
+    @staticmethod
+    def _row_to_paper(row: sqlite3.Row) -> dict:
+        paper_id = row["paper_id"]
+        published_date = row["published_date"]
+        return {
+            "paper_id": paper_id,
+            "title": row["title"],
+            "authors": json.loads(row["authors"] or "[]"),
+            "summary": row["summary"],
+            "published": int(published_date[:4]) if published_date else None,
+            "published_date": published_date,
+            "updated_date": row["updated_date"],
+            "url": f"http://arxiv.org/abs/{paper_id}",
+            "pdf_url": f"http://arxiv.org/pdf/{paper_id}",
+            "primary_category": row["primary_category"],
+            "categories": (row["categories"] or "").split(),
+            "doi": row["doi"],
+        }
+
+
+@lru_cache(maxsize=None)
+def get_local_index() -> LocalArxivIndex:
+    """首次使用时才打开本地索引"""
+    return LocalArxivIndex()
@@ -0,0 +1,173 @@
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from src.core.config import config
+from src.tasks.deduplicator import arxiv_version, base_arxiv_id
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent.parent / "data" / "papers.db"
+
+# SQLite单条语句的参数个数有上限（旧版本为999），批量查询时分块
+_LOOKUP_CHUNK = 500
+
+_COLUMNS = (
+    "base_id", "paper_id", "version", "title", "authors", "summary", "primary_category", "categories",
+    "published_date", "updated_date", "doi", "url", "pdf_url", "fetched_at",
+)
+
+
+class PaperStore:
+    """以arXiv基础id为键的本地论文元数据库
+
+    保存检索到的论文的标题、作者、摘要、分类、日期、DOI和版本，按id获取论文时先批量查询本地，只向arXiv请求本地没有的论文。
+    同一篇论文只保存最新版本，旧版本的结果不会覆盖新版本。所有方法都是同步的短事务，异步代码中应通过asyncio.to_thread调用。
+    """
+
+    def __init__(self, db_path: Optional[Union[str, Path]] = None, enabled: Optional[bool] = None):
+        db_path = db_path or config.get("paper-store.db-path") or DEFAULT_DB_PATH
+        self.db_path = Path(db_path)
+        self.enabled = config.get_bool("paper-store.enabled", True) if enabled is None else enabled
+        if self.enabled:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._init_db()
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS papers (
+                    base_id TEXT PRIMARY KEY,
+                    paper_id TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    title TEXT,
+                    authors TEXT,
+                    summary TEXT,
+                    primary_category TEXT,
+                    categories TEXT,
+                    published_date TEXT,
+                    updated_date TEXT,
+                    doi TEXT,
+                    url TEXT,
+                    pdf_url TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+
+    def get_many(self, paper_ids: Iterable[str], max_age: Optional[float] = None) -> Dict[str, dict]:
+        """批量查询论文元数据，每批id只执行一条查询
+
+        参数:
+            paper_ids: arXiv id，带不带版本后缀均可
+            max_age: 最长有效时间（秒），超过的记录视为不存在；None表示不过期
+
+        返回:
+            {基础id: 论文信息}，只包含本地已有且未过期的论文
+        """
+        if not self.enabled:
+            return {}
+        base_ids = list(dict.fromkeys(base_arxiv_id(paper_id) for paper_id in paper_ids if paper_id))
+        min_fetched_at = time.time() - max_age if max_age is not None else float("-inf")
+        found: Dict[str, dict] = {}
+        with self._connection() as conn:
+            for i in range(0, len(base_ids), _LOOKUP_CHUNK):
+                chunk = base_ids[i:i + _LOOKUP_CHUNK]
+                rows = conn.execute(
+                    f"SELECT * FROM papers WHERE base_id IN ({','.join('?' * len(chunk))}) AND fetched_at >= ?",
+                    (*chunk, min_fetched_at),
+                ).fetchall()
+                for row in rows:
+                    found[row["base_id"]] = self._row_to_paper(row)
+        return found
+
+    def get(self, paper_id: str, max_age: Optional[float] = None) -> Optional[dict]:
+        return self.get_many([paper_id], max_age).get(base_arxiv_id(paper_id))
+
+    def upsert_many(self, papers: List[dict]) -> int:
+        """写入或刷新论文元数据，已有更新版本的论文不会被旧版本覆盖，返回写入的条数"""
+        if not self.enabled or not papers:
+            return 0
+        now = time.time()
+        rows = [self._paper_to_row(paper, now) for paper in papers if paper.get("paper_id")]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in _COLUMNS[1:])
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = conn.total_changes
+                conn.executemany(
+                    f"INSERT INTO papers ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))}) "
+                    f"ON CONFLICT(base_id) DO UPDATE SET {updates} WHERE excluded.version >= papers.version",
+                    rows,
+                )
+                written = conn.total_changes - before
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return written
+
+    def count(self) -> int:
+        if not self.enabled:
+            return 0
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    @staticmethod
+    def _paper_to_row(paper: dict, fetched_at: float) -> tuple:
+        paper_id = paper["paper_id"]
+        return (
+            base_arxiv_id(paper_id),
+            paper_id,
+            arxiv_version(paper_id),
+            paper.get("title"),
+            json.dumps(paper.get("authors") or [], ensure_ascii=False),
+            paper.get("summary"),
+            paper.get("primary_category"),
+            json.dumps(paper.get("categories") or [], ensure_ascii=False),
+            paper.get("published_date"),
+            paper.get("updated_date"),
+            paper.get("doi"),
+            paper.get("url"),
+            paper.get("pdf_url"),
+            fetched_at,
+        )
+
+    @staticmethod
+    def _row_to_paper(row: sqlite3.Row) -> dict:
+        """还原为与PaperSearcher检索结果相同结构的字典"""
+        published_date = row["published_date"]
+        return {
+            "paper_id": row["paper_id"],
+            "title": row["title"],
+            "authors": json.loads(row["authors"] or "[]"),
+            "summary": row["summary"],
+            "published": int(published_date[:4]) if published_date else None,
+            "published_date": published_date,
+            "updated_date": row["updated_date"],
+            "url": row["url"],
+            "pdf_url": row["pdf_url"],
+            "primary_category": row["primary_category"],
+            "categories": json.loads(row["categories"] or "[]"),
+            "doi": row["doi"],
+        }
+
+
+@lru_cache(maxsize=None)
+def get_paper_store() -> PaperStore:
+    """首次使用时才创建全局论文元数据库"""
+    return PaperStore()
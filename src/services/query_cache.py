@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from src.core.config import config
+from src.utils.log_utils import setup_logger
+from src.utils.metrics import SEARCH_CACHE_REQUESTS
+
+logger = setup_logger(__name__)
+
+
+class QueryCache:
+    """检索结果阶段缓存的进程内热层：LRU淘汰，超过有效期的条目视为未命中
+
+    与阶段缓存使用同一个缓存键（见search_agent.search_results_key）和同一个有效期(stage-cache.search-ttl-seconds)，
+    只保存本进程新检索到的结果，因此条目不会比对应的阶段缓存活得更久。人工审核经常多次通过同一组检索条件，
+    命中时省去SQLite读取和反序列化，阶段缓存则负责跨进程、跨重启复用。
+    读写在事件循环和线程池中都可能发生，内部加锁。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None, enabled: Optional[bool] = None):
+        self.max_entries = max_entries or config.get_int("search-cache.max-entries", 256)
+        self.ttl_seconds = config.get_float("stage-cache.search-ttl-seconds", 86400) if ttl_seconds is None else ttl_seconds
+        self.enabled = config.get_bool("search-cache.enabled", True) if enabled is None else enabled
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize_querys(querys: Iterable[str]) -> Tuple[str, ...]:
+        """规范化检索关键词：去空白、小写、去重后排序，只是大小写或顺序不同的检索条件得到相同的缓存键"""
+        return tuple(sorted({query.strip().lower() for query in querys or [] if query and query.strip()}))
+
+    def get(self, key: Hashable) -> Optional[List[dict]]:
+        """返回缓存的论文列表（副本），未命中或已过期时返回None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                SEARCH_CACHE_REQUESTS.labels("miss").inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        SEARCH_CACHE_REQUESTS.labels("hit").inc()
+        # 返回副本，调用方修改论文信息不会影响缓存
+        return [dict(paper) for paper in entry[1]]
+
+    def put(self, key: Hashable, papers: List[dict]) -> None:
+        if not self.enabled or not papers:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), [dict(paper) for paper in papers])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """命中、未命中、淘汰和过期次数，以及当前条目数和命中率"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+@lru_cache(maxsize=None)
+def get_query_cache() -> QueryCache:
+    """首次使用时才创建全局检索结果缓存"""
+    return QueryCache()
@@ -1,18 +1,19 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from src.services.chroma_client import ChromaClient
 
-def retrieval_tool(querys: List[str], n_results: int = 5) -> List[List[Dict[str, Any]]]:
+def retrieval_tool(querys: List[str], n_results: int = 5, corpus_id: Optional[str] = None) -> List[List[Dict[str, Any]]]:
     """
     检索工具，从向量数据库中查询相关文档
     
     :param query: 查询文本
     :param n_results: 返回结果数量
+    :param corpus_id: 只检索该范围内（即当前任务阅读过）的论文，None表示不限制
     :return: 包含文档metadata的列表
     """
     # 初始化Chroma客户端
     client = ChromaClient()
     # 执行查询
-    query_results = client.query(query_texts=querys, n_results=n_results)
+    query_results = client.query(query_texts=querys, n_results=n_results, where={"corpus_id": corpus_id} if corpus_id else None)
     print(query_results)
     # 提取metadata列表
     if query_results and 'metadatas' in query_results:
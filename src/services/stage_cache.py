@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import json
+import pickle
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Sequence, Union
+
+from pydantic import BaseModel
+
+from src.core.config import config
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent.parent / "data" / "stage_cache.db"
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    return str(obj)
+
+
+class StageCache:
+    """按内容寻址的流水线阶段输出缓存
+
+    缓存键是阶段名、阶段输入、提示词和模型名共同的哈希，相同输入的阶段直接复用上次的输出。
+    只修改某个阶段的提示词或模型时，只有该阶段及其下游的缓存键会变化，上游阶段仍然命中缓存。
+    输出用pickle保存在SQLite中，get/put是同步的短事务，流水线节点中应使用在线程池中执行的aget/aput，
+    避免读写数据库和序列化阻塞同时服务SSE和其他任务的事件循环。
+    每次写入后删除已过有效期的条目（目前只有检索结果有有效期），并在条目数或总大小超过上限时淘汰最早写入的条目。
+    """
+
+    def __init__(self,
+                 db_path: Optional[Union[str, Path]] = None,
+                 enabled: Optional[bool] = None,
+                 max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 stage_ttls: Optional[Dict[str, float]] = None):
+        db_path = db_path or config.get("stage-cache.db-path") or DEFAULT_DB_PATH
+        self.db_path = Path(db_path)
+        self.enabled = config.get_bool("stage-cache.enabled", True) if enabled is None else enabled
+        # 上限为0表示不限制
+        self.max_entries = config.get_int("stage-cache.max-entries", 10000) if max_entries is None else max_entries
+        self.max_bytes = config.get_int("stage-cache.max-bytes", 1073741824) if max_bytes is None else max_bytes
+        # 各阶段输出的有效期（秒），过期后在写入时删除
+        self.stage_ttls = {"search": config.get_float("stage-cache.search-ttl-seconds", 86400)} if stage_ttls is None else stage_ttls
+        if self.enabled:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._init_db()
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stage_outputs (
+                    cache_key TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(stage_outputs)")}
+            if "size" not in columns:
+                # 旧版本创建的缓存库没有size列
+                conn.execute("ALTER TABLE stage_outputs ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE stage_outputs SET size = length(value)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_stage_outputs_created ON stage_outputs (created_at)")
+
+    @staticmethod
+    def make_key(stage: str, inputs: Any, prompts: Sequence[str] = (), models: Sequence[str] = ()) -> str:
+        """计算阶段输出的缓存键
+
+        参数:
+            stage: 阶段名，不同阶段的相同输入互不影响
+            inputs: 阶段输入，pydantic模型会先转为字典
+            prompts: 阶段使用的提示词，提示词改动后缓存自动失效
+            models: 阶段使用的模型名
+        """
+        payload = json.dumps(
+            {"stage": stage, "inputs": inputs, "prompts": list(prompts), "models": list(models)},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=_json_default,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        """读取缓存的阶段输出，未命中、已过期或未启用缓存时返回None
+
+        参数:
+            max_age: 最长有效时间（秒），None表示不过期
+        """
+        if not self.enabled:
+            return None
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM stage_outputs WHERE cache_key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if max_age is not None and time.time() - created_at > max_age:
+            return None
+        try:
+            return pickle.loads(value)
+        except Exception as e:
+            # 数据结构变化后旧缓存无法还原，当作未命中
+            logger.warning(f"读取阶段缓存失败，忽略该缓存: {e}")
+            return None
+
+    def put(self, key: str, stage: str, value: Any) -> None:
+        if not self.enabled or value is None:
+            return
+        data = pickle.dumps(value)
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO stage_outputs (cache_key, stage, value, created_at, size) VALUES (?, ?, ?, ?, ?)",
+                    (key, stage, data, time.time(), len(data)),
+                )
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        """删除过期条目，并按写入时间从旧到新淘汰超出条目数或总大小上限的条目，返回删除的条数"""
+        deleted = 0
+        now = time.time()
+        for stage, ttl in self.stage_ttls.items():
+            if ttl:
+                deleted += conn.execute(
+                    "DELETE FROM stage_outputs WHERE stage = ? AND created_at < ?", (stage, now - ttl)
+                ).rowcount
+        if self.max_entries or self.max_bytes:
+            # 从最新的条目开始累计，保留在上限内的部分
+            deleted += conn.execute("""
+                DELETE FROM stage_outputs WHERE cache_key IN (
+                    SELECT cache_key FROM (
+                        SELECT cache_key,
+                               ROW_NUMBER() OVER (ORDER BY created_at DESC, cache_key) AS position,
+                               SUM(size) OVER (ORDER BY created_at DESC, cache_key) AS total_size
+                        FROM stage_outputs
+                    )
+                    WHERE (? > 0 AND position > ?) OR (? > 0 AND total_size > ?)
+                )
+            """, (self.max_entries, self.max_entries, self.max_bytes, self.max_bytes)).rowcount
+        if deleted:
+            logger.info(f"阶段缓存删除了 {deleted} 条过期或超出上限的条目")
+        return deleted
+
+    def prune(self) -> int:
+        """立即删除过期和超出上限的条目，返回删除的条数"""
+        if not self.enabled:
+            return 0
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = self._evict(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return deleted
+
+    async def aget(self, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        """在线程池中执行get"""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get, key, max_age)
+
+    async def aput(self, key: str, stage: str, value: Any) -> None:
+        """在线程池中执行put"""
+        if not self.enabled or value is None:
+            return
+        await asyncio.to_thread(self.put, key, stage, value)
+
+    def clear(self, stage: Optional[str] = None) -> int:
+        """清空缓存，指定stage时只清空该阶段，返回删除的条数"""
+        if not self.enabled:
+            return 0
+        with self._connection() as conn:
+            if stage is None:
+                cursor = conn.execute("DELETE FROM stage_outputs")
+            else:
+                cursor = conn.execute("DELETE FROM stage_outputs WHERE stage = ?", (stage,))
+            return cursor.rowcount
+
+
+@lru_cache(maxsize=None)
+def get_stage_cache() -> StageCache:
+    """首次使用时才创建全局阶段缓存"""
+    return StageCache()
@@ -0,0 +1,59 @@
+import re
+from typing import Dict, List, Optional
+
+_VERSION_SUFFIX = re.compile(r"v(\d+)$")
+
+
+def base_arxiv_id(paper_id: str) -> str:
+    """去掉arXiv id的版本后缀，如 2401.00001v2 -> 2401.00001"""
+    return _VERSION_SUFFIX.sub("", paper_id or "")
+
+
+def arxiv_version(paper_id: str) -> int:
+    """arXiv id的版本号，没有版本后缀时为0"""
+    match = _VERSION_SUFFIX.search(paper_id or "")
+    return int(match.group(1)) if match else 0
+
+
+def dedupe_papers(paper_lists: List[List[dict]]) -> Dict[str, dict]:
+    """合并多个检索结果列表，按arXiv基础id去重，同一篇论文保留最新版本
+
+    返回:
+        {基础id: 论文信息}，按论文首次出现的顺序排列
+    """
+    unique: Dict[str, dict] = {}
+    for papers in paper_lists:
+        for paper in papers:
+            base_id = base_arxiv_id(paper["paper_id"])
+            current = unique.get(base_id)
+            if current is None or arxiv_version(paper["paper_id"]) > arxiv_version(current["paper_id"]):
+                unique[base_id] = paper
+    return unique
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[dict]], k: int = 60, limit: Optional[int] = None) -> List[dict]:
+    """用倒数排名融合(RRF)合并多个按相关性排序的检索结果
+
+    每篇论文的得分为它在各列表中排名的 1 / (k + rank) 之和，同时被多个查询检索到、且排名靠前的论文得分更高。
+    论文按arXiv基础id去重并保留最新版本；同一列表中出现多个版本时只按最靠前的排名计分。
+
+    参数:
+        ranked_lists: 各查询的检索结果，每个列表按相关性从高到低排列
+        k: 平滑常数，越大则排名差异对得分的影响越小
+        limit: 最多返回的论文数，None表示不限制
+
+    返回:
+        按融合得分从高到低排列的论文列表，得分相同时保持首次出现的顺序
+    """
+    scores: Dict[str, float] = {}
+    for papers in ranked_lists:
+        seen = set()
+        for rank, paper in enumerate(papers, start=1):
+            base_id = base_arxiv_id(paper["paper_id"])
+            if base_id in seen:
+                continue
+            seen.add(base_id)
+            scores[base_id] = scores.get(base_id, 0.0) + 1.0 / (k + rank)
+    unique = dedupe_papers(ranked_lists)
+    ranked = sorted(unique, key=lambda base_id: -scores[base_id])
+    return [unique[base_id] for base_id in ranked[:limit]]
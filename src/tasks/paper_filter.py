@@ -0,0 +1,204 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.core.config import config
+from src.utils.log_utils import setup_logger
+from src.utils.metrics import EMBEDDING_LATENCY
+from src.utils.tracing import span
+
+logger = setup_logger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+|[一-鿿]")
+
+
+def tokenize(text: str) -> List[str]:
+    """小写的英文单词和数字，中文按单字切分"""
+    return _WORD.findall((text or "").lower())
+
+
+def paper_text(paper: Dict[str, Any], title_weight: int = 2) -> str:
+    """用于打分的论文文本：标题重复title_weight次以提高标题命中的权重，再加上摘要"""
+    title = paper.get("title") or ""
+    summary = paper.get("summary") or paper.get("abstract") or ""
+    return " ".join([title] * title_weight + [summary])
+
+
+def is_enabled() -> bool:
+    return config.get_bool("relevance-filter.enabled", True)
+
+
+def candidate_count(max_papers: int) -> int:
+    """启用相关性筛选时检索的候选论文数：max_papers * candidate-factor，筛选后保留max_papers篇"""
+    if not is_enabled():
+        return max_papers
+    return max(max_papers, math.ceil(max_papers * config.get_float("relevance-filter.candidate-factor", 2.0)))
+
+
+def top_n(max_papers: int) -> int:
+    """筛选后保留的论文数：relevance-filter.top-n，未配置时为max_papers"""
+    return config.get_int("relevance-filter.top-n", 0) or max_papers
+
+
+def min_score() -> Optional[float]:
+    """relevance-filter.min-score，未配置时返回None"""
+    value = config.get("relevance-filter.min-score")
+    return float(value) if value is not None else None
+
+
+def relevance_query(user_request: str, search_query: Optional[Dict[str, Any]] = None) -> str:
+    """打分用的查询文本：用户请求加上审核后的检索关键词
+
+    用户请求通常是中文，论文是英文，检索关键词保证词项打分也能命中。
+    """
+    return " ".join([user_request or ""] + list((search_query or {}).get("querys") or []))
+
+
+class RelevanceScorer:
+    """相关性打分器基类：对同一查询下的一批候选论文打分，分数越高越相关
+
+    score是同步方法，可能较慢（如调用嵌入模型），异步代码中应通过asyncio.to_thread调用。
+    """
+
+    name = ""
+
+    def score(self, query: str, papers: List[Dict[str, Any]]) -> List[float]:
+        raise NotImplementedError
+
+
+class BM25Scorer(RelevanceScorer):
+    """以候选论文集合为语料的BM25打分，不依赖模型，毫秒级完成"""
+
+    name = "bm25"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def score(self, query: str, papers: List[Dict[str, Any]]) -> List[float]:
+        docs = [Counter(tokenize(paper_text(paper))) for paper in papers]
+        if not docs:
+            return []
+        lengths = [sum(doc.values()) for doc in docs]
+        avgdl = sum(lengths) / len(docs) or 1.0
+        df = Counter(term for doc in docs for term in doc)
+        terms = set(tokenize(query))
+        idf = {term: math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5)) for term in terms if df[term]}
+        scores = []
+        for doc, length in zip(docs, lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / avgdl)
+            scores.append(sum(weight * doc[term] * (self.k1 + 1) / (doc[term] + norm) for term, weight in idf.items() if doc[term]))
+        return scores
+
+
+class TfidfScorer(RelevanceScorer):
+    """查询与论文TF-IDF向量的余弦相似度（对数词频、平滑idf）"""
+
+    name = "tfidf"
+
+    def score(self, query: str, papers: List[Dict[str, Any]]) -> List[float]:
+        docs = [Counter(tokenize(paper_text(paper))) for paper in papers]
+        if not docs:
+            return []
+        df = Counter(term for doc in docs for term in doc)
+        idf = {term: math.log((1 + len(docs)) / (1 + count)) + 1 for term, count in df.items()}
+
+        def vector(counts: Counter) -> Dict[str, float]:
+            # 不在任何候选论文中出现的查询词不影响相似度
+            return {term: (1 + math.log(tf)) * idf[term] for term, tf in counts.items() if term in idf}
+
+        query_vector = vector(Counter(tokenize(query)))
+        query_norm = math.sqrt(sum(v * v for v in query_vector.values()))
+        scores = []
+        for doc in docs:
+            doc_vector = vector(doc)
+            doc_norm = math.sqrt(sum(v * v for v in doc_vector.values()))
+            dot = sum(weight * doc_vector.get(term, 0.0) for term, weight in query_vector.items())
+            scores.append(dot / (query_norm * doc_norm) if query_norm and doc_norm else 0.0)
+        return scores
+
+
+class EmbeddingScorer(RelevanceScorer):
+    """查询与论文标题摘要嵌入向量的余弦相似度，可以匹配中文请求与英文论文、同义表述
+
+    使用relevance-embedding-model配置的嵌入模型，未配置时使用默认嵌入模型。
+    """
+
+    name = "embedding"
+
+    def __init__(self, client_type: str = "relevance-embedding-model", batch_size: Optional[int] = None):
+        self.client_type = client_type
+        self.batch_size = batch_size or config.get_int("relevance-filter.embedding-batch-size", 32)
+
+    def score(self, query: str, papers: List[Dict[str, Any]]) -> List[float]:
+        import numpy as np
+
+        from src.core.model_client import create_embedding_client
+
+        if not papers:
+            return []
+        client = create_embedding_client(self.client_type)
+        texts = [query] + [paper_text(paper, title_weight=1) for paper in papers]
+        embeddings = []
+        with EMBEDDING_LATENCY.labels("relevance").time(), span("embedding.relevance", "io", texts=len(texts)):
+            for i in range(0, len(texts), self.batch_size):
+                response = client.embeddings.create(model=client.default_headers["X-Model"], input=texts[i:i + self.batch_size])
+                embeddings.extend(item.embedding for item in response.data)
+        vectors = np.array(embeddings, dtype=float)
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms[:, None]
+        return (vectors[1:] @ vectors[0]).tolist()
+
+
+_SCORERS: Dict[str, Callable[[], RelevanceScorer]] = {
+    BM25Scorer.name: BM25Scorer,
+    TfidfScorer.name: TfidfScorer,
+    EmbeddingScorer.name: EmbeddingScorer,
+}
+
+
+def register_scorer(name: str, factory: Callable[[], RelevanceScorer]) -> None:
+    """注册自定义打分器，之后可通过relevance-filter.scorer配置使用"""
+    _SCORERS[name] = factory
+
+
+def get_scorer(name: Optional[str] = None) -> RelevanceScorer:
+    """按名称创建打分器，默认使用relevance-filter.scorer配置"""
+    name = name or config.get("relevance-filter.scorer") or BM25Scorer.name
+    if name not in _SCORERS:
+        raise ValueError(f"未知的相关性打分器: {name}，可选: {', '.join(_SCORERS)}")
+    return _SCORERS[name]()
+
+
+def filter_papers(papers: List[Dict[str, Any]],
+                  query: str,
+                  top_n: int,
+                  scorer: Optional[RelevanceScorer] = None,
+                  min_score: Optional[float] = None) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """
+    按与查询的相关性筛选论文
+
+    参数:
+        papers: 候选论文，按检索结果的顺序排列
+        query: 打分用的查询文本，见relevance_query
+        top_n: 最多保留的论文数
+        scorer: 打分器，默认使用relevance-filter.scorer配置；嵌入打分失败时退回BM25
+        min_score: 低于该分数的论文即使排在前top_n也丢弃，None表示不限制
+
+    返回:
+        (按相关性从高到低排列的保留论文, 所有候选论文的分数 {paper_id: 分数})，分数相同时保持检索结果的顺序
+    """
+    scorer = scorer or get_scorer()
+    try:
+        scores = scorer.score(query, papers)
+    except Exception as e:
+        if isinstance(scorer, BM25Scorer):
+            raise
+        logger.warning(f"相关性打分器{scorer.name}失败，改用BM25: {e}")
+        scores = BM25Scorer().score(query, papers)
+    ranked = sorted(range(len(papers)), key=lambda i: -scores[i])
+    kept = [papers[i] for i in ranked if min_score is None or scores[i] >= min_score][:top_n]
+    return kept, {paper["paper_id"]: round(float(score), 6) for paper, score in zip(papers, scores)}
+
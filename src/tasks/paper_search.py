@@ -1,18 +1,31 @@
 import arxiv
+import asyncio
 import logging
-from typing import List, Dict, Optional, Union
+import math
+from typing import AsyncIterator, List, Dict, Optional, Union
 from datetime import datetime, timedelta
 
+from src.core.config import config
 from src.utils.log_utils import setup_logger
+from src.utils.tracing import span
+from src.services.arxiv_client import AsyncArxivClient
+from src.services.local_index import get_local_index
+from src.services.paper_store import get_paper_store
+from src.tasks.deduplicator import arxiv_version, base_arxiv_id, reciprocal_rank_fusion
 
 logger = setup_logger(__name__)
 
 class PaperSearcher:
-    """论文搜索器，使用arxiv库搜索论文"""
+    """论文搜索器，默认通过arXiv API搜索论文，也可以检索本地的arXiv元数据索引（search.backend: local）"""
     
-    def __init__(self):
-        """初始化论文搜索器"""
-        pass
+    def __init__(self, backend: Optional[str] = None):
+        """
+        初始化论文搜索器
+
+        参数:
+            backend: 检索后端，arxiv 或 local，默认使用search.backend配置
+        """
+        self.backend = backend or config.get("search.backend") or "arxiv"
     
     async def search_papers(self, 
                       querys: List[str], 
@@ -20,7 +33,8 @@ class PaperSearcher:
                       sort_by: arxiv.SortCriterion = arxiv.SortCriterion.Relevance, 
                       sort_order: arxiv.SortOrder = arxiv.SortOrder.Descending, 
                       start_date: Optional[Union[str, datetime]] = None, 
-                      end_date: Optional[Union[str, datetime]] = None) -> List[Dict]:
+                      end_date: Optional[Union[str, datetime]] = None,
+                      fan_out: Optional[bool] = None) -> List[Dict]:
         """
         搜索arXiv论文
         
@@ -31,23 +45,30 @@ class PaperSearcher:
             sort_order: 排序顺序 (Ascending, Descending)
             start_date: 开始日期，可以是字符串(YYYY-MM-DD)或datetime对象
             end_date: 结束日期，可以是字符串(YYYY-MM-DD)或datetime对象
+            fan_out: 是否每个关键词单独并发检索后用RRF合并，默认使用search.fan-out配置
         
+        使用本地索引时不分关键词检索（BM25本身按各关键词的匹配程度排序）。检索结果的缓存见search_agent。
+
         返回:
             论文列表，每项包含论文的详细信息
         """
+        if self.backend == "local":
+            return await self._search_local(querys, max_results, sort_by, sort_order, start_date, end_date)
+        if self._use_fan_out(querys, fan_out):
+            return await self.fan_out_search(querys, max_results, sort_by, sort_order, start_date, end_date)
+        return await self._search_joined(querys, max_results, sort_by, sort_order, start_date, end_date)
+
+    async def _search_joined(self,
+                             querys: List[str],
+                             max_results: int,
+                             sort_by: arxiv.SortCriterion,
+                             sort_order: arxiv.SortOrder,
+                             start_date: Optional[Union[str, datetime]],
+                             end_date: Optional[Union[str, datetime]]) -> List[Dict]:
+        """所有关键词拼成一个OR查询检索"""
         # querys = ['artificial intelligence', 'AI', 'llm', 'machine learning', 'deep learning']
         try:
-            # 构建搜索查询
-            search_query = ""
-            for query in querys:
-                search_query += "all:%22"+query+"%22 OR "
-            search_query = search_query[:-4]
-            # 添加日期范围过滤
-            if start_date or end_date:
-                start_date_str = self._format_date(start_date) if start_date else "190001010000"
-                end_date_str = self._format_date(end_date) if end_date else datetime.now().strftime("%Y%m%d2359")
-                date_filter = f"submittedDate:[{start_date_str} TO {end_date_str}]"
-                search_query = f"{search_query} AND {date_filter}"
+            search_query = self._build_query(querys, start_date, end_date)
 
             logger.info(f"开始搜索论文: query='{search_query}', max_results={max_results}, sort_by={sort_by}")
 
@@ -66,10 +87,12 @@ class PaperSearcher:
                 logger.error(f"创建arxiv搜索对象失败: {str(e)}")
                 return []
             
-            # logger.info(f"论文搜索结果为：{search.results()}")
-            # 执行搜索并解析结果
-            # 使用新方法格式化论文列表
-            papers = self.format_papers_list(search.results())
+            # 执行搜索并解析结果；异步客户端不阻塞事件循环，除第一页外的各页并发请求
+            with span("arxiv.search", "io", query=search_query, max_results=max_results) as record:
+                papers = [self._parse_paper_result(result) async for result in AsyncArxivClient().results(search)]
+                if record is not None:
+                    record.set(paper_count=len(papers))
+            await self._save_to_store(papers)
             
             logger.info(f"论文搜索完成，共找到 {len(papers)} 篇论文")
             return papers
@@ -77,6 +100,266 @@ class PaperSearcher:
             logger.error(f"论文搜索失败: {str(e)}")
             raise
     
+    async def iter_papers(self,
+                          querys: List[str],
+                          max_results: int = 50,
+                          page_size: int = 10,
+                          sort_by: arxiv.SortCriterion = arxiv.SortCriterion.Relevance,
+                          sort_order: arxiv.SortOrder = arxiv.SortOrder.Descending,
+                          start_date: Optional[Union[str, datetime]] = None,
+                          end_date: Optional[Union[str, datetime]] = None,
+                          fan_out: Optional[bool] = None) -> AsyncIterator[Dict]:
+        """
+        流式搜索arXiv论文，按页请求，每页到达后立即逐篇返回，下游无需等待全部结果
+
+        分关键词并发检索时按到达顺序逐篇返回各关键词的结果（见iter_fan_out），不等待所有关键词检索完成。
+
+        参数:
+            page_size: 每次请求arXiv API返回的论文数量，越小首篇论文到达越快
+            其余参数同search_papers
+
+        返回:
+            逐篇产出论文信息字典的异步迭代器
+        """
+        if self.backend == "local":
+            for paper in await self._search_local(querys, max_results, sort_by, sort_order, start_date, end_date):
+                yield paper
+            return
+        if self._use_fan_out(querys, fan_out):
+            async for paper in self.iter_fan_out(querys, max_results, sort_by, sort_order, start_date, end_date, page_size):
+                yield paper
+            return
+
+        search_query = self._build_query(querys, start_date, end_date)
+        logger.info(f"开始流式搜索论文: query='{search_query}', max_results={max_results}, page_size={page_size}")
+        search = arxiv.Search(
+            query=search_query,
+            max_results=max_results,
+            sort_by=sort_by,
+            sort_order=sort_order
+        )
+        papers = []
+        # span覆盖整个流的生命周期（含下游阅读的时间）；异步生成器中的span不设为当前span
+        with span("arxiv.search", "io", activate=False, query=search_query, max_results=max_results, stream=True) as record:
+            try:
+                async for result in AsyncArxivClient(page_size=page_size).results(search):
+                    paper = self._parse_paper_result(result)
+                    papers.append(paper)
+                    if record is not None:
+                        record.set(paper_count=len(papers))
+                    yield paper
+            finally:
+                # 流结束（包括调用方提前停止）后一次性写入论文库，而不是每篇论文写一次
+                await self._save_to_store(papers)
+        logger.info(f"流式搜索完成，共找到 {len(papers)} 篇论文")
+
+    async def _search_local(self,
+                            querys: List[str],
+                            max_results: int,
+                            sort_by: arxiv.SortCriterion,
+                            sort_order: arxiv.SortOrder,
+                            start_date: Optional[Union[str, datetime]],
+                            end_date: Optional[Union[str, datetime]]) -> List[Dict]:
+        """检索本地arXiv元数据索引，关键词和日期的语义与arXiv API检索相同"""
+        start = self._format_date(start_date) if start_date else None
+        end = self._format_date(end_date) if end_date else None
+        with span("local_index.search", "io", queries=len(querys), max_results=max_results) as record:
+            papers = await asyncio.to_thread(
+                get_local_index().search,
+                querys,
+                max_results,
+                sort_by.value,
+                sort_order == arxiv.SortOrder.Descending,
+                start,
+                end,
+                config.get("local-index.categories"),
+            )
+            if record is not None:
+                record.set(paper_count=len(papers))
+        logger.info(f"本地索引检索完成，共找到 {len(papers)} 篇论文")
+        return papers
+
+    @staticmethod
+    def _use_fan_out(querys: List[str], fan_out: Optional[bool]) -> bool:
+        if fan_out is None:
+            fan_out = config.get_bool("search.fan-out", True)
+        return fan_out and len(querys) > 1
+
+    async def fan_out_search(self,
+                             querys: List[str],
+                             max_results: int = 50,
+                             sort_by: arxiv.SortCriterion = arxiv.SortCriterion.Relevance,
+                             sort_order: arxiv.SortOrder = arxiv.SortOrder.Descending,
+                             start_date: Optional[Union[str, datetime]] = None,
+                             end_date: Optional[Union[str, datetime]] = None,
+                             page_size: Optional[int] = None) -> List[Dict]:
+        """
+        每个关键词单独并发检索，再用倒数排名融合(RRF)合并
+
+        与把所有关键词拼成一个OR查询相比，每个关键词按自身的相关性排序，同时命中多个关键词的论文排名更靠前；
+        结果按arXiv基础id去重并保留最新版本，避免重复阅读同一篇论文的不同版本。
+        每个关键词最多检索 max_results * search.fan-out-overfetch / 关键词数 篇，合并后最多返回max_results篇。
+
+        返回:
+            按融合得分排序的论文列表
+        """
+        per_query = min(max_results, math.ceil(max_results * config.get_float("search.fan-out-overfetch", 2.0) / len(querys)))
+        logger.info(f"分关键词并发检索: {len(querys)} 个关键词，每个最多 {per_query} 篇")
+
+        async def search_one(query: str) -> List[Dict]:
+            search = arxiv.Search(
+                query=self._build_query([query], start_date, end_date),
+                max_results=per_query,
+                sort_by=sort_by,
+                sort_order=sort_order
+            )
+            with span("arxiv.query", "io", query=query, max_results=per_query) as record:
+                papers = [self._parse_paper_result(result) async for result in AsyncArxivClient(page_size=page_size).results(search)]
+                if record is not None:
+                    record.set(paper_count=len(papers))
+            return papers
+
+        with span("arxiv.fan_out_search", "io", queries=len(querys), max_results=max_results) as record:
+            results = await asyncio.gather(*[search_one(query) for query in querys], return_exceptions=True)
+            ranked_lists = []
+            for query, result in zip(querys, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"关键词检索失败，忽略该关键词: query='{query}', {result}")
+                else:
+                    ranked_lists.append(result)
+            if not ranked_lists:
+                raise results[0]
+            papers = reciprocal_rank_fusion(ranked_lists, k=config.get_int("search.rrf-k", 60), limit=max_results)
+            await self._save_to_store(papers)
+            if record is not None:
+                record.set(fetched=sum(len(p) for p in ranked_lists), paper_count=len(papers))
+        logger.info(f"分关键词检索完成: 共检索到 {sum(len(p) for p in ranked_lists)} 条结果，合并去重后 {len(papers)} 篇论文")
+        return papers
+
+    async def iter_fan_out(self,
+                           querys: List[str],
+                           max_results: int = 50,
+                           sort_by: arxiv.SortCriterion = arxiv.SortCriterion.Relevance,
+                           sort_order: arxiv.SortOrder = arxiv.SortOrder.Descending,
+                           start_date: Optional[Union[str, datetime]] = None,
+                           end_date: Optional[Union[str, datetime]] = None,
+                           page_size: Optional[int] = None) -> AsyncIterator[Dict]:
+        """
+        流式的分关键词并发检索：各关键词的结果页一到达就逐篇返回，不等待其他关键词
+
+        RRF需要所有关键词的完整排名，流式模式下改为按到达顺序返回：每个关键词的结果本身按相关性排序，
+        各关键词并发请求，先到达的是各关键词排名靠前的论文。按arXiv基础id去重，
+        返回max_results篇后停止并取消其余请求。每个关键词的检索数量与fan_out_search相同。
+        """
+        per_query = min(max_results, math.ceil(max_results * config.get_float("search.fan-out-overfetch", 2.0) / len(querys)))
+        logger.info(f"分关键词并发流式检索: {len(querys)} 个关键词，每个最多 {per_query} 篇")
+        arrivals: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def search_one(query: str) -> None:
+            search = arxiv.Search(
+                query=self._build_query([query], start_date, end_date),
+                max_results=per_query,
+                sort_by=sort_by,
+                sort_order=sort_order
+            )
+            try:
+                async for result in AsyncArxivClient(page_size=page_size).results(search):
+                    arrivals.put_nowait(self._parse_paper_result(result))
+            except Exception as e:
+                logger.error(f"关键词检索失败，忽略该关键词: query='{query}', {e}")
+                arrivals.put_nowait(e)
+            arrivals.put_nowait(done)
+
+        tasks = [asyncio.create_task(search_one(query)) for query in querys]
+        seen, errors, finished = set(), [], 0
+        papers = []
+        with span("arxiv.fan_out_search", "io", activate=False, queries=len(querys), max_results=max_results, stream=True) as record:
+            try:
+                while finished < len(tasks) and len(seen) < max_results:
+                    item = await arrivals.get()
+                    if item is done:
+                        finished += 1
+                        continue
+                    if isinstance(item, Exception):
+                        errors.append(item)
+                        continue
+                    base_id = base_arxiv_id(item["paper_id"])
+                    if base_id in seen:
+                        continue
+                    seen.add(base_id)
+                    papers.append(item)
+                    if record is not None:
+                        record.set(paper_count=len(seen))
+                    yield item
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await self._save_to_store(papers)
+        if not seen and len(errors) == len(querys):
+            raise errors[0]
+        logger.info(f"分关键词流式检索完成，共返回 {len(seen)} 篇论文")
+
+    @staticmethod
+    def _store_ttl() -> float:
+        return config.get_float("paper-store.ttl-seconds", 604800)
+
+    async def _save_to_store(self, papers: List[Dict]) -> None:
+        """
+        把检索结果写入本地论文元数据库，论文库读写失败不影响检索
+
+        先批量查询一次本地记录，只写入本地没有、已超过paper-store.ttl-seconds或检索到更新版本的论文，
+        本地记录仍然有效时不重复写入。
+        """
+        store = get_paper_store()
+        if not papers or not store.enabled:
+            return
+
+        def refresh() -> int:
+            stored = store.get_many([paper["paper_id"] for paper in papers], self._store_ttl())
+            stale = [
+                paper for paper in papers
+                if base_arxiv_id(paper["paper_id"]) not in stored
+                or arxiv_version(paper["paper_id"]) > arxiv_version(stored[base_arxiv_id(paper["paper_id"])]["paper_id"])
+            ]
+            return store.upsert_many(stale) if stale else 0
+
+        try:
+            written = await asyncio.to_thread(refresh)
+            logger.debug(f"论文元数据库: 检索到 {len(papers)} 篇，刷新 {written} 篇")
+        except Exception as e:
+            logger.warning(f"读写论文元数据库失败: {e}")
+
+    async def lookup_papers(self, paper_ids: List[str]) -> List[Dict]:
+        """
+        按arXiv id批量获取论文元数据：先一次性查询本地论文库，只向arXiv请求本地没有、已过期或版本较旧的论文
+
+        参数:
+            paper_ids: arXiv id列表，带不带版本后缀均可；向arXiv请求时总是获取最新版本
+
+        返回:
+            论文列表，按paper_ids的顺序排列（同一篇论文只返回一次），arXiv上不存在的id被忽略
+        """
+        store = get_paper_store()
+        found = await asyncio.to_thread(store.get_many, paper_ids, self._store_ttl())
+        missing = list(dict.fromkeys(
+            base_arxiv_id(paper_id) for paper_id in paper_ids
+            if base_arxiv_id(paper_id) not in found
+            or arxiv_version(paper_id) > arxiv_version(found[base_arxiv_id(paper_id)]["paper_id"])
+        ))
+        if missing:
+            search = arxiv.Search(id_list=missing, max_results=len(missing))
+            with span("arxiv.lookup", "io", paper_count=len(missing)) as record:
+                fetched = [self._parse_paper_result(result) async for result in AsyncArxivClient().results(search)]
+                if record is not None:
+                    record.set(fetched=len(fetched))
+            await asyncio.to_thread(store.upsert_many, fetched)
+            for paper in fetched:
+                found[base_arxiv_id(paper["paper_id"])] = paper
+        base_ids = dict.fromkeys(base_arxiv_id(paper_id) for paper_id in paper_ids)
+        logger.info(f"按id获取论文: 共 {len(base_ids)} 篇，本地命中 {len(base_ids) - len(missing)} 篇，向arXiv请求 {len(missing)} 篇")
+        return [found[base_id] for base_id in base_ids if base_id in found]
+
     async def search_by_topic(self, 
                        topic: str, 
                        limit: int = 10, 
@@ -174,6 +457,7 @@ class PaperSearcher:
             "summary": result.summary,
             "published": published_year,
             "published_date": result.published.isoformat() if result.published else None,
+            "updated_date": result.updated.isoformat() if result.updated else None,
             "url": result.entry_id,
             "pdf_url": result.pdf_url,
             "primary_category": result.primary_category,
@@ -181,7 +465,25 @@ class PaperSearcher:
             "doi": result.doi if hasattr(result, 'doi') else None
         }
     
-    def _format_date(self, date: Union[str, datetime]) -> str:
+    def _build_query(self,
+                     querys: List[str],
+                     start_date: Optional[Union[str, datetime]] = None,
+                     end_date: Optional[Union[str, datetime]] = None) -> str:
+        """构建arXiv查询语句：多个关键词之间为OR关系，可选按提交日期过滤"""
+        search_query = ""
+        for query in querys:
+            search_query += "all:%22"+query+"%22 OR "
+        search_query = search_query[:-4]
+        # 添加日期范围过滤
+        if start_date or end_date:
+            start_date_str = self._format_date(start_date) if start_date else "190001010000"
+            end_date_str = self._format_date(end_date) if end_date else datetime.now().strftime("%Y%m%d2359")
+            date_filter = f"submittedDate:[{start_date_str} TO {end_date_str}]"
+            search_query = f"{search_query} AND {date_filter}"
+        return search_query
+
+    @staticmethod
+    def _format_date(date: Union[str, datetime]) -> str:
         """
         
         格式化日期为arXiv API支持的格式YYYYMMDDTTTT
@@ -0,0 +1,238 @@
+import asyncio
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+class _Metric:
+    """指标基类：按标签值分别记录数据，渲染为Prometheus文本格式"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str) -> "_Child":
+        """返回指定标签值对应的子指标，用法与prometheus_client一致"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"指标{self.name}需要标签{self.labelnames}，实际传入{values}")
+        return _Child(self, tuple(str(value) for value in values))
+
+    def _format_labels(self, values: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, value in items:
+            lines.extend(self._render_value(values, value))
+        return lines
+
+    def _render_value(self, values: Tuple[str, ...], value) -> List[str]:
+        return [f"{self.name}{self._format_labels(values)} {_format_number(value)}"]
+
+
+class _Child:
+    """带固定标签值的子指标"""
+
+    def __init__(self, metric: _Metric, values: Tuple[str, ...]):
+        self._metric = metric
+        self._values = values
+
+    def inc(self, amount: float = 1) -> None:
+        self._metric._inc(self._values, amount)
+
+    def set(self, value: float) -> None:
+        self._metric._set(self._values, value)
+
+    def observe(self, value: float) -> None:
+        self._metric._observe(self._values, value)
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """记录代码块的执行耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1) -> None:
+        self._inc((), amount)
+
+    def _inc(self, values: Tuple[str, ...], amount: float) -> None:
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    type_name = "gauge"
+
+    def set(self, value: float) -> None:
+        self._set((), value)
+
+    def _set(self, values: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            self._values[values] = value
+
+    def _inc(self, values: Tuple[str, ...], amount: float) -> None:
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+
+class Histogram(_Metric):
+    """分桶统计耗时等观测值的分布"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float) -> None:
+        self._observe((), value)
+
+    def time(self):
+        return _Child(self, ()).time()
+
+    def _observe(self, values: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            state = self._values.get(values)
+            if state is None:
+                state = self._values[values] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_value(self, values: Tuple[str, ...], state) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            le = "+Inf" if bound == math.inf else _format_number(bound)
+            lines.append(f"{self.name}_bucket{self._format_labels(values, {'le': le})} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(values)} {_format_number(state['sum'])}")
+        lines.append(f"{self.name}_count{self._format_labels(values)} {state['count']}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """指标注册表，负责统一输出/metrics接口的内容"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标已存在: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """以Prometheus文本格式输出所有指标"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 创建全局指标注册表
+metrics_registry = MetricsRegistry()
+
+# 流水线各阶段耗时，可定位生产环境中占用时间最多的阶段
+STAGE_LATENCY = metrics_registry.register(Histogram(
+    "paper_agent_stage_duration_seconds", "流水线各阶段耗时（秒）", ["stage", "status"],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800),
+))
+
+# 任务与事件通道
+JOBS = metrics_registry.register(Gauge("paper_agent_jobs", "当前任务数", ["state"]))
+SSE_SUBSCRIBERS = metrics_registry.register(Gauge("paper_agent_sse_subscribers", "当前SSE订阅连接数"))
+EVENT_QUEUE_DEPTH = metrics_registry.register(Gauge("paper_agent_event_queue_depth", "未结束任务事件通道中缓存的事件总数"))
+
+# 模型调用，按智能体（模型客户端类型）区分
+LLM_REQUESTS = metrics_registry.register(Counter("paper_agent_llm_requests_total", "模型请求次数", ["agent", "status"]))
+LLM_LATENCY = metrics_registry.register(Histogram(
+    "paper_agent_llm_request_duration_seconds", "模型请求耗时（秒），流式请求为读取完整响应的耗时", ["agent"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300),
+))
+LLM_TOKENS = metrics_registry.register(Counter("paper_agent_llm_tokens_total", "模型消耗的token数", ["agent", "kind"]))
+
+# 向量相关调用
+EMBEDDING_LATENCY = metrics_registry.register(Histogram(
+    "paper_agent_embedding_duration_seconds", "嵌入模型调用耗时（秒）", ["client"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+))
+CHROMA_LATENCY = metrics_registry.register(Histogram(
+    "paper_agent_chroma_duration_seconds", "Chroma向量库操作耗时（秒），包含其中的嵌入计算", ["operation"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+))
+
+# arXiv请求：ok / retry / failed，以及被合并到进行中请求的次数(coalesced)
+ARXIV_REQUESTS = metrics_registry.register(Counter("paper_agent_arxiv_requests_total", "arXiv API请求次数", ["result"]))
+
+# 检索结果缓存
+SEARCH_CACHE_REQUESTS = metrics_registry.register(Counter("paper_agent_search_cache_requests_total", "检索结果缓存的查询次数", ["result"]))
+
+
+def timed_node(stage: str) -> Callable:
+    """LangGraph节点装饰器：记录节点耗时及结果(ok / error / cancelled)
+
+    节点内部捕获的异常会写入state中对应的 `<节点函数名>_error` 字段，同样按error统计。
+    """
+    def decorator(node: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        error_field = f"{node.__name__}_error"
+
+        @functools.wraps(node)
+        async def wrapper(state, *args, **kwargs):
+            start = time.perf_counter()
+            status = "error"
+            try:
+                result = await node(state, *args, **kwargs)
+                value = result.get("value") if isinstance(result, dict) else None
+                error = getattr(value, "error", None) if value is not None else None
+                status = "error" if getattr(error, error_field, None) else "ok"
+                return result
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            finally:
+                STAGE_LATENCY.labels(stage, status).observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
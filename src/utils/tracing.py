@@ -0,0 +1,243 @@
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Union
+
+from src.core.config import config
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_TRACE_DIR = Path(__file__).parent.parent.parent / "data" / "traces"
+
+class Span:
+    """一次操作的耗时记录：流水线节点、智能体调用或外部I/O（arXiv、嵌入、Chroma、模型请求）"""
+
+    def __init__(self, name: str, kind: str, parent_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        # 任务恢复后的span追加到同一份记录中，id需要跨进程唯一
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self.thread_id = threading.get_ident()
+
+    def set(self, **attributes: Any) -> None:
+        """添加或更新属性，如论文数、token数"""
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "end": self.end,
+            "duration": round(self.duration, 6),
+            "attributes": self.attributes,
+            "error": self.error,
+            "thread_id": self.thread_id,
+        }
+
+
+class Trace:
+    """单个任务的全部span，按任务导出为JSON或Chrome trace-event格式"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        # 向量库和嵌入调用在线程池中执行，需要加锁
+        with self._lock:
+            self.spans.append(span)
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {"job_id": self.job_id, "spans": sorted(spans, key=lambda span: span["start"])}
+
+    def save(self, trace_dir: Optional[Union[str, Path]] = None) -> Path:
+        """写入 <trace_dir>/<job_id>.json；任务从检查点恢复时追加到之前的记录之后"""
+        path = trace_path(self.job_id, trace_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = self.to_json()
+        previous = load_trace(self.job_id, trace_dir)
+        if previous is not None:
+            data["spans"] = previous["spans"] + data["spans"]
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, default=str), encoding="utf-8")
+        os.replace(tmp_path, path)
+        return path
+
+
+def trace_path(job_id: str, trace_dir: Optional[Union[str, Path]] = None) -> Path:
+    return Path(trace_dir or config.get("tracing.dir") or DEFAULT_TRACE_DIR) / f"{job_id}.json"
+
+
+def load_trace(job_id: str, trace_dir: Optional[Union[str, Path]] = None) -> Optional[Dict[str, Any]]:
+    """读取任务保存的追踪记录（JSON格式），不存在时返回None"""
+    path = trace_path(job_id, trace_dir)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def to_chrome_trace(data: Dict[str, Any]) -> Dict[str, Any]:
+    """把JSON格式的追踪记录转换为Chrome trace-event格式，可在chrome://tracing或Perfetto中打开
+
+    每个span是一个完整事件(ph=X)，时间单位为微秒；并发执行的span（如并行阅读的多篇论文）分到不同的行。
+    """
+    spans = sorted(data.get("spans", []), key=lambda span: (span["start"], -span["duration"]))
+    origin = spans[0]["start"] if spans else 0
+    lanes = _assign_lanes(spans)
+    events = []
+    for span in spans:
+        args = dict(span.get("attributes") or {})
+        args["span_id"] = span["span_id"]
+        args["parent_id"] = span["parent_id"]
+        if span.get("error"):
+            args["error"] = span["error"]
+        events.append({
+            "name": span["name"],
+            "cat": span["kind"],
+            "ph": "X",
+            "ts": round((span["start"] - origin) * 1e6),
+            "dur": round(span["duration"] * 1e6),
+            "pid": data.get("job_id", "job"),
+            "tid": lanes[span["span_id"]],
+            "args": args,
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def _assign_lanes(spans: List[Dict[str, Any]]) -> Dict[str, int]:
+    """为每个span分配显示行：同一行中的span必须完全嵌套，优先放在父span所在的行
+
+    参数:
+        spans: 按开始时间排序的span列表
+    """
+    stacks: List[List[Dict[str, Any]]] = []
+    lanes: Dict[str, int] = {}
+    for span in spans:
+        end = span["start"] + span["duration"]
+        parent_lane = lanes.get(span["parent_id"])
+        order = ([parent_lane] if parent_lane is not None else []) + list(range(len(stacks)))
+        for lane in order:
+            stack = stacks[lane]
+            while stack and stack[-1]["start"] + stack[-1]["duration"] <= span["start"]:
+                stack.pop()
+            if not stack or end <= stack[-1]["start"] + stack[-1]["duration"]:
+                break
+        else:
+            stacks.append([])
+            lane = len(stacks) - 1
+        stacks[lane].append(span)
+        lanes[span["span_id"]] = lane
+    return lanes
+
+
+# 当前协程上下文中的追踪记录和正在执行的span，asyncio任务和asyncio.to_thread都会继承
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def is_enabled() -> bool:
+    return config.get_bool("tracing.enabled", True)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", activate: bool = True, **attributes: Any) -> Iterator[Optional[Span]]:
+    """记录代码块的span，不在任务追踪中执行时返回None
+
+    用法:
+        with span("arxiv.search", "io", query=query) as s:
+            papers = ...
+            if s: s.set(paper_count=len(papers))
+
+    参数:
+        activate: 是否把该span设为代码块内新建span的父span；在异步生成器中使用时应设为False，
+            生成器可能在其他上下文中被关闭，无法还原上下文变量
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = current_span.get()
+    record = Span(name, kind, parent.span_id if parent else None, attributes)
+    token = current_span.set(record) if activate else None
+    try:
+        yield record
+    except GeneratorExit:
+        # 调用方提前结束了流式读取，不算错误
+        raise
+    except BaseException as e:
+        record.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record.end = time.time()
+        if token is not None:
+            current_span.reset(token)
+        trace.add(record)
+
+
+def traced_node(name: str, error_field: Optional[str] = None) -> Callable:
+    """LangGraph节点装饰器：为节点记录span，节点内部捕获的错误（写入state的error字段）记为span的error
+
+    参数:
+        error_field: state中该节点的错误字段名，默认为 `<节点函数名>_error`
+    """
+    def decorator(node: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        field = error_field or f"{node.__name__}_error"
+
+        @functools.wraps(node)
+        async def wrapper(state, *args, **kwargs):
+            with span(name, "node") as record:
+                result = await node(state, *args, **kwargs)
+                if record is not None:
+                    value = result.get("value") if isinstance(result, dict) else None
+                    error = getattr(getattr(value, "error", None), field, None)
+                    if error:
+                        record.error = error
+                    if getattr(value, "search_results", None):
+                        record.set(paper_count=len(value.search_results))
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def job_trace(job_id: Optional[str]) -> Iterator[Optional[Trace]]:
+    """在代码块中记录任务的追踪，结束后保存；未启用追踪或没有job_id时不记录"""
+    if not is_enabled() or job_id is None:
+        yield None
+        return
+    trace = Trace(job_id)
+    token = current_trace.set(trace)
+    try:
+        with span("job", "job", job_id=job_id):
+            yield trace
+    finally:
+        current_trace.reset(token)
+        try:
+            path = trace.save()
+            logger.info(f"任务追踪已保存: {path}, 共 {len(trace.spans)} 个span")
+        except Exception as e:
+            logger.warning(f"保存任务追踪失败: {e}")
@@ -0,0 +1,270 @@
+import asyncio
+import time
+from typing import Optional
+
+import arxiv
+import pytest
+from aiohttp import web
+
+from src.core.config import config
+from src.services import arxiv_client
+from src.services.arxiv_client import ArxivRequestError, AsyncArxivClient, _SharedTokenBucket, _TokenBucket
+from src.services.paper_store import PaperStore
+from src.tasks import paper_search
+from src.tasks.paper_search import PaperSearcher
+
+TOTAL = 23
+
+ENTRY = """
+  <entry>
+    <id>http://arxiv.org/abs/2401.{index:05d}v1</id>
+    <updated>2024-01-02T00:00:00Z</updated>
+    <published>2024-01-01T00:00:00Z</published>
+    <title>Paper {index}</title>
+    <summary>Summary of paper {index}</summary>
+    <author><name>Author {index}</name></author>
+    <link href="http://arxiv.org/abs/2401.{index:05d}v1" rel="alternate" type="text/html"/>
+    <link title="pdf" href="http://arxiv.org/pdf/2401.{index:05d}v1" rel="related" type="application/pdf"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>"""
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">
+  <title>ArXiv Query</title>
+  <id>http://arxiv.org/api/test</id>
+  <updated>2024-01-02T00:00:00Z</updated>
+  <opensearch:totalResults>{total}</opensearch:totalResults>
+  <opensearch:startIndex>{start}</opensearch:startIndex>
+  <opensearch:itemsPerPage>{size}</opensearch:itemsPerPage>{entries}
+</feed>"""
+
+
+class FeedServer:
+    """本地的arXiv API替身：按start/max_results分页返回Atom结果，记录请求和并发数"""
+
+    def __init__(self, latency: float = 0.05, fail_first: int = 0, fail_status: int = 503, retry_after: Optional[str] = None):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.requests = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests.append(dict(request.query))
+        if self.fail_first > 0:
+            self.fail_first -= 1
+            headers = {"Retry-After": self.retry_after} if self.retry_after else None
+            return web.Response(status=self.fail_status, headers=headers)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        start, size = int(request.query["start"]), int(request.query["max_results"])
+        entries = "".join(ENTRY.format(index=i) for i in range(start, min(start + size, TOTAL)))
+        body = FEED.format(total=TOTAL, start=start, size=size, entries=entries)
+        return web.Response(text=body, content_type="application/atom+xml")
+
+    async def __aenter__(self) -> str:
+        app = web.Application()
+        app.router.add_get("/api/query", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/api/query"
+
+    async def __aexit__(self, *exc) -> None:
+        await self.runner.cleanup()
+
+
+@pytest.fixture(autouse=True)
+def limiter(monkeypatch):
+    """每个测试使用自己的进程内令牌桶，不读写任务队列数据库"""
+    bucket = _TokenBucket()
+    monkeypatch.setattr(arxiv_client, "get_limiter", lambda: bucket)
+    return bucket
+
+
+def _client(base_url: str, **kwargs) -> AsyncArxivClient:
+    kwargs.setdefault("delay_seconds", 0)
+    kwargs.setdefault("backoff_base_seconds", 0.01)
+    return AsyncArxivClient(page_size=5, base_url=base_url, max_concurrent_pages=3, **kwargs)
+
+
+def test_pages_are_fetched_concurrently_and_yielded_in_order():
+    server = FeedServer()
+
+    async def main():
+        async with server as base_url:
+            search = arxiv.Search(query="all:llm", max_results=TOTAL)
+            return [result.get_short_id() async for result in _client(base_url).results(search)]
+
+    ids = asyncio.run(main())
+    assert ids == [f"2401.{i:05d}v1" for i in range(TOTAL)]
+    assert sorted(int(r["start"]) for r in server.requests) == [0, 5, 10, 15, 20]
+    assert server.requests[0]["search_query"] == "all:llm"
+    # 第一页之后的各页并发请求
+    assert server.peak > 1
+
+
+def test_search_does_not_block_event_loop():
+    server = FeedServer(latency=0.2)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        async with server as base_url:
+            task = asyncio.create_task(ticker())
+            search = arxiv.Search(query="all:llm", max_results=10)
+            results = [result async for result in _client(base_url).results(search)]
+            task.cancel()
+            return results
+
+    assert len(asyncio.run(main())) == 10
+    # 等待arXiv响应期间其他协程照常运行
+    assert len(ticks) > 20
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+
+
+def test_retries_and_max_results():
+    server = FeedServer(fail_first=1)
+
+    async def main():
+        async with server as base_url:
+            search = arxiv.Search(query="all:llm", max_results=7)
+            return [result async for result in _client(base_url, num_retries=2).results(search)]
+
+    results = asyncio.run(main())
+    assert len(results) == 7
+    # 第一次请求返回503后重试；第二页只请求剩余的2篇
+    assert [r["max_results"] for r in server.requests] == ["5", "5", "2"]
+
+
+def test_token_bucket_spaces_requests_and_pauses():
+    async def main():
+        bucket = _TokenBucket()
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire(0.05)
+        spaced = time.monotonic() - start
+        await bucket.pause(0.1)
+        start = time.monotonic()
+        await bucket.acquire(0)
+        return spaced, time.monotonic() - start
+
+    spaced, paused = asyncio.run(main())
+    # 令牌桶初始是满的，之后每0.05秒一个令牌
+    assert 0.14 < spaced < 0.4
+    assert paused >= 0.09
+
+
+def test_shared_token_bucket_paces_across_processes(tmp_path):
+    async def main():
+        # 两个实例代表两个worker进程，状态只通过数据库共享
+        first, second = _SharedTokenBucket(tmp_path / "jobs.db"), _SharedTokenBucket(tmp_path / "jobs.db")
+        start = time.monotonic()
+        await asyncio.gather(*(bucket.acquire(0.05) for bucket in (first, second, first, second)))
+        spaced = time.monotonic() - start
+        # 暂停的截止时间在线程中计算，从调用pause之前开始计时
+        start = time.monotonic()
+        await first.pause(0.1)
+        await second.acquire(0)
+        return spaced, time.monotonic() - start
+
+    spaced, paused = asyncio.run(main())
+    # 每次预占都要读写数据库，上限放宽一些
+    assert 0.14 < spaced < 1.0
+    assert paused >= 0.09
+
+
+def test_throttling_without_retry_after_pauses_all_requests(limiter):
+    server = FeedServer(fail_first=1, fail_status=429)
+    pauses = []
+    pause = limiter.pause
+
+    async def record_pause(seconds):
+        pauses.append(seconds)
+        await pause(seconds)
+
+    limiter.pause = record_pause
+
+    async def main():
+        async with server as base_url:
+            search = arxiv.Search(query="all:llm", max_results=3)
+            return [result async for result in _client(base_url, num_retries=2).results(search)]
+
+    assert len(asyncio.run(main())) == 3
+    # 没有Retry-After时按第一次重试的退避上限暂停
+    assert pauses == [0.01]
+
+
+def test_throttling_is_retried_and_client_errors_are_not():
+    throttled = FeedServer(fail_first=2, fail_status=429, retry_after="0.1")
+    missing = FeedServer(fail_first=1, fail_status=400)
+
+    async def main():
+        search = arxiv.Search(query="all:llm", max_results=3)
+        async with throttled as base_url:
+            start = time.monotonic()
+            results = [result async for result in _client(base_url, num_retries=3).results(search)]
+            elapsed = time.monotonic() - start
+        async with missing as base_url:
+            try:
+                [result async for result in _client(base_url, num_retries=3).results(search)]
+            except ArxivRequestError:
+                pass
+            else:
+                raise AssertionError("4xx应直接失败")
+        return results, elapsed
+
+    results, elapsed = asyncio.run(main())
+    assert len(results) == 3 and len(throttled.requests) == 3
+    # 429带Retry-After时至少等待该时间后重试
+    assert elapsed >= 0.2
+    assert len(missing.requests) == 1
+
+
+def test_identical_concurrent_searches_share_requests():
+    server = FeedServer()
+
+    async def main():
+        async with server as base_url:
+            async def run():
+                search = arxiv.Search(query="all:llm", max_results=TOTAL)
+                return [result.get_short_id() async for result in _client(base_url).results(search)]
+
+            return await asyncio.gather(run(), run(), run())
+
+    first, second, third = asyncio.run(main())
+    assert first == second == third and len(first) == TOTAL
+    # 三个并发的相同检索只向arXiv请求一次各页
+    assert sorted(int(r["start"]) for r in server.requests) == [0, 5, 10, 15, 20]
+
+
+def test_paper_searcher_streams_from_async_client(monkeypatch, tmp_path):
+    server = FeedServer()
+
+    async def main():
+        async with server as base_url:
+            overrides = {"arxiv.base-url": base_url, "arxiv.delay-seconds": 0}
+            get = config.get
+            monkeypatch.setattr(config, "get", lambda key, default=None: overrides.get(key, get(key, default)))
+            monkeypatch.setattr(paper_search, "get_paper_store", lambda: PaperStore(tmp_path / "papers.db"))
+            searcher = PaperSearcher()
+            streamed = [paper async for paper in searcher.iter_papers(["llm"], max_results=12, page_size=5)]
+            return streamed, await searcher.search_papers(["llm"], max_results=3)
+
+    streamed, papers = asyncio.run(main())
+    assert [paper["paper_id"] for paper in streamed] == [f"2401.{i:05d}v1" for i in range(12)]
+    assert streamed[0]["title"] == "Paper 0" and streamed[0]["primary_category"] == "cs.CL"
+    assert len(papers) == 3
@@ -0,0 +1,95 @@
+import asyncio
+
+import src.agents.reading_agent as reading_agent
+import src.agents.search_agent as search_agent
+from src.agents.orchestrator import PaperAgentOrchestrator
+from src.agents.reading_agent import ExtractedPaperData
+from src.agents.search_agent import SearchQuery
+import src.services.batch_research as batch_research
+from src.services.batch_research import BatchResearch, base_arxiv_id, dedupe_papers
+from src.services.job_queue import SqliteJobQueue
+from src.services.job_registry import JobRegistry
+from src.services.paper_store import PaperStore
+from src.services.stage_cache import StageCache
+from src.tasks import paper_filter, paper_search
+from src.tasks.paper_filter import candidate_count
+
+
+def test_dedupe_keeps_latest_version():
+    unique = dedupe_papers([
+        [{"paper_id": "2401.00001v1"}, {"paper_id": "2401.00002v1"}],
+        [{"paper_id": "2401.00001v3"}, {"paper_id": "2401.00003"}],
+    ])
+    assert list(unique) == ["2401.00001", "2401.00002", "2401.00003"]
+    assert unique["2401.00001"]["paper_id"] == "2401.00001v3"
+    assert base_arxiv_id("hep-th/9901001v2") == "hep-th/9901001"
+
+
+class FakeReadAgent:
+    tasks = []
+
+    async def run(self, task, cancellation_token=None):
+        self.tasks.append(task)
+
+        class Result:
+            messages = [type("Message", (), {"content": ExtractedPaperData(core_problem=task)})()]
+        return Result()
+
+
+class FakeChromaClient:
+    def upsert_documents(self, documents, ids, metadatas=None):
+        pass
+
+
+def test_overlapping_requests_read_each_paper_once(monkeypatch, tmp_path):
+    results = {
+        "a": [{"paper_id": "2401.00001v1"}, {"paper_id": "2401.00002v1"}],
+        "b": [{"paper_id": "2401.00002v1"}, {"paper_id": "2401.00003v1"}],
+    }
+
+    async def fake_generate_search_query(state, state_queue, cancellation_token=None):
+        return SearchQuery(querys=[state.user_request])
+
+    requested = []
+
+    async def fake_search_papers_cached(search_query, max_results):
+        requested.append(max_results)
+        return results[search_query.querys[0]]
+
+    async def fake_run_from(self, state, entry_node, budget=None):
+        assert entry_node == "analyse_node"
+        assert budget is not None and budget.max_papers == 2
+        state.report_markdown = "# " + ",".join(paper.core_problem for paper in state.extracted_data.papers)
+        return state
+
+    monkeypatch.setattr(search_agent, "generate_search_query", fake_generate_search_query)
+    monkeypatch.setattr(search_agent, "search_papers_cached", fake_search_papers_cached)
+    monkeypatch.setattr(paper_filter, "is_enabled", lambda: False)
+    monkeypatch.setattr(reading_agent, "get_read_agent", lambda: FakeReadAgent())
+    monkeypatch.setattr(reading_agent, "ChromaClient", FakeChromaClient)
+    monkeypatch.setattr(reading_agent, "get_stage_cache", lambda: StageCache(tmp_path / "cache.db", enabled=False))
+    monkeypatch.setattr(PaperAgentOrchestrator, "run_from", fake_run_from)
+    # 论文库中已有2401.00002的更新版本
+    store = PaperStore(tmp_path / "papers.db", enabled=True)
+    store.upsert_many([{"paper_id": "2401.00001v1"}, {"paper_id": "2401.00002v2"}, {"paper_id": "2401.00003v1"}])
+    monkeypatch.setattr(batch_research, "get_paper_store", lambda: store)
+    monkeypatch.setattr(paper_search, "get_paper_store", lambda: store)
+
+    queue = SqliteJobQueue(tmp_path / "jobs.db")
+
+    async def main():
+        batch = BatchResearch(queue, JobRegistry(), budget={"max_papers": 2})
+        jobs = batch.submit(["a", "b"])
+        return jobs, await batch.wait(jobs)
+
+    jobs, states = asyncio.run(main())
+    # 与单个请求一样：预算限制论文数，并按candidate_count检索候选论文
+    assert requested == [candidate_count(2)] * 2
+    assert len(FakeReadAgent.tasks) == 3
+    # 合并后按id从论文库读取，阅读已知的最新版本
+    assert sum("2401.00002v2" in task for task in FakeReadAgent.tasks) == 1
+    assert [len(state.extracted_data.papers) for state in states] == [2, 2]
+    for job in jobs:
+        row = queue.get(job.job_id)
+        assert row["status"] == "finished"
+        assert row["report_markdown"].startswith("# ")
@@ -0,0 +1,69 @@
+import asyncio
+
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import END, START, StateGraph
+
+from src.core.state_models import (ExtractedPaperData, ExtractedPapersData, KeyMethodology,
+                                   NodeError, PaperAgentState, State)
+from src.services.checkpoint_store import StateSerializer, find_resume_config, thread_config
+
+
+def test_serializer_keeps_nested_models():
+    paper = ExtractedPaperData(
+        paper_id="2401.00001", core_problem="p",
+        key_methodology=KeyMethodology(name="m", principle="p", novelty="n"),
+        datasets_used=[], evaluation_metrics=[], main_results="r", limitations="l", contributions=[],
+    )
+    state = PaperAgentState(user_request="q", error=NodeError(), extracted_data=ExtractedPapersData(papers=[paper]))
+    serde = StateSerializer()
+    restored = serde.loads_typed(serde.dumps_typed(state))
+    assert isinstance(restored.extracted_data, ExtractedPapersData)
+    assert restored.extracted_data.papers[0].key_methodology.name == "m"
+
+
+def test_resume_skips_completed_nodes(tmp_path):
+    calls = []
+    failures = {"second": True}
+
+    async def first(state: State):
+        calls.append("first")
+        value = state["value"]
+        value.search_results = [{"paper_id": "a"}]
+        return {"value": value}
+
+    async def second(state: State):
+        calls.append("second")
+        if failures["second"]:
+            raise RuntimeError("boom")
+        value = state["value"]
+        value.report_markdown = "done"
+        return {"value": value}
+
+    builder = StateGraph(State)
+    builder.add_node("first", first)
+    builder.add_node("second", second)
+    builder.add_edge(START, "first")
+    builder.add_edge("first", "second")
+    builder.add_edge("second", END)
+
+    async def main():
+        async with aiosqlite.connect(tmp_path / "checkpoints.db") as conn:
+            # 与流水线一致：共享编译好的图，每次运行浅拷贝并绑定检查点连接
+            graph = builder.compile().copy(update={"checkpointer": AsyncSqliteSaver(conn, serde=StateSerializer())})
+            initial = {"value": PaperAgentState(user_request="q", error=NodeError())}
+            try:
+                await graph.ainvoke(initial, thread_config("job"))
+            except RuntimeError:
+                pass
+
+            failures["second"] = False
+            resume = await find_resume_config(graph, "job")
+            assert resume is not None
+            result = await graph.ainvoke(None, resume)
+            assert result["value"].report_markdown == "done"
+            assert result["value"].search_results == [{"paper_id": "a"}]
+            assert await find_resume_config(graph, "job") is None
+
+    asyncio.run(main())
+    assert calls == ["first", "second", "second"]
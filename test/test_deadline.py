@@ -0,0 +1,91 @@
+import asyncio
+
+from src.core import deadline
+from src.core.run_budget import RunBudget, budgeted_node, current_budget
+from src.core.state_models import NodeError, PaperAgentState
+
+
+def _budget_at(remaining: float) -> RunBudget:
+    """构造剩余时间比例为remaining的预算"""
+    budget = RunBudget(max_seconds=100, grace_ratio=1.5)
+    budget.started_at -= 100 * (1 - remaining)
+    return budget
+
+
+def _with_budget(budget, func, *args):
+    token = current_budget.set(budget)
+    try:
+        return func(*args)
+    finally:
+        current_budget.reset(token)
+
+
+def test_degradations_follow_remaining_time():
+    # 没有截止时间时不做任何限制
+    assert deadline.reading_paper_cap(20) == 20
+    assert _with_budget(RunBudget(), deadline.reading_paper_cap, 20) == 20
+
+    budget = _budget_at(0.9)
+    assert _with_budget(budget, deadline.reading_paper_cap, 20) == 20
+    assert _with_budget(budget, deadline.max_section_revisions) is None
+
+    budget = _budget_at(0.6)
+    assert _with_budget(budget, deadline.reading_paper_cap, 20) == 12
+    assert _with_budget(budget, deadline.reading_paper_cap, 6) == 5
+    assert not _with_budget(budget, deadline.skip_deep_analysis, 2)
+    assert [d["action"] for d in budget.degradations] == ["reduce_papers"]
+
+    budget = _budget_at(0.35)
+    assert _with_budget(budget, deadline.skip_deep_analysis, 2)
+    assert not _with_budget(budget, deadline.skip_deep_analysis, 5)
+    assert _with_budget(budget, deadline.max_section_revisions) == 1
+    assert _with_budget(budget, deadline.reading_cutoff_reached, 5)
+    assert not _with_budget(budget, deadline.reading_cutoff_reached, 2)
+
+
+def test_deadline_is_soft_until_grace_period():
+    budget = _budget_at(-0.2)
+    assert budget.remaining_ratio() == 0
+    budget.check()
+    budget.started_at -= 40
+    assert "时间预算" in budget.exceeded_reason()
+
+
+def test_rank_by_relevance_keeps_most_relevant():
+    papers = [
+        {"paper_id": "a", "title": "Protein folding", "summary": "biology"},
+        {"paper_id": "b", "title": "LLM agents for autonomous driving", "summary": "planning"},
+        {"paper_id": "c", "title": "Driving simulators", "summary": "LLM evaluation"},
+    ]
+    ranked = deadline.rank_by_relevance(papers, "LLM autonomous driving")
+    assert [paper["paper_id"] for paper in ranked] == ["b", "c", "a"]
+    # 相关性筛选已经打过分时沿用筛选的排序
+    ranked = deadline.rank_by_relevance(papers, "LLM autonomous driving", {"a": 3.0, "b": 1.0, "c": 2.0})
+    assert [paper["paper_id"] for paper in ranked] == ["a", "c", "b"]
+
+
+def test_node_degradations_are_recorded_in_state():
+    @budgeted_node("analyse")
+    async def analyse_node(state):
+        deadline.record("skip_deep_analysis", "1/3 个小聚类跳过深度分析")
+        deadline.record("skip_deep_analysis", "重复记录")
+        assert deadline.output_degraded()
+        return state
+
+    @budgeted_node("writing")
+    async def writing_node(state):
+        assert not deadline.output_degraded()
+        return state
+
+    async def main():
+        budget = _budget_at(0.4)
+        token = current_budget.set(budget)
+        try:
+            state = {"value": PaperAgentState(user_request="q", error=NodeError())}
+            state = await analyse_node(state)
+            return await writing_node(state)
+        finally:
+            current_budget.reset(token)
+
+    state = asyncio.run(main())
+    assert [(d["stage"], d["action"]) for d in state["value"].degradations] == [("analyse", "skip_deep_analysis")]
@@ -0,0 +1,98 @@
+import asyncio
+
+import arxiv
+
+from src.services.paper_store import PaperStore
+from src.tasks import paper_search
+from src.tasks.deduplicator import reciprocal_rank_fusion
+from src.tasks.paper_search import PaperSearcher
+
+
+def _papers(*paper_ids):
+    return [{"paper_id": paper_id, "title": paper_id} for paper_id in paper_ids]
+
+
+def test_rrf_prefers_papers_found_by_several_queries():
+    merged = reciprocal_rank_fusion([
+        _papers("2401.00001v1", "2401.00002v1", "2401.00003v1"),
+        _papers("2401.00004v1", "2401.00002v2", "2401.00001v1"),
+    ])
+    # 两个查询都命中的论文排在前面，同一篇论文只保留最新版本
+    assert [paper["paper_id"] for paper in merged] == ["2401.00001v1", "2401.00002v2", "2401.00004v1", "2401.00003v1"]
+
+    # 同一列表中的多个版本只按最靠前的排名计分
+    merged = reciprocal_rank_fusion([_papers("2401.00005v1", "2401.00005v2", "2401.00006v1"), _papers("2401.00006v1")], limit=1)
+    assert [paper["paper_id"] for paper in merged] == ["2401.00006v1"]
+
+
+def test_fan_out_runs_each_query_with_its_own_budget(monkeypatch, tmp_path):
+    rankings = {
+        "llm": ["2401.00001v2", "2401.00002v1", "2401.00003v1"],
+        "agent": ["2401.00002v1", "2401.00001v1", "2401.00004v1"],
+        "driving": [],
+    }
+    searches = []
+
+    class FakeResult:
+        def __init__(self, paper_id):
+            self.paper_id = paper_id
+
+    class FakeClient:
+        def __init__(self, page_size=None):
+            pass
+
+        async def results(self, search: arxiv.Search):
+            searches.append((search.query, search.max_results))
+            query = next(key for key in rankings if key in search.query)
+            await asyncio.sleep(0)
+            for paper_id in rankings[query][:search.max_results]:
+                yield FakeResult(paper_id)
+
+    monkeypatch.setattr(paper_search, "AsyncArxivClient", FakeClient)
+    monkeypatch.setattr(paper_search, "get_paper_store", lambda: PaperStore(tmp_path / "papers.db"))
+    monkeypatch.setattr(PaperSearcher, "_parse_paper_result", lambda self, result: {"paper_id": result.paper_id})
+
+    async def main():
+        searcher = PaperSearcher()
+        papers = await searcher.search_papers(["llm", "agent", "driving"], max_results=3, fan_out=True)
+        streamed = [paper async for paper in searcher.iter_papers(["llm", "agent"], max_results=3, fan_out=True)]
+        return papers, streamed
+
+    papers, streamed = asyncio.run(main())
+    assert [paper["paper_id"] for paper in papers] == ["2401.00001v2", "2401.00002v1"]
+    assert [paper["paper_id"] for paper in streamed] == ["2401.00001v2", "2401.00002v1", "2401.00003v1"]
+    # 每个关键词单独检索，各自最多 3 * 2 / 3 = 2 篇
+    assert sorted(searches[:3]) == sorted([(f"all:%22{q}%22", 2) for q in ("llm", "agent", "driving")])
+
+
+def test_streamed_fan_out_yields_before_slow_queries_finish(monkeypatch, tmp_path):
+    timeline = []
+
+    class FakeResult:
+        def __init__(self, paper_id):
+            self.paper_id = paper_id
+
+    class FakeClient:
+        def __init__(self, page_size=None):
+            pass
+
+        async def results(self, search: arxiv.Search):
+            slow = "slow" in search.query
+            for i in range(2):
+                await asyncio.sleep(0.2 if slow else 0.01)
+                yield FakeResult(f"2401.{'9' if slow else '1'}000{i}v1")
+            timeline.append(f"done-{'slow' if slow else 'fast'}")
+
+    monkeypatch.setattr(paper_search, "AsyncArxivClient", FakeClient)
+    monkeypatch.setattr(paper_search, "get_paper_store", lambda: PaperStore(tmp_path / "papers.db"))
+    monkeypatch.setattr(PaperSearcher, "_parse_paper_result", lambda self, result: {"paper_id": result.paper_id})
+
+    async def main():
+        async for paper in PaperSearcher().iter_papers(["fast", "slow"], max_results=4, fan_out=True):
+            timeline.append(paper["paper_id"])
+
+    asyncio.run(main())
+    # 快的关键词的结果在慢的关键词检索完成前就已返回
+    assert timeline.index("2401.10000v1") < timeline.index("done-slow")
+    assert timeline.index("2401.10001v1") < timeline.index("2401.90000v1")
+    assert sorted(paper_id for paper_id in timeline if paper_id.startswith("2401")) == ["2401.10000v1", "2401.10001v1", "2401.90000v1", "2401.90001v1"]
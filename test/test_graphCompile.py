@@ -0,0 +1,36 @@
+import time
+
+from src.agents.orchestrator import PaperAgentOrchestrator, get_compiled_graph
+from src.agents.writing_agent import WritingWorkflow, get_writing_graph
+
+
+def test_graphs_are_compiled_once_per_process():
+    assert get_compiled_graph() is get_compiled_graph()
+    assert get_writing_graph() is get_writing_graph()
+    # 绑定检查点只浅拷贝，不影响共享的图
+    copied = get_compiled_graph().copy(update={"checkpointer": None})
+    assert copied is not get_compiled_graph()
+    assert copied.nodes.keys() == get_compiled_graph().nodes.keys()
+
+
+def bench(fn, rounds: int) -> float:
+    """返回单次调用的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+if __name__ == "__main__":
+    # 每个请求的图准备开销：python -m test.test_graphCompile
+    rounds = 50
+    get_compiled_graph()
+    get_writing_graph()
+    results = [
+        ("主流水线: 每次请求重新编译", bench(PaperAgentOrchestrator._build_graph, rounds)),
+        ("主流水线: 进程内缓存 + 绑定检查点", bench(lambda: get_compiled_graph().copy(update={"checkpointer": None}), rounds)),
+        ("写作子图: 每次运行重新编译", bench(lambda: WritingWorkflow().workflow, rounds)),
+        ("写作子图: 进程内缓存", bench(get_writing_graph, rounds)),
+    ]
+    for name, ms in results:
+        print(f"{name:<32}{ms:>10.3f} ms")
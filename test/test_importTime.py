@@ -0,0 +1,34 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# 导入流水线模块的总耗时预算（微秒），主要开销应只剩langgraph等必须的依赖
+IMPORT_BUDGET_US = 3_000_000
+
+# 这些依赖只应在首次使用时导入
+LAZY_MODULES = ("sklearn", "chromadb", "autogen_ext.models.openai", "sqlalchemy")
+
+
+def import_times(module: str) -> dict:
+    """用python -X importtime导入模块，返回 {模块名: 累计耗时(微秒)}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_orchestrator_import_is_lazy():
+    times = import_times("src.agents.orchestrator")
+    eager = [name for name in times if any(name == lazy or name.startswith(lazy + ".") for lazy in LAZY_MODULES)]
+    assert eager == []
+    assert times["src.agents.orchestrator"] < IMPORT_BUDGET_US
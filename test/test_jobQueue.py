@@ -0,0 +1,135 @@
+import asyncio
+import sqlite3
+
+from src.core.state_models import BackToFrontData, ExecutionState
+from src.services.job_queue import SqliteJobQueue
+from src.services.job_registry import JobRegistry
+from src.services.job_worker import relay_job_events
+
+
+def test_claim_respects_priority_and_is_exclusive(tmp_path):
+    queue = SqliteJobQueue(tmp_path / "jobs.db")
+    queue.enqueue("low", "q1", priority=5)
+    queue.enqueue("high", "q2", priority=0)
+    assert queue.position("low") == 2
+    assert queue.claim("w1")["job_id"] == "high"
+    assert queue.claim("w2")["job_id"] == "low"
+    assert queue.claim("w3") is None
+    assert queue.get("high")["worker_id"] == "w1"
+
+
+def test_cancel_pending_job_and_requeue_running(tmp_path):
+    queue = SqliteJobQueue(tmp_path / "jobs.db")
+    queue.enqueue("a", "q")
+    queue.enqueue("b", "q")
+    queue.request_cancel("a")
+    assert queue.get("a")["status"] == "cancelled"
+    assert queue.claim("w1")["job_id"] == "b"
+    assert queue.requeue_running() == 1
+    assert queue.get("b")["status"] == "pending"
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(tmp_path):
+    queue = SqliteJobQueue(tmp_path / "jobs.db")
+    queue.enqueue("a", "q")
+    queue.enqueue("b", "q")
+    queue.enqueue("inline", "q", status="running")
+    assert queue.claim("w1", lease_seconds=60)["job_id"] == "a"
+    assert queue.claim("w2", lease_seconds=60)["job_id"] == "b"
+    queue.append_events("a", [BackToFrontData(step=ExecutionState.SEARCHING, state="initializing", data=None, seq=1)])
+    queue.request_cancel("b")
+    with sqlite3.connect(tmp_path / "jobs.db") as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at = heartbeat_at - 120")
+
+    # w1续租时租约仍在，过期后才由其他worker领取
+    assert queue.heartbeat("a", "w1")
+    assert queue.claim("w3", lease_seconds=60) is None
+    with sqlite3.connect(tmp_path / "jobs.db") as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at = heartbeat_at - 120")
+    assert queue.claim("w3", lease_seconds=60)["job_id"] == "a"
+    assert queue.fetch_events("a") == []
+    assert not queue.heartbeat("a", "w1")
+    assert queue.heartbeat("a", "w3")
+    # 已请求取消的任务不再执行，API进程内执行的任务不受租约影响
+    assert queue.get("b")["status"] == "cancelled"
+    assert queue.get("inline")["status"] == "running"
+
+
+def test_relay_requests_cancel_off_the_event_loop(tmp_path, monkeypatch):
+    import threading
+
+    queue = SqliteJobQueue(tmp_path / "jobs.db")
+    threads, job_ids = [], []
+    request_cancel = queue.request_cancel
+    monkeypatch.setattr(queue, "request_cancel", lambda job_id: threads.append(threading.current_thread()) or request_cancel(job_id))
+
+    async def main():
+        registry = JobRegistry(queue_size=100)
+        job = registry.create_job("q")
+        queue.enqueue(job.job_id, "q")
+        job_ids.append(job.job_id)
+        registry.start(job, relay_job_events(queue, job, poll_interval=0.01))
+        await asyncio.sleep(0.05)
+        registry.cancel(job.job_id)
+        await asyncio.gather(job.task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert threads and threads[0] is not threading.main_thread()
+    assert queue.get(job_ids[0])["status"] == "cancelled"
+
+
+def test_relay_forwards_worker_events(tmp_path):
+    async def main():
+        queue = SqliteJobQueue(tmp_path / "jobs.db")
+        registry = JobRegistry(queue_size=100)
+        job = registry.create_job("q")
+        queue.enqueue(job.job_id, "q")
+        queue.append_events(job.job_id, [
+            BackToFrontData(step=ExecutionState.SEARCHING, state="initializing", data=None, seq=1),
+            BackToFrontData(step=ExecutionState.FINISHED, state="finished", data=None, seq=2),
+        ])
+        registry.start(job, relay_job_events(queue, job, poll_interval=0.01))
+        await asyncio.wait_for(job.task, 1)
+        events = job.channel.events_after(0)
+        assert [event.step for event in events] == [ExecutionState.SEARCHING, ExecutionState.FINISHED]
+
+    asyncio.run(main())
+
+
+def test_finish_persists_report_and_step(tmp_path):
+    queue = SqliteJobQueue(tmp_path / "jobs.db")
+    queue.enqueue("a", "q", status="running")
+    queue.append_events("a", [BackToFrontData(step=ExecutionState.WRITING, state="generating", data="x", seq=1)])
+    assert queue.get("a")["current_step"] == ExecutionState.WRITING
+    queue.finish("a", "finished", report_markdown="# 报告")
+    row = SqliteJobQueue(tmp_path / "jobs.db").get("a")
+    assert row["status"] == "finished"
+    assert row["report_markdown"] == "# 报告"
+    assert row["current_step"] == ExecutionState.WRITING
+
+
+def test_prune_deletes_expired_jobs_with_their_events(tmp_path, monkeypatch):
+    from src.services import checkpoint_store
+
+    monkeypatch.setattr(checkpoint_store, "get_db_path", lambda: tmp_path / "checkpoints.db")
+    with sqlite3.connect(tmp_path / "checkpoints.db") as conn:
+        conn.execute("CREATE TABLE checkpoints (thread_id TEXT, checkpoint_id TEXT)")
+        conn.execute("CREATE TABLE writes (thread_id TEXT, checkpoint_id TEXT)")
+        for thread_id in ("old", "new"):
+            conn.execute("INSERT INTO checkpoints VALUES (?, '1')", (thread_id,))
+            conn.execute("INSERT INTO writes VALUES (?, '1')", (thread_id,))
+    queue = SqliteJobQueue(tmp_path / "jobs.db")
+    for job_id in ("old", "new", "running"):
+        queue.enqueue(job_id, "q", status="running")
+        queue.append_events(job_id, [BackToFrontData(step=ExecutionState.SEARCHING, state="initializing", data=None, seq=1)])
+    queue.finish("old", "finished")
+    queue.finish("new", "finished")
+    with queue._connection() as conn:
+        conn.execute("UPDATE jobs SET finished_at = finished_at - 7200 WHERE job_id = 'old'")
+    assert queue.prune(3600) == 1
+    assert queue.get("old") is None and queue.fetch_events("old") == []
+    assert queue.get("new") is not None and len(queue.fetch_events("new")) == 1
+    assert queue.get("running")["status"] == "running"
+    with sqlite3.connect(tmp_path / "checkpoints.db") as conn:
+        assert [row[0] for row in conn.execute("SELECT thread_id FROM checkpoints")] == ["new"]
+        assert [row[0] for row in conn.execute("SELECT thread_id FROM writes")] == ["new"]
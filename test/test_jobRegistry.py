@@ -0,0 +1,138 @@
+import asyncio
+
+from src.core.state_models import BackToFrontData, ExecutionState
+from src.services.job_registry import EventChannel, JobRegistry, JobStatus
+
+
+async def collect(channel: EventChannel, last_seq: int = 0):
+    return [event async for event in channel.subscribe(last_seq)]
+
+
+def test_channel_assigns_seq_and_evicts_oldest():
+    async def main():
+        channel = EventChannel(maxsize=3)
+        for i in range(5):
+            await channel.put(BackToFrontData(step="searching", state="thinking", data=str(i)))
+        channel.close()
+        events = await collect(channel)
+        assert [event.seq for event in events] == [3, 4, 5]
+        assert [event.data for event in events] == ["2", "3", "4"]
+
+    asyncio.run(main())
+
+
+def test_channel_replays_from_last_seq_then_resumes_live():
+    async def main():
+        channel = EventChannel(maxsize=10)
+        for i in range(3):
+            channel.put_nowait(BackToFrontData(step="reading", state="thinking", data=str(i)))
+        received = []
+
+        async def consume():
+            async for event in channel.subscribe(last_seq=2):
+                received.append(event.seq)
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0)
+        channel.put_nowait(BackToFrontData(step=ExecutionState.FINISHED, state="finished", data=None))
+        channel.close()
+        await asyncio.wait_for(consumer, 1)
+        assert received == [3, 4]
+
+    asyncio.run(main())
+
+
+def test_jobs_have_isolated_channels():
+    async def main():
+        registry = JobRegistry(queue_size=10)
+        job_a = registry.create_job("a")
+        job_b = registry.create_job("b")
+        await job_a.channel.put(BackToFrontData(step="searching", state="initializing", data=None))
+        assert job_a.channel.qsize() == 1
+        assert job_b.channel.qsize() == 0
+
+    asyncio.run(main())
+
+
+def test_cancel_marks_job_and_notifies_subscribers():
+    async def main():
+        registry = JobRegistry(queue_size=10)
+        job = registry.create_job("q")
+        registry.start(job, asyncio.sleep(100))
+        await asyncio.sleep(0)
+        assert registry.cancel(job.job_id)
+        await asyncio.sleep(0.01)
+        assert job.status == JobStatus.CANCELLED
+        assert job.cancellation_token.is_cancelled()
+        events = await collect(job.channel)
+        assert events[-1].step == ExecutionState.FINISHED
+
+    asyncio.run(main())
+
+
+def test_channel_coalesces_chunks_within_step_and_state():
+    async def main():
+        channel = EventChannel(maxsize=100, coalesce_window_ms=50, coalesce_max_bytes=1024)
+        for token in ["正在", "思考"]:
+            await channel.put(BackToFrontData(step=ExecutionState.REPORTING, state="thinking", data=token))
+        for token in ["# 报告", "\n", "正文"]:
+            await channel.put(BackToFrontData(step=ExecutionState.REPORTING, state="generating", data=token))
+        await channel.put(BackToFrontData(step=ExecutionState.REPORTING, state="completed", data=None))
+        channel.close()
+        events = await collect(channel)
+        assert [(event.state, event.data) for event in events] == [
+            ("thinking", "正在思考"),
+            ("generating", "# 报告\n正文"),
+            ("completed", None),
+        ]
+
+    asyncio.run(main())
+
+
+def test_channel_flushes_coalesced_chunks_on_window_and_size():
+    async def main():
+        channel = EventChannel(maxsize=100, coalesce_window_ms=20, coalesce_max_bytes=4)
+        await channel.put(BackToFrontData(step=ExecutionState.ANALYZING, state="generating", data="ab"))
+        await channel.put(BackToFrontData(step=ExecutionState.ANALYZING, state="generating", data="cd"))
+        assert channel.last_seq == 1
+        await channel.put(BackToFrontData(step=ExecutionState.ANALYZING, state="generating", data="e"))
+        assert channel.last_seq == 1
+        await asyncio.sleep(0.05)
+        assert channel.last_seq == 2
+
+    asyncio.run(main())
+
+
+def test_concurrent_pipelines_do_not_cross_talk():
+    async def pipeline(channel, name):
+        for i in range(3):
+            await channel.put(BackToFrontData(step=ExecutionState.SEARCHING, state="initializing", data=f"{name}-{i}"))
+            await asyncio.sleep(0)
+
+    async def main():
+        registry = JobRegistry(queue_size=10)
+        jobs = [registry.create_job(name) for name in ("a", "b")]
+        for job in jobs:
+            registry.start(job, pipeline(job.channel, job.query))
+        await asyncio.gather(*(job.task for job in jobs))
+        for job in jobs:
+            assert job.status == JobStatus.FINISHED
+            assert [event.data for event in await collect(job.channel)] == [f"{job.query}-{i}" for i in range(3)]
+
+    asyncio.run(main())
+
+
+def test_cleanup_drops_finished_jobs_after_ttl():
+    async def main():
+        registry = JobRegistry(queue_size=10, ttl_seconds=60)
+        job = registry.create_job("q")
+        registry.start(job, asyncio.sleep(0))
+        await job.task
+        await asyncio.sleep(0)
+        registry.cleanup()
+        assert registry.get(job.job_id) is job
+        job.finished_at -= 120
+        registry.create_job("next")
+        assert registry.get(job.job_id) is None
+
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from src.core.state_models import ExecutionState
+from src.services.job_registry import JobRegistry
+from src.services.job_scheduler import JobScheduler, QueueFullError
+
+
+def test_scheduler_limits_concurrency_and_reports_positions():
+    async def main():
+        registry = JobRegistry(queue_size=100)
+        scheduler = JobScheduler(max_concurrent=1, max_queue_size=5)
+        release = asyncio.Event()
+        order = []
+
+        async def pipeline(name):
+            order.append(name)
+            await release.wait()
+
+        jobs = [registry.create_job(name) for name in "abc"]
+        for job in jobs:
+            registry.start(job, scheduler.run(job, pipeline(job.query)))
+        await asyncio.sleep(0.01)
+        assert (scheduler.running, scheduler.waiting) == (1, 2)
+        assert order == ["a"]
+
+        queued = [event for event in jobs[2].channel._buffer if event.step == ExecutionState.QUEUED]
+        assert queued[-1].data == {"position": 2, "queue_length": 2}
+
+        release.set()
+        await asyncio.gather(*(job.task for job in jobs))
+        assert order == ["a", "b", "c"]
+        assert (scheduler.running, scheduler.waiting) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_scheduler_orders_by_priority_and_rejects_when_full():
+    async def main():
+        registry = JobRegistry(queue_size=100)
+        scheduler = JobScheduler(max_concurrent=1, max_queue_size=2)
+        release = asyncio.Event()
+        order = []
+
+        async def pipeline(name):
+            order.append(name)
+            await release.wait()
+
+        for name, priority in [("first", 0), ("low", 5), ("high", 1)]:
+            job = registry.create_job(name)
+            registry.start(job, scheduler.run(job, pipeline(name), priority))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(QueueFullError):
+            scheduler.check_admission()
+
+        release.set()
+        await asyncio.sleep(0.05)
+        assert order == ["first", "high", "low"]
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def main():
+        registry = JobRegistry(queue_size=100)
+        scheduler = JobScheduler(max_concurrent=1, max_queue_size=5)
+        release = asyncio.Event()
+
+        running = registry.create_job("running")
+        waiting = registry.create_job("waiting")
+        registry.start(running, scheduler.run(running, release.wait()))
+        registry.start(waiting, scheduler.run(waiting, release.wait()))
+        await asyncio.sleep(0.01)
+        assert scheduler.waiting == 1
+
+        registry.cancel(waiting.job_id)
+        await asyncio.sleep(0.01)
+        assert scheduler.waiting == 0
+        release.set()
+        await running.task
+        assert scheduler.running == 0
+
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+import asyncio
+import gzip
+import json
+
+from src.services.local_index import LocalArxivIndex
+from src.tasks import paper_search
+from src.tasks.paper_search import PaperSearcher
+
+OAI = """<?xml version="1.0" encoding="UTF-8"?>
+<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">
+  <ListRecords>
+    <record>
+      <header><identifier>oai:arXiv.org:2403.00003</identifier></header>
+      <metadata>
+        <arXiv xmlns="http://arxiv.org/OAI/arXiv/">
+          <id>2403.00003</id>
+          <created>2024-03-01</created>
+          <authors><author><keyname>Zhang</keyname><forenames>Wei</forenames></author></authors>
+          <title>Retrieval Augmented
+            Generation for Agents</title>
+          <categories>cs.IR cs.CL</categories>
+          <abstract>Dense retrievers find documents.</abstract>
+        </arXiv>
+      </metadata>
+    </record>
+  </ListRecords>
+</OAI-PMH>"""
+
+
+def _record(arxiv_id, title, abstract, categories, created, versions=1):
+    return {
+        "id": arxiv_id,
+        "title": title,
+        "abstract": abstract,
+        "authors": "Alice Smith and Bob Lee",
+        "authors_parsed": [["Smith", "Alice", ""], ["Lee", "Bob", ""]],
+        "categories": categories,
+        "doi": None,
+        "versions": [{"version": f"v{i}", "created": created} for i in range(1, versions + 1)],
+    }
+
+
+def _build_index(tmp_path):
+    dump = tmp_path / "snapshot.json.gz"
+    with gzip.open(dump, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(_record("2401.00001", "Large Language Model Agents", "A survey of agents.", "cs.CL cs.AI", "Mon, 1 Jan 2024 10:00:00 GMT")) + "\n")
+        f.write(json.dumps(_record("2402.00002", "Autonomous Driving", "Planning with large language models.", "cs.RO", "Thu, 1 Feb 2024 10:00:00 GMT")) + "\n")
+        f.write("not json\n")
+    (tmp_path / "oai.xml").write_text(OAI, encoding="utf-8")
+    index = LocalArxivIndex(tmp_path / "index.db")
+    assert index.ingest(dump) == 2
+    assert index.ingest(tmp_path / "oai.xml") == 1
+    return index
+
+
+def test_ingest_and_search_with_filters(tmp_path):
+    index = _build_index(tmp_path)
+    # 标题匹配的权重高于摘要
+    papers = index.search(["large language model"])
+    assert [p["paper_id"] for p in papers] == ["2401.00001v1", "2402.00002v1"]
+    assert papers[0]["authors"] == ["Alice Smith", "Bob Lee"] and papers[0]["published_date"].startswith("2024-01-01T10:00")
+
+    assert [p["paper_id"] for p in index.search(["agents", "driving"], sort_by="submittedDate")] == ["2403.00003", "2402.00002v1", "2401.00001v1"]
+    assert [p["paper_id"] for p in index.search(["large language model"], start_date="202402010000")] == ["2402.00002v1"]
+    assert [p["paper_id"] for p in index.search(["agents"], end_date="202402292359")] == ["2401.00001v1"]
+    assert [p["paper_id"] for p in index.search(["agents"], categories=["cs.IR"])] == ["2403.00003"]
+
+    # 新版本覆盖旧版本，全文索引随之更新
+    index.add_papers([{"paper_id": "2401.00001v2", "title": "Multi-Agent Systems", "summary": "", "categories": ["cs.MA"]}])
+    assert index.search(["large language model"])[0]["paper_id"] == "2402.00002v1"
+    assert index.search(["multi agent"])[0]["paper_id"] == "2401.00001v2"
+    assert index.add_papers([{"paper_id": "2401.00001v1", "title": "Old"}]) == 0
+    assert index.count() == 3
+
+
+def test_paper_searcher_local_backend(monkeypatch, tmp_path):
+    index = _build_index(tmp_path)
+    monkeypatch.setattr(paper_search, "get_local_index", lambda: index)
+
+    async def main():
+        searcher = PaperSearcher(backend="local")
+        papers = await searcher.search_papers(["Agents", "autonomous driving"], max_results=2, start_date="2024-01-15")
+        streamed = [paper async for paper in searcher.iter_papers(["agents"], max_results=5, end_date="2024-02-29")]
+        return papers, streamed
+
+    papers, streamed = asyncio.run(main())
+    assert [p["paper_id"] for p in papers] == ["2402.00002v1", "2403.00003"]
+    assert [p["paper_id"] for p in streamed] == ["2401.00001v1"]
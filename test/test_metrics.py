@@ -0,0 +1,36 @@
+import asyncio
+
+from src.core.state_models import NodeError, PaperAgentState
+from src.utils.metrics import Counter, Histogram, MetricsRegistry, STAGE_LATENCY, timed_node
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.register(Counter("demo_requests_total", "请求次数", ["agent"]))
+    latency = registry.register(Histogram("demo_seconds", "耗时", buckets=(1, 5)))
+    requests.labels("search").inc()
+    requests.labels("search").inc(2)
+    latency.observe(0.5)
+    latency.observe(3)
+    text = registry.render()
+    assert 'demo_requests_total{agent="search"} 3' in text
+    assert 'demo_seconds_bucket{le="1"} 1' in text
+    assert 'demo_seconds_bucket{le="5"} 2' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 2' in text
+    assert "demo_seconds_count 2" in text
+
+
+def test_timed_node_records_stage_status():
+    @timed_node("unit-test")
+    async def search_node(state):
+        value = state["value"]
+        if value.user_request == "fail":
+            value.error.search_node_error = "boom"
+        return {"value": value}
+
+    for request in ("ok", "fail"):
+        asyncio.run(search_node({"value": PaperAgentState(user_request=request, error=NodeError())}))
+
+    text = "\n".join(STAGE_LATENCY.render())
+    assert 'paper_agent_stage_duration_seconds_count{stage="unit-test",status="ok"} 1' in text
+    assert 'paper_agent_stage_duration_seconds_count{stage="unit-test",status="error"} 1' in text
@@ -0,0 +1,128 @@
+import asyncio
+
+from langgraph.graph import END, START, StateGraph
+
+import src.agents.reading_agent as reading_agent
+import src.agents.search_agent as search_agent
+from src.agents.filter_agent import filter_node
+from src.agents.reading_agent import ExtractedPaperData, reading_node
+from src.agents.search_agent import SearchQuery, search_node
+from src.core.state_models import ConfigSchema, NodeError, PaperAgentState, State
+from src.services.stage_cache import StageCache
+from src.tasks.paper_filter import (BM25Scorer, RelevanceScorer, TfidfScorer, candidate_count, filter_papers,
+                                    get_scorer, register_scorer)
+
+PAPERS = [
+    {"paper_id": "a", "title": "Image segmentation with transformers", "summary": "We segment medical images."},
+    {"paper_id": "b", "title": "LLM agents for autonomous driving", "summary": "Language model agents plan driving maneuvers."},
+    {"paper_id": "c", "title": "A survey of reinforcement learning", "summary": "Agents learn driving policies in simulation."},
+    {"paper_id": "d", "title": "Graph databases", "summary": "Indexing property graphs."},
+]
+
+QUERY = "调研自动驾驶中的大模型智能体 LLM agents autonomous driving"
+
+
+def test_lexical_scorers_rank_relevant_papers_first():
+    for scorer in (BM25Scorer(), TfidfScorer()):
+        kept, scores = filter_papers(PAPERS, QUERY, top_n=2, scorer=scorer)
+        assert [paper["paper_id"] for paper in kept] == ["b", "c"]
+        assert scores["a"] == scores["d"] == 0.0 and set(scores) == {"a", "b", "c", "d"}
+
+    # 分数低于min-score的论文即使在top_n之内也会被丢弃
+    kept, _ = filter_papers(PAPERS, QUERY, top_n=4, scorer=BM25Scorer(), min_score=0.01)
+    assert [paper["paper_id"] for paper in kept] == ["b", "c"]
+
+
+def test_custom_scorer_and_fallback_to_bm25():
+    class ShortTitleScorer(RelevanceScorer):
+        name = "short-title"
+
+        def score(self, query, papers):
+            return [-len(paper["title"]) for paper in papers]
+
+    class BrokenScorer(RelevanceScorer):
+        name = "broken"
+
+        def score(self, query, papers):
+            raise ConnectionError("embedding service unavailable")
+
+    register_scorer("short-title", ShortTitleScorer)
+    kept, _ = filter_papers(PAPERS, QUERY, top_n=1, scorer=get_scorer("short-title"))
+    assert kept[0]["paper_id"] == "d"
+    kept, _ = filter_papers(PAPERS, QUERY, top_n=1, scorer=BrokenScorer())
+    assert kept[0]["paper_id"] == "b"
+
+
+def test_discarded_papers_are_never_read(monkeypatch, tmp_path):
+    read = []
+
+    class FakeMessage:
+        def __init__(self, content):
+            self.content = content
+
+    class FakeReadAgent:
+        async def run(self, task, cancellation_token=None):
+            read.append(task)
+            return type("Result", (), {"messages": [FakeMessage(ExtractedPaperData(core_problem=task))]})()
+
+    class FakeChromaClient:
+        def upsert_documents(self, documents, ids, metadatas=None):
+            pass
+
+    monkeypatch.setattr(reading_agent, "get_read_agent", lambda: FakeReadAgent())
+    monkeypatch.setattr(reading_agent, "ChromaClient", FakeChromaClient)
+    monkeypatch.setattr(reading_agent, "get_stage_cache", lambda: StageCache(tmp_path / "cache.db", enabled=False))
+
+    builder = StateGraph(State, context_schema=ConfigSchema)
+    builder.add_node("filter_node", filter_node)
+    builder.add_node("reading_node", reading_node)
+    builder.add_edge(START, "filter_node")
+    builder.add_edge("filter_node", "reading_node")
+    builder.add_edge("reading_node", END)
+
+    async def main():
+        state = PaperAgentState(
+            user_request="调研自动驾驶中的大模型智能体", max_papers=2, error=NodeError(),
+            search_query={"querys": ["LLM agents", "autonomous driving"]}, search_results=list(PAPERS),
+        )
+        result = await builder.compile().ainvoke({"value": state}, context={"state_queue": asyncio.Queue(), "cancellation_token": None})
+        return result["value"]
+
+    value = asyncio.run(main())
+    assert [paper["paper_id"] for paper in value.search_results] == ["b", "c"]
+    assert len(read) == 2 and all("'paper_id': 'a'" not in task and "'paper_id': 'd'" not in task for task in read)
+    assert set(value.relevance_scores) == {"a", "b", "c", "d"}
+    assert value.relevance_scores["b"] > value.relevance_scores["c"] > 0
+
+
+
+def test_search_is_not_streamed_when_filter_is_enabled(monkeypatch):
+    requested = []
+
+    async def fake_generate_search_query(current_state, state_queue, cancellation_token=None):
+        return SearchQuery(querys=["LLM agents", "autonomous driving"])
+
+    async def fake_search_papers_cached(search_query, max_results):
+        requested.append(max_results)
+        return list(PAPERS)
+
+    monkeypatch.setattr(search_agent, "generate_search_query", fake_generate_search_query)
+    monkeypatch.setattr(search_agent, "search_papers_cached", fake_search_papers_cached)
+
+    builder = StateGraph(State, context_schema=ConfigSchema)
+    builder.add_node("search_node", search_node)
+    builder.add_node("filter_node", filter_node)
+    builder.add_edge(START, "search_node")
+    builder.add_edge("search_node", "filter_node")
+    builder.add_edge("filter_node", END)
+
+    async def main():
+        state = PaperAgentState(user_request="调研自动驾驶中的大模型智能体", max_papers=2, error=NodeError())
+        result = await builder.compile().ainvoke({"value": state}, context={"state_queue": asyncio.Queue(), "cancellation_token": None})
+        return result["value"]
+
+    value = asyncio.run(main())
+    # 一次性检索max_papers * candidate-factor篇候选论文，整体排序后保留最相关的max_papers篇
+    assert requested == [candidate_count(2)] and candidate_count(2) > 2
+    assert [paper["paper_id"] for paper in value.search_results] == ["b", "c"]
+    assert set(value.relevance_scores) == {"a", "b", "c", "d"}
@@ -0,0 +1,74 @@
+import asyncio
+
+import arxiv
+
+from src.services.paper_store import PaperStore
+from src.tasks import paper_search
+from src.tasks.paper_search import PaperSearcher
+
+
+def _paper(paper_id, title="LLM Agents"):
+    return {
+        "paper_id": paper_id,
+        "title": title,
+        "authors": ["Alice", "Bob"],
+        "summary": "摘要",
+        "published_date": "2024-01-01T00:00:00+00:00",
+        "primary_category": "cs.CL",
+        "categories": ["cs.CL", "cs.AI"],
+        "doi": None,
+    }
+
+
+def test_store_keeps_latest_version_and_bulk_lookup(tmp_path):
+    store = PaperStore(tmp_path / "papers.db", enabled=True)
+    assert store.upsert_many([_paper("2401.00001v2"), _paper("2401.00002v1")]) == 2
+    # 旧版本不会覆盖新版本
+    assert store.upsert_many([_paper("2401.00001v1", title="旧标题")]) == 0
+    paper = store.get("2401.00001")
+    assert paper["paper_id"] == "2401.00001v2" and paper["title"] == "LLM Agents"
+    assert paper["authors"] == ["Alice", "Bob"] and paper["published"] == 2024
+
+    ids = [f"2401.{i:05d}" for i in range(1200)]
+    found = store.get_many(ids)
+    assert set(found) == {"2401.00001", "2401.00002"}
+    assert store.get_many(ids, max_age=-1) == {}
+    assert PaperStore(tmp_path / "disabled.db", enabled=False).get_many(ids) == {}
+
+
+def test_searcher_refreshes_stale_entries_and_lookup_reads_store(monkeypatch, tmp_path):
+    store = PaperStore(tmp_path / "papers.db", enabled=True)
+    store.upsert_many([_paper("2401.00001v2", title="本地记录")])
+    writes, requests = [], []
+    upsert_many = store.upsert_many
+    monkeypatch.setattr(store, "upsert_many", lambda papers: writes.append(len(papers)) or upsert_many(papers))
+
+    class FakeClient:
+        def __init__(self, page_size=None):
+            pass
+
+        async def results(self, search: arxiv.Search):
+            requests.append(search.id_list or search.query)
+            for paper_id in search.id_list or ["2401.00001v1", "2401.00003v1", "2401.00004v1"]:
+                yield paper_id
+
+    monkeypatch.setattr(paper_search, "AsyncArxivClient", FakeClient)
+    monkeypatch.setattr(paper_search, "get_paper_store", lambda: store)
+    monkeypatch.setattr(PaperSearcher, "_parse_paper_result", lambda self, result: _paper(result if "v" in result else f"{result}v1", "arXiv"))
+
+    async def main():
+        searcher = PaperSearcher()
+        searched = await searcher.search_papers(["llm"], max_results=3)
+        streamed = [paper async for paper in searcher.iter_papers(["llm"], max_results=3, page_size=1)]
+        looked_up = await searcher.lookup_papers(["2401.00003", "2401.00001v1", "2401.00005", "2401.00003v1"])
+        return searched, streamed, looked_up
+
+    searched, streamed, looked_up = asyncio.run(main())
+    # 检索结果以arXiv为准；论文库只刷新本地没有或版本更新的论文，记录仍有效时不重复写入
+    assert [p["title"] for p in searched] == ["arXiv"] * 3 and len(streamed) == 3
+    assert writes == [2, 1]
+    assert store.get("2401.00001")["title"] == "本地记录"
+    # 按id获取时只向arXiv请求本地没有的论文，本地已有更新版本时返回本地记录
+    assert requests[2:] == [["2401.00005"]]
+    assert [p["paper_id"] for p in looked_up] == ["2401.00003v1", "2401.00001v2", "2401.00005v1"]
+    assert store.count() == 4
@@ -0,0 +1,60 @@
+import asyncio
+
+import src.agents.search_agent as search_agent
+from src.agents.search_agent import SearchQuery, search_papers_cached, search_results_key
+from src.services.query_cache import QueryCache
+from src.services.stage_cache import StageCache
+
+
+def test_lru_ttl_and_stats():
+    cache = QueryCache(max_entries=2, ttl_seconds=60, enabled=True)
+    assert QueryCache.normalize_querys(["LLM ", "agent"]) == QueryCache.normalize_querys(["Agent", "llm", "llm"]) == ("agent", "llm")
+    key = "a"
+
+    assert cache.get(key) is None
+    cache.put(key, [{"paper_id": "2401.00001v1"}])
+    cache.get(key)[0]["paper_id"] = "changed"
+    assert cache.get(key) == [{"paper_id": "2401.00001v1"}]
+
+    # 超过容量时淘汰最久未使用的条目
+    cache.put("b", [{"paper_id": "b"}])
+    cache.get(key)
+    cache.put("c", [{"paper_id": "c"}])
+    assert cache.get("b") is None and cache.get(key) is not None
+
+    cache.ttl_seconds = -1
+    assert cache.get(key) is None
+    assert cache.stats() == {
+        "hits": 4, "misses": 3, "hit_rate": 0.5714, "evictions": 1, "expirations": 1, "size": 1, "max_entries": 2,
+    }
+
+
+def test_hot_layer_shares_keys_with_stage_cache(monkeypatch, tmp_path):
+    searches = []
+
+    class FakeSearcher:
+        async def search_papers(self, querys, max_results, start_date=None, end_date=None):
+            searches.append(querys)
+            return [{"paper_id": "2401.00001v1"}, {"paper_id": "2401.00002v1"}]
+
+    stage_cache = StageCache(tmp_path / "cache.db", enabled=True)
+    hot = QueryCache(enabled=True)
+    monkeypatch.setattr(search_agent, "PaperSearcher", FakeSearcher)
+    monkeypatch.setattr(search_agent, "get_stage_cache", lambda: stage_cache)
+    monkeypatch.setattr(search_agent, "get_query_cache", lambda: hot)
+
+    first = SearchQuery(querys=["LLM", "agent"], start_date="2024-01-01")
+    again = SearchQuery(querys=["agent", "llm"], start_date="2024/01/01")
+    assert search_results_key(first, 2) == search_results_key(again, 2)
+
+    async def main():
+        return [await search_papers_cached(query, 2) for query in (first, again)]
+
+    results = asyncio.run(main())
+    assert results[0] == results[1] and len(searches) == 1
+    assert hot.stats()["hits"] == 1
+    # 热层与阶段缓存使用同一个键：另一个进程（新的热层）直接命中阶段缓存
+    hot.clear()
+    asyncio.run(main())
+    assert len(searches) == 1
+    assert stage_cache.get(search_results_key(first, 2)) == results[0]
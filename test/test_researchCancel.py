@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import main
+from src.services.job_queue import SqliteJobQueue
+from src.services.job_registry import JobRegistry, JobStatus
+
+
+async def agent_run(cancellation_token):
+    """模拟进行中的AssistantAgent.run：请求挂起，直到CancellationToken被取消"""
+    request = asyncio.get_running_loop().create_future()
+    cancellation_token.link_future(request)
+    await request
+
+
+def test_disconnect_without_reconnect_cancels_pipeline_and_agent_calls():
+    async def run():
+        registry = JobRegistry(queue_size=10)
+        registry.disconnect_grace_seconds = 0.01
+        job = registry.create_job("q", cancel_on_disconnect=True)
+        # 模型调用独立于流水线协程运行，只能通过CancellationToken取消
+        calls = [asyncio.create_task(agent_run(job.cancellation_token)) for _ in range(2)]
+        registry.start(job, asyncio.sleep(100))
+        registry.attach(job)
+        registry.detach(job)
+        await asyncio.sleep(0.05)
+        assert job.status == JobStatus.CANCELLED
+        assert all(call.cancelled() for call in calls)
+
+    asyncio.run(run())
+
+
+def test_reconnect_within_grace_period_keeps_pipeline_running():
+    async def run():
+        registry = JobRegistry(queue_size=10)
+        registry.disconnect_grace_seconds = 0.02
+        job = registry.create_job("q", cancel_on_disconnect=True)
+        registry.start(job, agent_run(job.cancellation_token))
+        registry.attach(job)
+        registry.detach(job)
+        registry.attach(job)
+        await asyncio.sleep(0.05)
+        assert job.status == JobStatus.RUNNING
+        registry.cancel(job.job_id)
+
+    asyncio.run(run())
+
+
+def test_delete_endpoint_cancels_running_job(monkeypatch, tmp_path):
+    registry = JobRegistry(queue_size=10)
+    monkeypatch.setattr(main, "job_registry", registry)
+    monkeypatch.setattr(main, "get_job_queue", lambda: SqliteJobQueue(tmp_path / "jobs.db"))
+
+    async def run():
+        job = registry.create_job("q")
+        registry.start(job, agent_run(job.cancellation_token))
+        response = await main.cancel_research(job.job_id)
+        assert json.loads(response.body)["msg"] == "任务已取消"
+        await asyncio.sleep(0.01)
+        assert job.status == JobStatus.CANCELLED and job.cancellation_token.is_cancelled()
+        response = await main.cancel_research(job.job_id)
+        assert json.loads(response.body)["msg"] == "任务已结束，无需取消"
+        response = await main.cancel_research("missing")
+        assert response.status_code == 404
+
+    asyncio.run(run())
+
+
+def test_disconnect_does_not_cancel_async_jobs(tmp_path):
+    from src.services.job_worker import relay_job_events
+
+    async def run():
+        registry = JobRegistry(queue_size=10)
+        registry.disconnect_grace_seconds = 0.01
+        queue = SqliteJobQueue(tmp_path / "jobs.db")
+        # /api/jobs提交的任务：观察者断开后继续运行
+        job = registry.create_job("q")
+        registry.start(job, agent_run(job.cancellation_token))
+        registry.attach(job)
+        registry.detach(job)
+        await asyncio.sleep(0.05)
+        assert job.status == JobStatus.RUNNING and not job.cancellation_token.is_cancelled()
+        registry.cancel(job.job_id)
+
+        # worker模式：转发协程因API进程关闭等原因结束时不取消worker上的任务，主动终止时才取消
+        for cancel, expected in ((False, "pending"), (True, "cancelled")):
+            relayed = registry.create_job("q")
+            queue.enqueue(relayed.job_id, "q")
+            registry.start(relayed, relay_job_events(queue, relayed, poll_interval=0.01))
+            await asyncio.sleep(0.02)
+            if cancel:
+                registry.cancel(relayed.job_id)
+            else:
+                relayed.task.cancel()
+            await asyncio.sleep(0.02)
+            assert queue.get(relayed.job_id)["status"] == expected
+
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from src.agents.userproxy_agent import ReviewRegistry, ReviewTimeoutError
+from src.services.job_queue import SqliteJobQueue
+
+
+def test_reviews_are_isolated_per_job():
+    async def main():
+        registry = ReviewRegistry(policy="require", timeout_seconds=5)
+        first = asyncio.create_task(registry.request_review("a", "proposal-a"))
+        second = asyncio.create_task(registry.request_review("b", "proposal-b"))
+        await asyncio.sleep(0.01)
+        assert registry.submit("b", "reviewed-b")
+        assert registry.submit("a", "reviewed-a")
+        assert await first == "reviewed-a"
+        assert await second == "reviewed-b"
+        assert not registry.submit("a", "late")
+
+    asyncio.run(main())
+
+
+def test_review_policies_on_timeout():
+    async def main():
+        registry = ReviewRegistry(policy="approve_after", timeout_seconds=0.05)
+        assert await registry.request_review("a", "proposal", policy="auto") == "proposal"
+        assert await registry.request_review("a", "proposal") == "proposal"
+        with pytest.raises(ReviewTimeoutError):
+            await registry.request_review("a", "proposal", policy="require")
+        assert not registry.is_waiting("a")
+
+    asyncio.run(main())
+
+
+def test_review_input_handoff_through_queue(tmp_path):
+    queue = SqliteJobQueue(tmp_path / "jobs.db")
+    queue.enqueue("a", "q", review_policy="require")
+    assert not queue.submit_review_input("a", "x")
+    queue.claim("w1")
+    assert queue.get("a")["review_policy"] == "require"
+    assert queue.submit_review_input("a", "reviewed")
+    assert queue.take_review_input("a") == "reviewed"
+    assert queue.take_review_input("a") is None
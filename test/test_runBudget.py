@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from src.core.run_budget import BudgetExceededError, RunBudget, budgeted_node, current_budget
+
+
+def test_overrides_and_limits():
+    budget = RunBudget.from_config({"max_papers": 10, "max_tokens": 100, "unknown": 1})
+    assert budget.max_papers == 10 and budget.max_tokens == 100
+    assert budget.limit_papers(50) == 10
+    assert RunBudget().limit_papers(50) == 50
+
+    budget.record_usage(60, 30)
+    budget.check()
+    budget.record_usage(10, 0)
+    with pytest.raises(BudgetExceededError):
+        budget.check()
+    assert budget.report()["tokens_used"] == 100
+    # 0表示不限制
+    assert RunBudget(max_tokens=0).max_tokens is None
+
+
+def test_llm_calls_are_bounded_and_stages_recorded():
+    budget = RunBudget(max_concurrent_calls=2, max_seconds=5)
+    active, peak = 0, 0
+
+    async def call():
+        nonlocal active, peak
+        async with budget.llm_call():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            budget.record_usage(5, 5)
+
+    @budgeted_node("analyse")
+    async def analyse_node(state):
+        await asyncio.gather(*[call() for _ in range(6)])
+        return state
+
+    async def main():
+        token = current_budget.set(budget)
+        try:
+            await analyse_node({})
+        finally:
+            current_budget.reset(token)
+
+    asyncio.run(main())
+    assert peak == 2
+    assert budget.stages["analyse"]["tokens"] == 60
+    assert budget.report()["llm_calls"] == 6
+
+
+def test_time_budget_stops_new_calls():
+    budget = RunBudget(max_seconds=0.01)
+
+    async def main():
+        await asyncio.sleep(0.02)
+        async with budget.llm_call():
+            pass
+
+    with pytest.raises(BudgetExceededError, match="时间预算"):
+        asyncio.run(main())
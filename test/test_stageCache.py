@@ -0,0 +1,73 @@
+import asyncio
+
+from src.core.state_models import NodeError, PaperAgentState
+from src.services.stage_cache import StageCache
+
+
+def test_key_depends_on_inputs_prompts_and_models():
+    key = StageCache.make_key("analyse", {"a": 1, "b": 2}, ["prompt"], ["model"])
+    assert key == StageCache.make_key("analyse", {"b": 2, "a": 1}, ["prompt"], ["model"])
+    assert key != StageCache.make_key("writing", {"a": 1, "b": 2}, ["prompt"], ["model"])
+    assert key != StageCache.make_key("analyse", {"a": 1, "b": 3}, ["prompt"], ["model"])
+    assert key != StageCache.make_key("analyse", {"a": 1, "b": 2}, ["prompt v2"], ["model"])
+    assert key != StageCache.make_key("analyse", {"a": 1, "b": 2}, ["prompt"], ["other-model"])
+    state = PaperAgentState(user_request="q", error=NodeError())
+    assert StageCache.make_key("s", state) == StageCache.make_key("s", state.model_copy())
+
+
+def test_get_put_and_max_age(tmp_path):
+    cache = StageCache(tmp_path / "cache.db", enabled=True)
+    key = cache.make_key("search", "query")
+    assert cache.get(key) is None
+    cache.put(key, "search", [{"paper_id": "2401.00001"}])
+    assert cache.get(key) == [{"paper_id": "2401.00001"}]
+    assert cache.get(key, max_age=-1) is None
+    assert cache.clear("search") == 1
+    assert cache.get(key) is None
+
+    disabled = StageCache(tmp_path / "disabled.db", enabled=False)
+    disabled.put(key, "search", ["x"])
+    assert disabled.get(key) is None
+
+
+def test_put_evicts_expired_and_oldest_entries(tmp_path, monkeypatch):
+    import src.services.stage_cache as stage_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(stage_cache.time, "time", lambda: now[0])
+    cache = StageCache(tmp_path / "cache.db", enabled=True, max_entries=3, max_bytes=0, stage_ttls={"search": 10})
+    cache.put("search", "search", ["old"])
+    for i in range(3):
+        now[0] += 5
+        cache.put(f"reading-{i}", "reading", [i])
+    # 检索结果过期后删除，其他阶段不过期
+    assert cache.get("search") is None
+    assert [cache.get(f"reading-{i}") for i in range(3)] == [[0], [1], [2]]
+
+    now[0] += 5
+    cache.put("reading-3", "reading", [3])
+    assert cache.get("reading-0") is None
+    assert [cache.get(f"reading-{i}") for i in range(1, 4)] == [[1], [2], [3]]
+
+    size = len(stage_cache.pickle.dumps([3]))
+    cache.max_entries, cache.max_bytes = 0, size * 2
+    assert cache.prune() == 1
+    assert cache.get("reading-1") is None
+    assert cache.get("reading-3") == [3]
+
+
+def test_async_access_runs_off_the_event_loop(tmp_path, monkeypatch):
+    import threading
+
+    cache = StageCache(tmp_path / "cache.db", enabled=True)
+    threads = []
+    get = cache.get
+    monkeypatch.setattr(cache, "get", lambda *args: threads.append(threading.current_thread()) or get(*args))
+
+    async def main():
+        key = cache.make_key("reading", "paper")
+        await cache.aput(key, "reading", {"core_problem": "x"})
+        assert await cache.aget(key) == {"core_problem": "x"}
+
+    asyncio.run(main())
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,135 @@
+import asyncio
+
+from langgraph.graph import END, START, StateGraph
+
+import src.agents.reading_agent as reading_agent
+from src.agents.reading_agent import ExtractedPaperData, reading_node
+from src.core.state_models import ConfigSchema, NodeError, PaperAgentState, State
+from src.services.stage_cache import StageCache
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeResult:
+    def __init__(self, content):
+        self.messages = [FakeMessage(content)]
+
+
+class FakeReadAgent:
+    async def run(self, task, cancellation_token=None):
+        await asyncio.sleep(0.01)
+        return FakeResult(ExtractedPaperData(core_problem=task))
+
+
+timeline = []
+
+
+class FakeChromaClient:
+    def upsert_documents(self, documents, ids, metadatas=None):
+        timeline.extend(f"stored-{paper_id}" for paper_id in ids)
+
+
+def test_reading_starts_before_search_finishes(monkeypatch, tmp_path):
+    async def fake_stream_papers(search_query, max_papers=50):
+        for i in range(3):
+            timeline.append(f"found-{i}")
+            yield {"paper_id": f"2401.0000{i}", "title": f"llm paper {i}"}
+            await asyncio.sleep(0.05)
+        timeline.append("search-done")
+
+    monkeypatch.setattr(reading_agent, "stream_papers", fake_stream_papers)
+    monkeypatch.setattr(reading_agent, "get_read_agent", lambda: FakeReadAgent())
+    monkeypatch.setattr(reading_agent, "ChromaClient", FakeChromaClient)
+    monkeypatch.setattr(reading_agent, "get_stage_cache", lambda: StageCache(tmp_path / "cache.db", enabled=False))
+
+    builder = StateGraph(State, context_schema=ConfigSchema)
+    builder.add_node("reading_node", reading_node)
+    builder.add_edge(START, "reading_node")
+    builder.add_edge("reading_node", END)
+
+    async def main():
+        queue = asyncio.Queue()
+        state = PaperAgentState(user_request="q", error=NodeError(), search_query={"querys": ["llm"]})
+        result = await builder.compile().ainvoke({"value": state}, context={"state_queue": queue, "cancellation_token": None})
+        events = []
+        while not queue.empty():
+            event = queue.get_nowait()
+            if event.state == "thinking":
+                events.append(event.data)
+        return result["value"], events
+
+    value, events = asyncio.run(main())
+    assert [paper["paper_id"] for paper in value.search_results] == ["2401.00000", "2401.00001", "2401.00002"]
+    assert [paper.core_problem for paper in value.extracted_data.papers] == [str(paper) for paper in value.search_results]
+    # 每篇论文读完立即写入向量库，第一篇在检索结束前就已入库
+    assert timeline.index("stored-2401.00000") < timeline.index("found-1")
+    assert timeline.index("stored-2401.00001") < timeline.index("search-done")
+    assert len(events) == 3 and events[0].startswith("已阅读 1 篇")
+
+
+def test_vector_store_documents_are_scoped_by_job(monkeypatch, tmp_path):
+    import src.services.retrieval_tool as retrieval_tool_module
+
+    stored = []
+    queries = []
+
+    class RecordingChromaClient:
+        def upsert_documents(self, documents, ids, metadatas=None):
+            stored.extend(zip(ids, metadatas))
+
+        def query(self, query_texts, n_results=5, where=None):
+            queries.append(where)
+            return {"metadatas": [[]]}
+
+    monkeypatch.setattr(reading_agent, "get_read_agent", lambda: FakeReadAgent())
+    monkeypatch.setattr(reading_agent, "ChromaClient", RecordingChromaClient)
+    monkeypatch.setattr(reading_agent, "get_stage_cache", lambda: StageCache(tmp_path / "cache.db", enabled=False))
+    monkeypatch.setattr(retrieval_tool_module, "ChromaClient", RecordingChromaClient)
+
+    async def main():
+        paper = {"paper_id": "2401.00001", "title": "shared paper"}
+        states = [PaperAgentState(user_request="q", error=NodeError(), config={"job_id": job_id}) for job_id in ("a", "b")]
+        await asyncio.gather(*(
+            reading_agent.read_papers(reading_agent.iter_papers([paper]), asyncio.Queue(), corpus_id=state.corpus_id)
+            for state in states
+        ))
+
+    asyncio.run(main())
+    # 两个任务读到同一篇论文时各自写入一条记录，互不覆盖
+    assert sorted((doc_id, metadata["corpus_id"]) for doc_id, metadata in stored) == [("a:2401.00001", "a"), ("b:2401.00001", "b")]
+    retrieval_tool_module.retrieval_tool(["llm"], corpus_id="a")
+    assert queries == [{"corpus_id": "a"}]
+
+
+def test_deadline_cap_reads_most_relevant_streamed_papers(monkeypatch, tmp_path):
+    from src.core.run_budget import RunBudget, current_budget
+
+    async def fake_stream_papers(search_query, max_papers=50):
+        # 不相关的论文先到达
+        for i in range(max_papers):
+            yield {"paper_id": f"2401.{i:05d}", "title": f"llm paper {i}" if i >= 4 else f"protein folding {i}"}
+
+    monkeypatch.setattr(reading_agent, "stream_papers", fake_stream_papers)
+    monkeypatch.setattr(reading_agent, "get_read_agent", lambda: FakeReadAgent())
+    monkeypatch.setattr(reading_agent, "ChromaClient", FakeChromaClient)
+    monkeypatch.setattr(reading_agent, "get_stage_cache", lambda: StageCache(tmp_path / "cache.db", enabled=False))
+
+    builder = StateGraph(State, context_schema=ConfigSchema)
+    builder.add_node("reading_node", reading_node)
+    builder.add_edge(START, "reading_node")
+    builder.add_edge("reading_node", END)
+
+    async def main():
+        # 剩余60%的时间，10篇论文只阅读6篇
+        budget = RunBudget(max_seconds=100, grace_ratio=1.5)
+        budget.started_at -= 40
+        current_budget.set(budget)
+        state = PaperAgentState(user_request="q", max_papers=10, error=NodeError(), search_query={"querys": ["llm"]})
+        result = await builder.compile().ainvoke({"value": state}, context={"state_queue": asyncio.Queue(), "cancellation_token": None})
+        return result["value"]
+
+    value = asyncio.run(main())
+    assert [paper["paper_id"] for paper in value.search_results] == [f"2401.{i:05d}" for i in range(4, 10)]
@@ -0,0 +1,75 @@
+import asyncio
+
+from autogen_ext.models.replay import ReplayChatCompletionClient
+
+from src.core.state_models import NodeError, PaperAgentState
+from src.core.traced_agent import TracedAssistantAgent
+from src.utils.tracing import Trace, current_trace, load_trace, span, to_chrome_trace, traced_node
+
+
+def _run_traced(trace: Trace, coro_func):
+    async def main():
+        token = current_trace.set(trace)
+        try:
+            return await coro_func()
+        finally:
+            current_trace.reset(token)
+
+    return asyncio.run(main())
+
+
+def test_spans_nest_across_tasks_and_threads(tmp_path):
+    def embed():
+        with span("embedding.cluster", "io", texts=3):
+            pass
+
+    @traced_node("reading_node")
+    async def reading_node(state):
+        async def read(paper_id):
+            with span("reading.paper", "task", paper_id=paper_id):
+                await asyncio.sleep(0.02)
+
+        await asyncio.gather(read("a"), read("b"))
+        await asyncio.to_thread(embed)
+        state["value"].search_results = [{"paper_id": "a"}, {"paper_id": "b"}]
+        state["value"].error.reading_node_error = "部分论文阅读失败"
+        return state
+
+    trace = Trace("job-1")
+    _run_traced(trace, lambda: reading_node({"value": PaperAgentState(user_request="q", error=NodeError())}))
+    trace.save(tmp_path)
+
+    data = load_trace("job-1", tmp_path)
+    spans = {span["name"]: span for span in data["spans"]}
+    node = spans["reading_node"]
+    assert node["attributes"]["paper_count"] == 2
+    assert node["error"] == "部分论文阅读失败"
+    assert all(span["parent_id"] == node["span_id"] for span in data["spans"] if span is not node)
+    assert spans["embedding.cluster"]["attributes"]["texts"] == 3
+
+    # 并发阅读的两篇论文在Chrome时间线上分在不同的行
+    events = to_chrome_trace(data)["traceEvents"]
+    lanes = {event["args"]["paper_id"]: event["tid"] for event in events if event["name"] == "reading.paper"}
+    assert lanes["a"] != lanes["b"]
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+
+    # 任务恢复后的记录追加到同一份追踪中
+    Trace("job-1").save(tmp_path)
+    assert len(load_trace("job-1", tmp_path)["spans"]) == len(data["spans"])
+
+
+def test_agent_span_records_token_usage():
+    agent = TracedAssistantAgent(name="search_agent", model_client=ReplayChatCompletionClient(["检索条件"]))
+    trace = Trace("job-2")
+    result = _run_traced(trace, lambda: agent.run(task="帮我检索LLM相关论文"))
+    assert result.messages[-1].content == "检索条件"
+
+    record = trace.spans[-1].to_dict()
+    assert record["name"] == "agent.search_agent" and record["kind"] == "agent"
+    assert record["attributes"]["completion_tokens"] > 0
+    assert record["end"] >= record["start"]
+
+
+def test_no_spans_outside_job_trace():
+    with span("chroma.query", "io") as record:
+        assert record is None
@@ -0,0 +1,33 @@
+import argparse
+import multiprocessing
+
+from src.core.config import config
+from src.services.job_queue import SqliteJobQueue
+from src.services.job_worker import run_worker_process
+from src.utils.log_utils import setup_logger
+
+logger = setup_logger(name='worker', log_file='project.log')
+
+
+def start_workers(count: int) -> list:
+    """启动count个worker子进程，每个进程独立运行调研流水线"""
+    ctx = multiprocessing.get_context("spawn")
+    processes = []
+    for index in range(count):
+        process = ctx.Process(target=run_worker_process, args=(index,), name=f"paper-agent-worker-{index}", daemon=True)
+        process.start()
+        processes.append(process)
+    logger.info(f"已启动 {count} 个worker进程")
+    return processes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paper-Agent 调研流水线worker")
+    parser.add_argument("--workers", type=int, default=config.get_int("worker.count", 2), help="worker进程数量")
+    args = parser.parse_args()
+
+    # 上次异常退出时未完成的任务重新入队
+    SqliteJobQueue().requeue_running()
+    processes = start_workers(args.workers)
+    for process in processes:
+        process.join()